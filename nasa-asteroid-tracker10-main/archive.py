@@ -0,0 +1,459 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+from data_loader import BulkLoader, approach_row, asteroid_row
+from migrations import get_data_version, migrate
+from partitions import KEY_LENGTH, RECORD_FIELDS, STATS_FIELDS, may_match, swap_in
+
+# Raw approach archive: one zstd-compressed Parquet file per month (or year)
+# under <db stem>.archive/, with typed columns (int64 ids, date32 dates,
+# float64 measurements, a bool hazard flag, dictionary-encoded name and
+# orbiting_body). manifest.json records each file's row count and min/max
+# date, AU, lunar distance and velocity, like partitions.py, so readers skip
+# the files the sidebar filters rule out without opening them; within a file,
+# row groups are sorted by date and skipped on Parquet's own statistics.
+# Only the requested columns are decoded. Rebuilding a database or a column
+# store reads the columns straight into BulkLoader or NumPy arrays, with no
+# per-record parsing.
+#
+# Needs pyarrow, which is imported only when an archive is written or read.
+
+ARCHIVE_FORMAT = 1
+MANIFEST = 'manifest.json'
+COMPRESSION = 'zstd'
+
+# Rows per Parquet row group
+ROW_GROUP_ROWS = 50000
+
+# asteroid_row() + approach_row() fields, in order
+ASTEROID_COLUMNS = ['id', 'name', 'absolute_magnitude_h', 'estimated_diameter_min_km',
+                    'estimated_diameter_max_km', 'is_potentially_hazardous_asteroid']
+APPROACH_COLUMNS = ['neo_reference_id', 'close_approach_date', 'relative_velocity_kmph', 'astronomical',
+                    'miss_distance_km', 'miss_distance_lunar', 'orbiting_body']
+DATE_INDEX = len(ASTEROID_COLUMNS) + 1
+
+# Every approach of a database as asteroid_row() + approach_row() tuples
+ROW_SELECT = '''
+SELECT a.id, a.name, a.absolute_magnitude_h, a.estimated_diameter_min_km, a.estimated_diameter_max_km,
+       a.is_potentially_hazardous_asteroid,
+       ca.neo_reference_id, ca.close_approach_date, ca.relative_velocity_kmph, ca.astronomical,
+       ca.miss_distance_km, ca.miss_distance_lunar, ca.orbiting_body
+FROM close_approach ca
+LEFT JOIN asteroids a ON ca.neo_reference_id = a.id
+ORDER BY ca.close_approach_date
+'''
+
+DICTIONARY_COLUMNS = ('name', 'orbiting_body')
+
+
+def archive_dir(db_path):
+    return os.path.splitext(db_path)[0] + '.archive'
+
+
+def archive_schema():
+    import pyarrow as pa
+
+    types = {
+        'id': pa.int64(),
+        'neo_reference_id': pa.int64(),
+        'name': pa.dictionary(pa.int32(), pa.string()),
+        'is_potentially_hazardous_asteroid': pa.bool_(),
+        'close_approach_date': pa.date32(),
+        'orbiting_body': pa.dictionary(pa.int32(), pa.string()),
+    }
+    return pa.schema([(name, types.get(name, pa.float64())) for name in RECORD_FIELDS])
+
+
+def rows_table(rows):
+    """Arrow table of asteroid_row() + approach_row() tuples in the archive schema, sorted by date."""
+    import pyarrow as pa
+
+    schema = archive_schema()
+    values = dict(zip(ASTEROID_COLUMNS + APPROACH_COLUMNS, zip(*rows)))
+    arrays = []
+    for field in schema:
+        column = values.get(field.name, ())
+        if field.name == 'close_approach_date':
+            arrays.append(pa.array(column, pa.string()).cast(pa.date32()))
+        elif field.name == 'is_potentially_hazardous_asteroid':
+            arrays.append(pa.array(column, pa.int8()).cast(pa.bool_()))
+        elif field.name in DICTIONARY_COLUMNS:
+            arrays.append(pa.array(column, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(column, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema).sort_by('close_approach_date')
+
+
+def table_stats(table):
+    """Manifest stats (partitions.STATS_FIELDS) of a non-empty archive table."""
+    import pyarrow.compute as pc
+
+    stats = [table.num_rows]
+    for column in ('close_approach_date', 'astronomical', 'miss_distance_lunar', 'relative_velocity_kmph'):
+        bounds = pc.min_max(table[column]).as_py()
+        stats += [bounds['min'], bounds['max']]
+    stats[1:3] = [str(d) if d is not None else None for d in stats[1:3]]
+    return dict(zip(STATS_FIELDS, stats))
+
+
+def merge_stats(stats, more):
+    if stats is None:
+        return more
+    merged = {'rows': stats['rows'] + more['rows']}
+    for field in STATS_FIELDS[1:]:
+        values = [v for v in (stats[field], more[field]) if v is not None]
+        merged[field] = (min if field.startswith('min_') else max)(values) if values else None
+    return merged
+
+
+class ArchiveWriter:
+    """Routes records to one Parquet file per period and writes the manifest on `finish()`.
+
+    Like PartitionWriter, the archive is built in a scratch directory and
+    swapped in whole. With `append`, the files of an existing archive are
+    carried over and new records are added after their rows; re-fetched
+    approaches are then stored twice and the later copy wins on rebuild,
+    as with INSERT OR REPLACE.
+    """
+
+    def __init__(self, directory, by='month', batch_size=ROW_GROUP_ROWS, source=None, append=True):
+        self.directory = directory
+        self.building = directory + '.building'
+        self.by = by
+        self.batch_size = batch_size
+        self.source = source
+        previous = read_manifest(directory) if append else None
+        if previous and previous['by'] != by:
+            raise ValueError(f"'{directory}' is archived by {previous['by']}, not by {by}")
+        self.previous = {p['key']: p for p in previous['partitions']} if previous else {}
+        self.writers = {}
+        self.buffers = {}
+        self.stats = {}
+        if os.path.exists(self.building):
+            shutil.rmtree(self.building)
+        os.makedirs(self.building)
+
+    def open(self, key):
+        import pyarrow.parquet as pq
+
+        self.writers[key] = pq.ParquetWriter(os.path.join(self.building, f"{key}.parquet"), archive_schema(),
+                                             compression=COMPRESSION)
+        self.buffers[key] = []
+        self.stats[key] = None
+        if key in self.previous:
+            old = pq.ParquetFile(os.path.join(self.directory, self.previous[key]['path']))
+            for batch in old.iter_batches(self.batch_size):
+                self.write_table(key, batch)
+
+    def write_table(self, key, table):
+        if table.num_rows:
+            self.writers[key].write(table, row_group_size=self.batch_size)
+            self.stats[key] = merge_stats(self.stats[key], table_stats(table))
+
+    def write(self, records):
+        self.write_rows(asteroid_row(r) + approach_row(r) for r in records)
+
+    def write_rows(self, rows):
+        """Add asteroid_row() + approach_row() tuples."""
+        length = KEY_LENGTH[self.by]
+        for row in rows:
+            key = row[DATE_INDEX][:length]
+            if key not in self.writers:
+                self.open(key)
+            buffer = self.buffers[key]
+            buffer.append(row)
+            if len(buffer) >= self.batch_size:
+                self.write_table(key, rows_table(buffer))
+                buffer.clear()
+
+    def finish(self, data_version=None):
+        """Flush and close every file, then publish them with their manifest."""
+        partitions = []
+        for key in sorted(set(self.writers) | set(self.previous)):
+            path = f"{key}.parquet"
+            if key in self.writers:
+                self.write_table(key, rows_table(self.buffers[key]))
+                self.writers[key].close()
+                stats = self.stats[key]
+            else:
+                shutil.copy2(os.path.join(self.directory, self.previous[key]['path']), os.path.join(self.building, path))
+                stats = {field: self.previous[key][field] for field in STATS_FIELDS}
+            if stats is None:
+                os.remove(os.path.join(self.building, path))
+                continue
+            partitions.append(dict(key=key, path=path, bytes=os.path.getsize(os.path.join(self.building, path)),
+                                   **stats))
+        manifest = {
+            'format': ARCHIVE_FORMAT,
+            'by': self.by,
+            'compression': COMPRESSION,
+            'source': self.source,
+            'data_version': data_version,
+            'rows': sum(p['rows'] for p in partitions),
+            'bytes': sum(p['bytes'] for p in partitions),
+            'partitions': partitions,
+        }
+        with open(os.path.join(self.building, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        swap_in(self.building, self.directory)
+        return manifest
+
+
+def archive_database(db_path, directory=None, by='month', batch_size=ROW_GROUP_ROWS):
+    """Write every approach of `db_path` to a new archive; returns the manifest."""
+    conn = sqlite3.connect(db_path)
+    try:
+        migrate(conn)
+        writer = ArchiveWriter(directory or archive_dir(db_path), by, batch_size, source=db_path, append=False)
+        cursor = conn.execute(ROW_SELECT)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.write_rows(rows)
+        return writer.finish(get_data_version(conn))
+    finally:
+        conn.close()
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return manifest if manifest.get('format') == ARCHIVE_FORMAT else None
+
+
+def row_filter(params):
+    """Arrow expression for the date/distance/velocity part of the sidebar filters (queries.FILTER)."""
+    import pyarrow.dataset as ds
+
+    day = ds.field('close_approach_date')
+    return ((day >= date.fromisoformat(params['start_date'])) & (day <= date.fromisoformat(params['end_date']))
+            & (ds.field('astronomical') < params['astro_limit'])
+            & (ds.field('miss_distance_lunar') < params['lunar_limit'])
+            & (ds.field('relative_velocity_kmph') >= params['velocity_min']))
+
+
+def matching_partitions(manifest, params=None):
+    return [p for p in manifest['partitions'] if params is None or may_match(p, params)]
+
+
+def scan(directory, columns=None, params=None):
+    """One Arrow table per archive file the filters can match, holding only `columns`.
+
+    With `params`, rows are filtered like queries.FILTER; the hazard radio is
+    left to the caller, as in ColumnStore.from_sqlite.
+    """
+    import pyarrow.parquet as pq
+
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No archive in '{directory}'")
+    expression = row_filter(params) if params is not None else None
+    for partition in matching_partitions(manifest, params):
+        yield pq.read_table(os.path.join(directory, partition['path']), columns=columns, filters=expression)
+
+
+def read_archive(directory, columns=None, params=None):
+    """The matching rows of every archive file as one Arrow table."""
+    import pyarrow as pa
+
+    schema = archive_schema()
+    tables = list(scan(directory, columns, params))
+    if not tables:
+        return schema.empty_table().select(columns or schema.names)
+    return pa.concat_tables(tables)
+
+
+def asteroid_rows(batch, seen=()):
+    """INSERT_ASTEROID tuples for the first row of each asteroid in an archive batch, except ids in `seen`."""
+    import pyarrow as pa
+
+    ids = batch.column('id').fill_null(-1).to_numpy()
+    unique, first = np.unique(ids, return_index=True)
+    new = np.fromiter((i >= 0 and i not in seen for i in unique.tolist()), dtype=bool, count=len(unique))
+    rows = batch.take(pa.array(first[new]))
+    columns = [rows.column(name) for name in ASTEROID_COLUMNS]
+    columns[-1] = columns[-1].cast(pa.int8())
+    return zip(*map(python_values, columns))
+
+
+def approach_rows(batch):
+    """INSERT_APPROACH tuples for every row of an archive batch."""
+    return list(zip(*[python_values(batch.column(name)) for name in APPROACH_COLUMNS]))
+
+
+def python_values(column):
+    """Values of an archive column as a list of Python objects, dates as ISO strings.
+
+    Quicker than `to_pylist()`: numbers go through NumPy, and each distinct
+    date or dictionary entry is converted once and shared by its rows.
+    """
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(column.type):
+        values = np.array(column.dictionary.to_pylist() + [None], dtype=object)
+        return values[column.indices.fill_null(len(column.dictionary)).to_numpy()].tolist()
+    if column.null_count:
+        return (column.cast(pa.string()) if pa.types.is_date32(column.type) else column).to_pylist()
+    if pa.types.is_date32(column.type):
+        days, rows = np.unique(column.cast(pa.int32()).to_numpy(), return_inverse=True)
+        values = np.array(pa.array(days).cast(pa.date32()).cast(pa.string()).to_pylist(), dtype=object)
+        return values[rows].tolist()
+    return column.to_numpy().tolist()
+
+
+def rebuild_database(directory, db_path, batch_size=50000):
+    """Load the whole archive into `db_path` with BulkLoader. Returns the approaches written."""
+    conn = sqlite3.connect(db_path)
+    try:
+        loader = BulkLoader(conn, batch_size)
+        for table in scan(directory):
+            for batch in table.to_batches(batch_size):
+                # Asteroids the loader already wrote are not converted again
+                loader.write_rows(asteroid_rows(batch, loader.asteroids), approach_rows(batch))
+        loader.finish()
+        return loader.rows
+    finally:
+        conn.close()
+
+
+def name_codes(column):
+    """(sorted distinct names, code per row) of a dictionary-encoded name column, like np.unique(return_inverse)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if column.null_count:
+        return np.unique(np.array(column.to_pylist(), dtype=object).astype(str), return_inverse=True)
+    # Rank the dictionary entries in use instead of comparing every row's string
+    used, codes = np.unique(column.indices.to_numpy(), return_inverse=True)
+    values = column.dictionary.take(pa.array(used))
+    order = pc.array_sort_indices(values).to_numpy()
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return values.take(pa.array(order)).to_numpy(zero_copy_only=False), rank[codes]
+
+
+def load_store(directory, params=None):
+    """ColumnStore built from the archive; the same as ColumnStore.from_sqlite on a database rebuilt from it.
+
+    Like BulkLoader, the later copy of a repeated approach wins and each
+    asteroid keeps the first row it was seen on.
+    """
+    from columnar import ColumnStore
+
+    table = read_archive(directory, params=params).unify_dictionaries().combine_chunks()
+    neo_id = table['neo_reference_id'].fill_null(-1).to_numpy()
+    day = table['close_approach_date'].cast('int32').fill_null(0).to_numpy()
+    body = table['orbiting_body'].chunks[0].indices.fill_null(-1).to_numpy() if table.num_rows else np.array([])
+
+    # One row per (asteroid, date, body), the last one archived
+    order = np.lexsort((np.arange(len(neo_id)), body, day, neo_id))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = ((neo_id[order][1:] != neo_id[order][:-1]) | (day[order][1:] != day[order][:-1])
+                 | (body[order][1:] != body[order][:-1]))
+    rows = order[last]
+
+    def numbers(name):
+        return table[name].to_numpy(zero_copy_only=False).astype(np.float64)[rows]
+
+    velocity, au, lunar = numbers('relative_velocity_kmph'), numbers('astronomical'), numbers('miss_distance_lunar')
+    km = np.full(len(rows), np.nan) if params is not None else numbers('miss_distance_km')
+    # Same row order as columnar.APPROACH_SELECT
+    ordered = np.lexsort((neo_id[rows], velocity, lunar, au, day[rows]))
+
+    ids = table['id'].fill_null(-1).to_numpy()
+    ast_id, first = np.unique(ids, return_index=True)
+    first, ast_id = first[ast_id >= 0], ast_id[ast_id >= 0]
+    asteroids = table.take(first)
+    names, name_code = name_codes(asteroids['name'].combine_chunks())
+    return ColumnStore(
+        neo_id[rows][ordered], day[rows][ordered].astype(np.int32),
+        velocity[ordered], au[ordered], km[ordered], lunar[ordered],
+        ast_id.astype(np.int64),
+        name_code.astype(np.int32),
+        names.astype(object),
+        asteroids['absolute_magnitude_h'].to_numpy(zero_copy_only=False).astype(np.float64),
+        asteroids['estimated_diameter_min_km'].to_numpy(zero_copy_only=False).astype(np.float64),
+        asteroids['estimated_diameter_max_km'].to_numpy(zero_copy_only=False).astype(np.float64),
+        asteroids['is_potentially_hazardous_asteroid'].fill_null(False).to_numpy(zero_copy_only=False).astype(bool),
+    )
+
+
+TABLE_DUMPS = [
+    'SELECT * FROM asteroids ORDER BY id',
+    'SELECT * FROM close_approach ORDER BY neo_reference_id, close_approach_date, orbiting_body',
+]
+
+
+def check_parity(db_path, directory):
+    """Problems found comparing the archive with the database it was written from."""
+    from columnar import PARITY_FILTERS, ColumnStore, check_parity as check_store
+    from queries import build_params
+
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        rebuilt = os.path.join(tmp, 'rebuilt.db')
+        rebuild_database(directory, rebuilt)
+        source, copy = sqlite3.connect(db_path), sqlite3.connect(rebuilt)
+        for sql in TABLE_DUMPS:
+            if source.execute(sql).fetchall() != copy.execute(sql).fetchall():
+                problems.append(f"rebuilt database differs: {sql}")
+        copy.close()
+    problems += [f"archived column store differs: {name} {filters}"
+                 for name, filters, *_ in check_store(source, load_store(directory))]
+    for filters in PARITY_FILTERS:
+        params = build_params(*filters)
+        expected, actual = ColumnStore.from_sqlite(source, params=params), load_store(directory, params)
+        if any(not np.array_equal(a, b, equal_nan=a.dtype.kind == 'f')
+               for a, b in zip(expected.columns().values(), actual.columns().values())):
+            problems.append(f"filtered column store differs: {filters}")
+    source.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed, date-partitioned Parquet archive of the approaches")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--by', choices=sorted(KEY_LENGTH), default='month')
+    parser.add_argument('--dir', help="archive directory (default: <db stem>.archive)")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the database from the archive instead")
+    parser.add_argument('--check-parity', action='store_true',
+                        help="compare a rebuilt database and column store with the source database")
+    args = parser.parse_args()
+
+    directory = args.dir or archive_dir(args.db)
+    started = time.perf_counter()
+    if args.rebuild:
+        if os.path.exists(args.db):
+            print(f"❌ '{args.db}' exists; rebuild into a new file")
+            sys.exit(1)
+        rows = rebuild_database(directory, args.db)
+        print(f"✅ Rebuilt '{args.db}' with {rows} approaches in {time.perf_counter() - started:.1f}s")
+        return
+    manifest = archive_database(args.db, directory, args.by)
+    print(f"✅ Archived {manifest['rows']} approaches in {len(manifest['partitions'])} files "
+          f"({manifest['bytes'] / 1e6:.1f} MB, database {os.path.getsize(args.db) / 1e6:.1f} MB) "
+          f"to '{directory}' in {time.perf_counter() - started:.1f}s")
+    if args.check_parity:
+        problems = check_parity(args.db, directory)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ The rebuilt database and the archived column store match the source database")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from data_loader import API_KEY, DB_PATH, approach_row, asteroid_row, create_tables, extract_fields
+from fetcher import LOOKUP_URL, LookupFetcher
+from migrations import bump_data_version
+from rollups import refresh_rollups
+from sync import UPSERT_APPROACH, UPSERT_ASTEROID
+
+# Full approach histories from the NeoWs lookup endpoint. The feed only returns
+# the approaches inside each fetched window, so per-asteroid analyses see a
+# truncated history. The backfill looks up every asteroid already stored,
+# upserts its whole history and records it in backfill_ledger; an asteroid
+# looked up recently is skipped on the next run.
+
+# A history changes only when the asteroid's orbit solution is updated
+MAX_AGE_DAYS = 30
+
+# The lookup also lists approaches to other planets; the dashboard is about Earth
+ORBITING_BODIES = ('Earth',)
+
+# Asteroids written per transaction
+BATCH_SIZE = 200
+
+
+def plan_ids(conn, max_age_days=MAX_AGE_DAYS, now=None):
+    """Stored asteroid ids never looked up, then those looked up more than `max_age_days` ago, oldest first."""
+    cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).isoformat(timespec='seconds')
+    ids = conn.execute('''
+        SELECT a.id
+        FROM asteroids a
+        LEFT JOIN backfill_ledger b ON b.neo_reference_id = a.id
+        WHERE b.fetched_at IS NULL OR b.fetched_at < ?
+        ORDER BY b.fetched_at IS NOT NULL, b.fetched_at, a.id
+        ''', (cutoff,))
+    return [row[0] for row in ids]
+
+
+def history_records(asteroid, bodies=ORBITING_BODIES):
+    """One record per approach to one of `bodies` (every body when None) in a lookup response."""
+    return [extract_fields(asteroid, approach) for approach in asteroid.get('close_approach_data', [])
+            if bodies is None or approach.get('orbiting_body') in bodies]
+
+
+def history_hash(records):
+    rows = [asteroid_row(records[0])] + sorted(map(approach_row, records)) if records else []
+    return hashlib.sha1(json.dumps(rows).encode()).hexdigest()
+
+
+def apply_histories(conn, histories, bodies=ORBITING_BODIES):
+    """Upsert a batch of (id, lookup response or None) in one transaction. Returns rows changed."""
+    ids = [neo_id for neo_id, _ in histories]
+    known = dict(conn.execute(
+        f"SELECT neo_reference_id, content_hash FROM backfill_ledger "
+        f"WHERE neo_reference_id IN ({', '.join('?' * len(ids))})", ids))
+    fetched_at = datetime.now().isoformat(timespec='seconds')
+    records, ledger = [], []
+    for neo_id, asteroid in histories:
+        history = history_records(asteroid, bodies) if asteroid else []
+        digest = history_hash(history)
+        if digest != known.get(neo_id):
+            records.extend(history)
+        ledger.append((neo_id, fetched_at, len(history), digest))
+
+    before = conn.total_changes
+    with conn:
+        if records:
+            conn.executemany(UPSERT_ASTEROID, {r['id']: asteroid_row(r) for r in records}.values())
+            conn.executemany(UPSERT_APPROACH, map(approach_row, records))
+        changed = conn.total_changes - before
+        if changed:
+            refresh_rollups(conn, records)
+            bump_data_version(conn)
+        conn.executemany('INSERT OR REPLACE INTO backfill_ledger VALUES (?, ?, ?, ?)', ledger)
+    return changed
+
+
+def backfill(db_path=DB_PATH, base_url=LOOKUP_URL, workers=4, rate=2.0, max_age_days=MAX_AGE_DAYS,
+             limit=None, batch_size=BATCH_SIZE, bodies=ORBITING_BODIES):
+    """Look up the full history of every stored asteroid that is due and upsert what changed.
+
+    Returns {'asteroids', 'skipped', 'missing', 'changed', 'seconds', 'asteroids_per_sec'}.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    due = plan_ids(conn, max_age_days)
+    skipped = conn.execute('SELECT COUNT(*) FROM asteroids').fetchone()[0] - len(due)
+    ids = due[:limit] if limit else due
+
+    fetcher = LookupFetcher(API_KEY, base_url=base_url, workers=workers, rate=rate)
+    changed, missing, batch = 0, 0, []
+    for neo_id, asteroid in fetcher.iter_asteroids(ids):
+        missing += asteroid is None
+        batch.append((neo_id, asteroid))
+        if len(batch) >= batch_size:
+            changed += apply_histories(conn, batch, bodies)
+            batch = []
+    if batch:
+        changed += apply_histories(conn, batch, bodies)
+    conn.close()
+
+    # Keep an existing column snapshot in step with the database
+    if changed:
+        from snapshot import read_manifest, write_snapshot
+        if read_manifest(db_path):
+            write_snapshot(db_path)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'asteroids': len(ids), 'skipped': skipped, 'missing': missing, 'changed': changed,
+        'seconds': round(elapsed, 3), 'asteroids_per_sec': round(len(ids) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill each stored asteroid's full approach history")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2.0, help="lookups per second")
+    parser.add_argument('--base-url', default=LOOKUP_URL, help="lookup endpoint; ids are appended as /<id>")
+    parser.add_argument('--max-age-days', type=float, default=MAX_AGE_DAYS,
+                        help="histories looked up more recently than this are skipped")
+    parser.add_argument('--limit', type=int, help="look up at most this many asteroids, oldest first")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="asteroids per write transaction")
+    parser.add_argument('--all-bodies', action='store_true',
+                        help="also store approaches to other planets and moons")
+    args = parser.parse_args()
+
+    stats = backfill(args.db, args.base_url, args.workers, args.rate, args.max_age_days,
+                     args.limit, args.batch_size, None if args.all_bodies else ORBITING_BODIES)
+    print(f"✅ Looked up {stats['asteroids']} asteroid(s) in {stats['seconds']:.2f}s "
+          f"({stats['asteroids_per_sec']:.1f} asteroids/sec), {stats['changed']} row(s) changed; "
+          f"{stats['skipped']} up to date, {stats['missing']} not found")
+
+
+if __name__ == '__main__':
+    main()
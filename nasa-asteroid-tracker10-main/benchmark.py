@@ -0,0 +1,930 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import data_loader
+import queries
+import rollups
+import synthetic
+from migrations import migrate
+
+# Realistic NeoWs-shaped records (synthetic.py), deterministic for a given seed
+synthetic_records = synthetic.generate_records
+
+
+def fresh_connection(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    data_loader.create_tables(conn)
+    return conn
+
+
+def bench_loader(sizes, batch_size):
+    """Compare rows/sec of the row-by-row loader against the bulk loader.
+
+    Both loaders consume the same synthetic record stream; the time spent
+    generating records is measured separately and subtracted.
+    """
+    print(f"{'rows':>10} {'loader':>8} {'seconds':>9} {'rows/sec':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        for size in sizes:
+            started = time.perf_counter()
+            for _ in synthetic_records(size):
+                pass
+            generate = time.perf_counter() - started
+
+            conn = fresh_connection(db_path)
+            started = time.perf_counter()
+            data_loader.insert_records(conn.cursor(), synthetic_records(size))
+            conn.commit()
+            current = time.perf_counter() - started - generate
+            conn.close()
+
+            conn = fresh_connection(db_path)
+            started = time.perf_counter()
+            loader = data_loader.BulkLoader(conn, batch_size)
+            loader.write(synthetic_records(size))
+            loader.finish()
+            bulk = time.perf_counter() - started - generate
+            conn.close()
+
+            for mode, elapsed in (('current', current), ('bulk', bulk)):
+                print(f"{size:>10} {mode:>8} {elapsed:>9.2f} {size / elapsed:>10.0f}")
+
+
+def extract_fields_dict(asteroid, approach_data):
+    """The old 13-key dict extractor with a strptime per approach, for comparison."""
+    return {
+        "id": int(asteroid.get('id', 0)),
+        "neo_reference_id": int(asteroid.get('neo_reference_id', 0)),
+        "name": asteroid.get('name', ''),
+        "absolute_magnitude_h": float(asteroid.get('absolute_magnitude_h', 0.0)),
+        "estimated_diameter_min_km": float(asteroid['estimated_diameter']['kilometers']['estimated_diameter_min']),
+        "estimated_diameter_max_km": float(asteroid['estimated_diameter']['kilometers']['estimated_diameter_max']),
+        "is_potentially_hazardous_asteroid": bool(asteroid.get('is_potentially_hazardous_asteroid', False)),
+        "close_approach_date": datetime.strptime(approach_data['close_approach_date'], '%Y-%m-%d').date(),
+        "relative_velocity_kmph": float(approach_data['relative_velocity']['kilometers_per_hour']),
+        "astronomical": float(approach_data['miss_distance']['astronomical']),
+        "miss_distance_km": float(approach_data['miss_distance']['kilometers']),
+        "miss_distance_lunar": float(approach_data['miss_distance']['lunar']),
+        "orbiting_body": approach_data.get('orbiting_body', '')
+    }
+
+
+def iter_extracted(pages, extract):
+    for page in pages:
+        for day in page['near_earth_objects'].values():
+            for asteroid in day:
+                for approach_data in asteroid['close_approach_data']:
+                    yield extract(asteroid, approach_data)
+
+
+def extract_rows(pages, extract):
+    """Stream every approach of the pages into the SQLite rows the loaders write, as ingest does."""
+    for record in iter_extracted(pages, extract):
+        data_loader.asteroid_row(record)
+        data_loader.approach_row(record)
+
+
+def bench_records(size, repeat, profile):
+    """Records/sec and bytes/record of the dict extractor vs slotted records with interned asteroids.
+
+    Feed pages are generated and parsed from JSON up front; each run streams
+    every approach into its SQLite rows. Bytes/record is the traced memory of
+    a list holding every extracted record, as a batch buffer does.
+    """
+    import cProfile
+    import pstats
+
+    pages = [json.loads(json.dumps(page)) for _, page in synthetic.generate_feed(size)]
+    paths = (('dict', extract_fields_dict), ('slots', data_loader.extract_fields))
+    print(f"{'records':>10} {'extractor':>9} {'records/sec':>12} {'bytes/record':>13}")
+    for label, extract in paths:
+        timings = []
+        for _ in range(repeat):
+            data_loader.interned_asteroids.clear()
+            data_loader.parse_date.cache_clear()
+            started = time.perf_counter()
+            extract_rows(pages, extract)
+            timings.append(time.perf_counter() - started)
+
+        data_loader.interned_asteroids.clear()
+        data_loader.parse_date.cache_clear()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        records = list(iter_extracted(pages, extract))
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del records
+        print(f"{size:>10} {label:>9} {size / min(timings):>12,.0f} {held / size:>13,.0f}")
+
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(extract_rows, pages, extract)
+            pstats.Stats(profiler).sort_stats('tottime').print_stats(8)
+
+
+def inline_params(sql, params):
+    """Splice parameter values into the SQL text, the way the old f-string queries did."""
+    def literal(match):
+        value = params[match.group(1)]
+        if value is None:
+            return 'NULL'
+        return f"'{value}'" if isinstance(value, str) else str(value)
+    return re.sub(r':(\w+)', literal, sql)
+
+
+def bench_queries(db_path, repeat):
+    """Per-analysis latency of f-string SQL vs the prepared, parameterized registry.
+
+    Each iteration nudges the velocity slider, so the f-string path sees new
+    statement text every time while the registry reuses one prepared statement.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        shutil.copy(db_path, path)
+        conn = sqlite3.connect(path, cached_statements=queries.STATEMENT_CACHE_SIZE)
+        migrate(conn)
+        print(f"{'analysis':<55} {'f-string us':>12} {'prepared us':>12} {'speedup':>8}")
+        totals = [0.0, 0.0]
+        for analysis in queries.ANALYSES:
+            timings = []
+            for prepared in (False, True):
+                started = time.perf_counter()
+                for i in range(repeat):
+                    params = queries.build_params('2024-01-01', '2025-01-01', i % 1000, 0.5, 10.0, "All")
+                    if prepared:
+                        conn.execute(analysis.sql, params).fetchall()
+                    else:
+                        conn.execute(inline_params(analysis.sql, params)).fetchall()
+                timings.append((time.perf_counter() - started) / repeat * 1e6)
+            totals[0] += timings[0]
+            totals[1] += timings[1]
+            print(f"{analysis.name:<55} {timings[0]:>12.1f} {timings[1]:>12.1f} {timings[0] / timings[1]:>7.2f}x")
+        print(f"{'total':<55} {totals[0]:>12.1f} {totals[1]:>12.1f} {totals[0] / totals[1]:>7.2f}x")
+        conn.close()
+
+
+def build_synthetic_db(path, size, batch_size=50000):
+    return synthetic.build_db(path, size, batch_size=batch_size)
+
+
+def bench_rollups(sizes, repeat):
+    """Latency of the rollup-eligible analyses answered from raw rows vs from the rollups."""
+    params = queries.build_params('2000-01-01', '2100-12-31', 0, 1.0, 1000.0, "All")
+    names = list(rollups.MONTHLY_QUERIES) + list(rollups.ASTEROID_QUERIES)
+    print(f"{'rows':>10} {'analysis':<45} {'raw ms':>9} {'rollup ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            conn = build_synthetic_db(os.path.join(tmp, 'bench.db'), size)
+            for name in names:
+                timings = []
+                for sql in (queries.QUERIES[name].sql, rollups.rollup_sql(conn, name, params)):
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        conn.execute(sql, params).fetchall()
+                    timings.append((time.perf_counter() - started) / repeat * 1000)
+                print(f"{size:>10} {name:<45} {timings[0]:>9.2f} {timings[1]:>10.2f}")
+            conn.close()
+
+
+def bench_columnar(sizes, repeat):
+    """Per-analysis latency of SQLite vs the NumPy column store, after both are warm."""
+    from columnar import ColumnStore
+
+    params = queries.build_params('2024-01-01', '2025-01-01', 0, 0.5, 10.0, "All")
+    print(f"{'rows':>10} {'analysis':<55} {'sqlite ms':>10} {'numpy ms':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            conn = build_synthetic_db(os.path.join(tmp, 'bench.db'), size)
+            started = time.perf_counter()
+            store = ColumnStore.from_sqlite(conn)
+            print(f"{size:>10} {'(load column store)':<55} {'':>10} {(time.perf_counter() - started) * 1000:>9.1f}")
+            totals = [0.0, 0.0]
+            for analysis in queries.ANALYSES:
+                timings = []
+                for run in (lambda: queries.run_query(conn, analysis.name, params),
+                            lambda: store.run(analysis.name, params)):
+                    run()
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        run()
+                    timings.append((time.perf_counter() - started) / repeat * 1000)
+                totals[0] += timings[0]
+                totals[1] += timings[1]
+                print(f"{size:>10} {analysis.name:<55} {timings[0]:>10.2f} {timings[1]:>9.2f} "
+                      f"{timings[0] / timings[1]:>7.1f}x")
+            print(f"{size:>10} {'total':<55} {totals[0]:>10.2f} {totals[1]:>9.2f} {totals[0] / totals[1]:>7.1f}x")
+            conn.close()
+
+
+def bench_partitions(size, days, by, workers, repeat):
+    """Per-analysis latency of one SQLite file vs year/month partitions fanned out over a process pool."""
+    from partitions import PartitionedExecutor, split_database
+
+    ranges = [('all dates', '2000-01-01', '2100-12-31'), ('one year', '2025-01-01', '2025-12-31')]
+    print(f"{'filter':<10} {'analysis':<55} {'single ms':>10} {'parts':>6} {'fan-out ms':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        conn = synthetic.build_db(db_path, size, days=days)
+        directory = os.path.join(tmp, 'bench.partitions')
+        started = time.perf_counter()
+        split_database(db_path, directory, by)
+        print(f"Split {size} approaches over {days} days by {by} in {time.perf_counter() - started:.1f}s")
+        executor = PartitionedExecutor(directory, workers)
+        try:
+            for label, start, end in ranges:
+                params = queries.build_params(start, end, 0, 1.0, 1000.0, "All")
+                totals = [0.0, 0.0]
+                for analysis in queries.ANALYSES:
+                    timings = []
+                    for run in (lambda: queries.run_query(conn, analysis.name, params),
+                                lambda: executor.run(analysis.name, params)):
+                        run()
+                        started = time.perf_counter()
+                        for _ in range(repeat):
+                            run()
+                        timings.append((time.perf_counter() - started) / repeat * 1000)
+                    totals[0] += timings[0]
+                    totals[1] += timings[1]
+                    parts = len(executor.prune(analysis.name, params))
+                    print(f"{label:<10} {analysis.name:<55} {timings[0]:>10.2f} {parts:>6} {timings[1]:>11.2f} "
+                          f"{timings[0] / timings[1]:>7.1f}x")
+                print(f"{label:<10} {'total':<55} {totals[0]:>10.2f} {'':>6} {totals[1]:>11.2f} "
+                      f"{totals[0] / totals[1]:>7.1f}x")
+        finally:
+            executor.close()
+            conn.close()
+
+
+def bench_report(sizes, repeat):
+    """All analyses one query at a time vs one report over a single filtered scan."""
+    import report
+
+    filters = [('one year', '2024-01-01', '2025-01-01', 0.5, 10.0),
+               ('all dates', '2000-01-01', '2100-12-31', 1.0, 1000.0)]
+    print(f"{'rows':>10} {'filter':<10} {'scanned':>9} {'one by one ms':>14} {'report ms':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            conn = build_synthetic_db(os.path.join(tmp, 'bench.db'), size)
+            for label, start, end, astro_limit, lunar_limit in filters:
+                params = queries.build_params(start, end, 0, astro_limit, lunar_limit, "All")
+                report.time_one_by_one(conn, params)
+                separate = sum(report.time_one_by_one(conn, params) for _ in range(repeat)) / repeat
+                bundles = [report.build_report(conn, params) for _ in range(repeat)]
+                single = sum(b.timings['total'] for b in bundles) / repeat
+                print(f"{size:>10} {label:<10} {bundles[0].timings['rows_scanned']:>9} {separate:>14.1f} "
+                      f"{single:>10.1f} {separate / single:>7.1f}x")
+            conn.close()
+
+
+def bench_bitmaps(sizes, bins, repeat):
+    """Filter resolution per slider position: row-by-row mask vs the bitmap index."""
+    import bitmaps
+    from columnar import ColumnStore
+
+    print(f"{'rows':>10} {'index ms':>9} {'index MB':>9} {'scan ms':>9} {'resolve ms':>11} {'mask ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            conn = build_synthetic_db(os.path.join(tmp, 'bench.db'), size)
+            store = ColumnStore.from_sqlite(conn)
+            conn.close()
+            started = time.perf_counter()
+            index = bitmaps.BitmapIndex(store, bins)
+            built = (time.perf_counter() - started) * 1000
+            filter_sets = bitmaps.random_filters(store, 100)
+            scanned, resolved, masked = bitmaps.time_filters(store, index, filter_sets, repeat)
+            print(f"{size:>10} {built:>9.0f} {index.nbytes() / 1e6:>9.1f} {scanned:>9.3f} {resolved:>11.3f} {masked:>8.3f}")
+
+
+def bench_pages(sizes, repeat):
+    """Time to the first keyset page vs the full LIMITed result, over the whole stored date range."""
+    from pagination import Pager, is_paged
+
+    params = queries.build_params('2000-01-01', '2100-12-31', 0, 1.0, 1000.0, "All")
+    print(f"{'rows':>10} {'analysis':<55} {'full ms':>9} {'page 1 ms':>10} {'count ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            conn = build_synthetic_db(os.path.join(tmp, 'bench.db'), size)
+            for name in queries.QUERY_NAMES:
+                if not is_paged(name):
+                    continue
+                pager = Pager(conn, name, params)
+                timings = []
+                for run in (lambda: queries.run_query(conn, name, params), pager.page_frame, pager.count):
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        run()
+                    timings.append((time.perf_counter() - started) / repeat * 1000)
+                print(f"{size:>10} {name:<55} {timings[0]:>9.2f} {timings[1]:>10.2f} {timings[2]:>9.2f}")
+            conn.close()
+
+
+def bench_pool(size, readers, pool_size, seconds):
+    """Reader latency and errors while the loader writes, in rollback-journal vs WAL mode."""
+    from pool import ConnectionPool, prepare_database
+
+    params = queries.build_params('2024-01-01', '2025-01-01', 0, 0.5, 10.0, "All")
+    names = [a.name for a in queries.ANALYSES if a.limit and a.limit <= 10]
+    print(f"{'journal':<8} {'queries':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'max ms':>8} {'written/s':>10} {'pool wait p95 ms':>17}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for journal in ('delete', 'wal'):
+            db_path = os.path.join(tmp, f'bench-{journal}.db')
+            build_synthetic_db(db_path, size).close()
+            if journal == 'wal':
+                prepare_database(db_path)
+            else:
+                sqlite3.connect(db_path).execute('PRAGMA journal_mode=DELETE').close()
+
+            pool = ConnectionPool(db_path, size=pool_size)
+            stop = threading.Event()
+            latencies, errors, written = [], [0], [0]
+
+            def write():
+                conn = sqlite3.connect(db_path)
+                records = synthetic_records(10 ** 9, seed=7)
+                while not stop.is_set():
+                    batch = [next(records) for _ in range(1000)]
+                    data_loader.write_batch(conn, batch)
+                    written[0] += len(batch)
+                conn.close()
+
+            def read(worker):
+                i = worker
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        with pool.connection() as conn:
+                            queries.execute(conn, names[i % len(names)], params).fetchall()
+                        latencies.append(time.perf_counter() - started)
+                    except sqlite3.OperationalError:
+                        errors[0] += 1
+                    i += 1
+
+            threads = [threading.Thread(target=write)] + [threading.Thread(target=read, args=(n,))
+                                                          for n in range(readers)]
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            pool.close()
+
+            latencies.sort()
+
+            def pick(q):
+                return 1000 * latencies[int(q * (len(latencies) - 1))] if latencies else 0.0
+
+            print(f"{journal:<8} {len(latencies):>8} {errors[0]:>7} {pick(0.5):>8.2f} {pick(0.95):>8.2f} "
+                  f"{pick(1.0):>8.2f} {written[0] / seconds:>10.0f} {pool.stats()['p95_wait_ms']:>17.2f}")
+
+
+def bench_fetcher(size, workers, delay, fail_every):
+    """Records/sec of FeedFetcher against a local feed stub that injects 429/503s, then an interrupted run resumed."""
+    from fetcher import FeedFetcher, count_approaches, split_windows
+
+    records = list(synthetic_records(size))
+    start_date = synthetic.START_DATE
+    end_date = start_date + timedelta(days=synthetic.DAYS - 1)
+    windows = split_windows(start_date, end_date)
+    stub = synthetic.FeedStub(records, delay, fail_every)
+
+    def fetcher(count, checkpoint_path=None):
+        return FeedFetcher('DEMO_KEY', base_url=stub.url, workers=count, rate=10 ** 6,
+                           checkpoint_path=checkpoint_path, backoff=0.01)
+
+    print(f"{len(windows)} windows, {size} approaches, {delay * 1000:.0f} ms per request, "
+          f"every {fail_every or 'no'} request fails")
+    print(f"{'workers':>7} {'records':>8} {'requests':>8} {'retried':>7} {'seconds':>8} {'records/s':>10}")
+    try:
+        for count in workers:
+            stub.requests = stub.failures = 0
+            feed = fetcher(count)
+            started = time.perf_counter()
+            fetched = sum(count_approaches(page) for _, page in feed.iter_pages(start_date, end_date))
+            elapsed = time.perf_counter() - started
+            print(f"{count:>7} {fetched:>8} {stub.requests:>8} {stub.failures:>7} {elapsed:>8.2f} "
+                  f"{fetched / elapsed:>10.0f}")
+            if fetched != size:
+                print(f"❌ Fetched {fetched} of {size} approaches")
+                return False
+
+        # Stop half way through, then rerun against the same checkpoint
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint_path = os.path.join(tmp, 'checkpoint.json')
+            first = fetcher(workers[-1], checkpoint_path)
+            for seen, _ in enumerate(first.iter_pages(start_date, end_date), 1):
+                if seen == len(windows) // 2:
+                    break
+            done = dict(fetcher(1, checkpoint_path).checkpoint.done)
+            resumed = list(fetcher(workers[-1], checkpoint_path).iter_pages(start_date, end_date))
+    finally:
+        stub.close()
+
+    refetched = [w for w, _ in resumed if w[0].isoformat() in done]
+    covered = set(done) | {w[0].isoformat() for w, _ in resumed}
+    total = sum(entry['records'] for entry in done.values()) + \
+        sum(count_approaches(page) for _, page in resumed)
+    print(f"Interrupted after {len(done)} checkpointed windows; the rerun fetched {len(resumed)}")
+    if refetched or covered != {w[0].isoformat() for w in windows} or total != size:
+        print(f"❌ Resume fetched {len(refetched)} finished window(s) again, covered {len(covered)} of "
+              f"{len(windows)} windows and {total} of {size} approaches")
+        return False
+    print(f"✅ Resume fetched only the unfinished windows and every approach once")
+    return True
+
+
+def bench_backfill(size, workers, delay, history_days):
+    """Asteroids/sec of the lookup backfill against a local stub, for each worker count, then a rerun."""
+    import backfill
+
+    records = list(synthetic_records(size, days=history_days))
+    lookups = synthetic.histories(records)
+    # The database only holds the first year, as a feed load would; the stub knows every approach
+    stored = [r for r in records if r["close_approach_date"] < synthetic.START_DATE + timedelta(days=365)]
+    stub = synthetic.LookupStub(lookups, delay)
+    print(f"{len(stored)} stored approaches, {len(records)} in the histories, {delay * 1000:.0f} ms per lookup")
+    print(f"{'workers':>7} {'asteroids':>9} {'rows changed':>12} {'seconds':>8} {'asteroids/s':>12}")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for count in workers:
+                db_path = os.path.join(tmp, f'backfill-{count}.db')
+                conn = fresh_connection(db_path)
+                loader = data_loader.BulkLoader(conn, 50000)
+                loader.write(stored)
+                loader.finish()
+                conn.close()
+                for run in ('first', 'rerun'):
+                    stats = backfill.backfill(db_path, stub.url, workers=count, rate=10 ** 6)
+                    label = f"{count}" if run == 'first' else f"{count} again"
+                    print(f"{label:>7} {stats['asteroids']:>9} {stats['changed']:>12} {stats['seconds']:>8.2f} "
+                          f"{stats['asteroids_per_sec']:>12.1f}")
+    finally:
+        stub.close()
+
+
+def bench_service(size, clients, seconds, url=None):
+    """Cold start of service.py, then requests/sec and tail latency for each number of concurrent clients.
+
+    Starts the service on a synthetic database unless `url` points at one already running.
+    """
+    import http.client
+    import subprocess
+    from urllib.parse import urlencode, urlsplit
+
+    names = [a.name for a in queries.ANALYSES if a.limit and a.limit <= 10]
+    formats = ['csv', 'ndjson']
+    try:
+        import pyarrow  # noqa: F401
+        formats.append('arrow')
+    except ImportError:
+        pass
+    paths = [f"/query?{urlencode({'analysis': name, 'format': fmt})}" for name in names for fmt in formats]
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        if url is None:
+            db_path = os.path.join(tmp, 'service.db')
+            build_synthetic_db(db_path, size).close()
+            cli_started = time.perf_counter()
+            subprocess.run([sys.executable, 'service.py', '--db', db_path, 'query', names[0]],
+                           cwd=here, stdout=subprocess.DEVNULL, check=True)
+            cli_ms = 1000 * (time.perf_counter() - cli_started)
+
+            started = time.perf_counter()
+            process = subprocess.Popen([sys.executable, 'service.py', '--db', db_path, 'serve', '--port', '0'],
+                                       cwd=here, stdout=subprocess.PIPE, text=True)
+            url = re.search(r"(http://\S+)/query", process.stdout.readline()).group(1)
+            ready_ms = 1000 * (time.perf_counter() - started)
+        address = urlsplit(url)
+
+        def get(conn, path):
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+
+        try:
+            if process:
+                conn = http.client.HTTPConnection(address.hostname, address.port)
+                get(conn, paths[0])
+                conn.close()
+                print(f"{size} approaches; server listening after {ready_ms:.0f} ms, first result after "
+                      f"{1000 * (time.perf_counter() - started):.0f} ms; CLI query {cli_ms:.0f} ms end to end")
+            print(f"Mix: {len(names)} analyses x {', '.join(formats)}")
+            print(f"{'clients':>7} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                  f"{'p99 ms':>8} {'max ms':>8}")
+            for count in clients:
+                stop = threading.Event()
+                latencies, errors = [], [0]
+
+                def client(worker):
+                    conn = http.client.HTTPConnection(address.hostname, address.port, timeout=60)
+                    i = worker
+                    while not stop.is_set():
+                        request_started = time.perf_counter()
+                        try:
+                            status = get(conn, paths[i % len(paths)])
+                        except (OSError, http.client.HTTPException):
+                            status = None
+                            conn.close()
+                        if status == 200:
+                            latencies.append(time.perf_counter() - request_started)
+                        else:
+                            errors[0] += 1
+                        i += 1
+                    conn.close()
+
+                threads = [threading.Thread(target=client, args=(n,)) for n in range(count)]
+                load_started = time.perf_counter()
+                for t in threads:
+                    t.start()
+                time.sleep(seconds)
+                stop.set()
+                for t in threads:
+                    t.join()
+                elapsed = time.perf_counter() - load_started
+                print(f"{count:>7} {len(latencies):>8} {errors[0]:>6} {len(latencies) / elapsed:>8.1f} "
+                      f"{1000 * percentile(latencies, 0.5):>8.2f} {1000 * percentile(latencies, 0.95):>8.2f} "
+                      f"{1000 * percentile(latencies, 0.99):>8.2f} {1000 * percentile(latencies, 1.0):>8.2f}")
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+
+
+def bench_archive(sizes, by):
+    """JSON Lines export vs Parquet archive: size on disk, database and column store rebuilds, a filtered read."""
+    import contextlib
+    import io
+
+    import archive
+    from columnar import ColumnStore
+
+    params = queries.build_params('2024-03-01', '2024-03-31', 0, 0.5, 10.0, "All")
+    print(f"{'size':>8} {'jsonl MB':>9} {'archive MB':>10} {'jsonl->db s':>11} {'archive->db s':>13} "
+          f"{'db->store s':>11} {'archive->store s':>16} {'1 month, 3 cols ms':>18}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl_path, directory = os.path.join(tmp, 'export.jsonl'), os.path.join(tmp, 'export.archive')
+            writer = archive.ArchiveWriter(directory, by, append=False)
+            with open(jsonl_path, 'w') as f:
+                for batch, _ in data_loader.iter_batches(((None, r) for r in synthetic_records(size)), 50000):
+                    data_loader.write_jsonl(batch, f)
+                    writer.write(batch)
+            manifest = writer.finish()
+
+            timings = []
+            for name, load in (('jsonl', lambda path: data_loader.load_into_sqlite(jsonl_path, path, bulk=True)),
+                               ('archive', lambda path: archive.rebuild_database(directory, path))):
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    load(os.path.join(tmp, f'{name}.db'))
+                timings.append(time.perf_counter() - started)
+
+            conn = sqlite3.connect(os.path.join(tmp, 'archive.db'))
+            started = time.perf_counter()
+            ColumnStore.from_sqlite(conn)
+            from_db = time.perf_counter() - started
+            conn.close()
+            started = time.perf_counter()
+            archive.load_store(directory)
+            from_archive = time.perf_counter() - started
+            started = time.perf_counter()
+            archive.read_archive(directory, ['neo_reference_id', 'close_approach_date', 'miss_distance_lunar'], params)
+            filtered = time.perf_counter() - started
+
+            print(f"{size:>8} {os.path.getsize(jsonl_path) / 1e6:>9.1f} {manifest['bytes'] / 1e6:>10.1f} "
+                  f"{timings[0]:>11.2f} {timings[1]:>13.2f} {from_db:>11.2f} {from_archive:>16.2f} "
+                  f"{filtered * 1000:>18.1f}")
+
+
+def memory_kb():
+    """(RSS, PSS) of this process in kB; PSS splits shared pages between the processes mapping them."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) for line in f if line.split(':')[0] in ('Rss', 'Pss')}
+        return fields['Rss'], fields['Pss']
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss, rss
+
+
+def snapshot_worker(mode, db_path, barrier, results):
+    """One dashboard process answering its first query, then reporting memory while all workers are alive."""
+    # Library imports are paid by every mode (and by Streamlit itself), so keep them off the clock
+    import pandas
+    import columnar
+    import snapshot
+
+    started = time.perf_counter()
+    params = queries.build_params('2000-01-01', '2100-12-31', 0, 1.0, 1000.0, "All")
+    name = queries.QUERY_NAMES[0]
+    if mode == 'sqlite':
+        conn = sqlite3.connect(db_path)
+        df = queries.run_query(conn, name, params)
+    elif mode == 'columnar':
+        store = columnar.ColumnStore.from_sqlite(sqlite3.connect(db_path))
+        df = store.run(name, params)
+    else:
+        store = snapshot.open_snapshot(db_path)
+        df = store.run(name, params)
+    first_result = time.perf_counter() - started
+    barrier.wait()
+    results.put((first_result, len(df)) + memory_kb())
+    barrier.wait()
+
+
+def bench_snapshot(size, workers):
+    """Time to first result and memory per worker: sqlite3+pandas vs per-process column store vs shared snapshot."""
+    from snapshot import write_snapshot
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'mode':<10} {'workers':>7} {'first result ms':>16} {'RSS MB':>8} {'PSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        build_synthetic_db(db_path, size).close()
+        write_snapshot(db_path)
+        for mode in ('sqlite', 'columnar', 'snapshot'):
+            barrier = context.Barrier(workers)
+            results = context.Queue()
+            processes = [context.Process(target=snapshot_worker, args=(mode, db_path, barrier, results))
+                         for _ in range(workers)]
+            for p in processes:
+                p.start()
+            measured = [results.get() for _ in processes]
+            for p in processes:
+                p.join()
+            first, rss, pss = (sum(m[i] for m in measured) / workers for i in (0, 2, 3))
+            print(f"{mode:<10} {workers:>7} {first * 1000:>16.1f} {rss / 1024:>8.1f} {pss / 1024:>8.1f}")
+
+
+# Filters used by the suite: the dashboard's defaults
+SUITE_FILTERS = ('2024-01-01', '2025-01-01', 0, 0.5, 10.0, "All")
+
+# Slowdowns smaller than this are treated as noise, whatever the ratio
+NOISE_MS = 1.0
+NOISE_KB = 1024
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))] if ordered else 0.0
+
+
+def ingest_worker(db_path, size, batch_size, results):
+    """Generate, then bulk load `size` records in a fresh process, so its peak RSS is the loader's own."""
+    import resource
+
+    started = time.perf_counter()
+    for _ in synthetic.generate_records(size):
+        pass
+    generate = time.perf_counter() - started
+    started = time.perf_counter()
+    build_synthetic_db(db_path, size, batch_size).close()
+    load = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((generate, load, peak_kb))
+
+
+def measure(run, repeat):
+    """p50/p95 latency over `repeat` runs, then Python peak memory of one traced run."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'p50_ms': percentile(timings, 0.5), 'p95_ms': percentile(timings, 0.95),
+            'peak_kb': peak / 1024, 'rows': len(result)}
+
+
+def find_regressions(results, baseline, tolerance):
+    """Human-readable regressions of `results` against `baseline` beyond `tolerance` (0.25 = 25%)."""
+    flags = []
+    for size, current in results['scales'].items():
+        base = baseline.get('scales', {}).get(size)
+        if not base:
+            continue
+        now, then = current['ingest']['records_per_sec'], base['ingest']['records_per_sec']
+        if now < then / (1 + tolerance):
+            flags.append(f"{size} rows: ingest {now:,.0f} records/sec (baseline {then:,.0f})")
+        for name, m in current['analyses'].items():
+            b = base['analyses'].get(name)
+            if not b:
+                continue
+            if m['p50_ms'] > b['p50_ms'] * (1 + tolerance) and m['p50_ms'] - b['p50_ms'] > NOISE_MS:
+                flags.append(f"{size} rows: {name} p50 {m['p50_ms']:.2f} ms (baseline {b['p50_ms']:.2f} ms)")
+            if m['peak_kb'] > b['peak_kb'] * (1 + tolerance) and m['peak_kb'] - b['peak_kb'] > NOISE_KB:
+                flags.append(f"{size} rows: {name} peak {m['peak_kb']:,.0f} kB (baseline {b['peak_kb']:,.0f} kB)")
+    return flags
+
+
+def bench_suite(sizes, repeat, batch_size, output, baseline_path=None, tolerance=0.25, save_baseline=False):
+    """Ingest throughput and per-analysis p50/p95/peak memory at each size, saved as JSON.
+
+    Returns the regressions against the baseline file, if one is given.
+    """
+    params = queries.build_params(*SUITE_FILTERS)
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': synthetic.SEED,
+            'filters': SUITE_FILTERS,
+            'repeat': repeat,
+        },
+        'scales': {},
+    }
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'suite.db')
+        for size in sizes:
+            queue = context.Queue()
+            process = context.Process(target=ingest_worker, args=(db_path, size, batch_size, queue))
+            process.start()
+            generate, load, peak_kb = queue.get()
+            process.join()
+            ingest = {'seconds': load, 'generate_seconds': generate,
+                      'records_per_sec': size / max(load - generate, 1e-9), 'peak_rss_kb': peak_kb}
+            print(f"\n{size:,} rows: ingest {ingest['records_per_sec']:,.0f} records/sec "
+                  f"({load:.1f}s incl. {generate:.1f}s generating), peak RSS {peak_kb / 1024:.0f} MB")
+
+            conn = sqlite3.connect(db_path, cached_statements=queries.STATEMENT_CACHE_SIZE)
+            analyses = {}
+            print(f"{'analysis':<55} {'rows':>7} {'p50 ms':>9} {'p95 ms':>9} {'peak kB':>9}")
+            for analysis in queries.ANALYSES:
+                m = measure(lambda: queries.run_query(conn, analysis.name, params), repeat)
+                analyses[analysis.name] = m
+                print(f"{analysis.name:<55} {m['rows']:>7} {m['p50_ms']:>9.2f} {m['p95_ms']:>9.2f} {m['peak_kb']:>9.0f}")
+            conn.close()
+            results['scales'][str(size)] = {'ingest': ingest, 'analyses': analyses}
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to '{output}'")
+
+    flags = []
+    if baseline_path and os.path.exists(baseline_path) and not save_baseline:
+        with open(baseline_path) as f:
+            flags = find_regressions(results, json.load(f), tolerance)
+        for flag in flags:
+            print(f"⚠️ Regression: {flag}")
+        if not flags:
+            print(f"✅ No regressions against '{baseline_path}'")
+    if baseline_path and save_baseline:
+        shutil.copy(output, baseline_path)
+        print(f"✅ Saved baseline '{baseline_path}'")
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the asteroid tracker")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    loader = sub.add_parser('loader', help="row-by-row vs bulk SQLite loader")
+    loader.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    loader.add_argument('--batch-size', type=int, default=50000)
+
+    query = sub.add_parser('queries', help="f-string SQL vs prepared query registry")
+    query.add_argument('--db', default='nasa_asteroids_10k.db')
+    query.add_argument('--repeat', type=int, default=200)
+
+    rollup = sub.add_parser('rollups', help="raw aggregates vs rollup tables")
+    rollup.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    rollup.add_argument('--repeat', type=int, default=5)
+
+    columnar = sub.add_parser('columnar', help="SQLite vs NumPy column store")
+    columnar.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    columnar.add_argument('--repeat', type=int, default=5)
+
+    parted = sub.add_parser('partitions', help="one SQLite file vs partitions queried in a process pool")
+    parted.add_argument('--size', type=int, default=1000000)
+    parted.add_argument('--days', type=int, default=5 * 365, help="days the approaches are spread over")
+    parted.add_argument('--by', choices=['year', 'month'], default='year')
+    parted.add_argument('--workers', type=int, default=None)
+    parted.add_argument('--repeat', type=int, default=3)
+
+    record = sub.add_parser('records', help="dict records vs slotted records with interned asteroids")
+    record.add_argument('--size', type=int, default=200000)
+    record.add_argument('--repeat', type=int, default=3)
+    record.add_argument('--profile', action='store_true', help="print the top functions of each extractor")
+
+    reported = sub.add_parser('report', help="one query per analysis vs a single-scan report")
+    reported.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    reported.add_argument('--repeat', type=int, default=3)
+
+    bitmap = sub.add_parser('bitmaps', help="row-by-row filter mask vs bitmap filter index")
+    bitmap.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    bitmap.add_argument('--bins', type=int, default=32)
+    bitmap.add_argument('--repeat', type=int, default=5)
+
+    pages = sub.add_parser('pages', help="first keyset page vs full result")
+    pages.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    pages.add_argument('--repeat', type=int, default=5)
+
+    pooled = sub.add_parser('pool', help="reader latency under concurrent writes, rollback journal vs WAL")
+    pooled.add_argument('--size', type=int, default=200000)
+    pooled.add_argument('--readers', type=int, default=8)
+    pooled.add_argument('--pool-size', type=int, default=4)
+    pooled.add_argument('--seconds', type=float, default=10.0)
+
+    fetched = sub.add_parser('fetcher', help="feed fetcher throughput and resume against a local stub server")
+    fetched.add_argument('--size', type=int, default=100000, help="approaches in the stub's feed")
+    fetched.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    fetched.add_argument('--delay', type=float, default=0.02, help="seconds the stub waits per request")
+    fetched.add_argument('--fail-every', type=int, default=10, help="the stub answers every Nth request with 429/503")
+
+    backfilled = sub.add_parser('backfill', help="lookup backfill throughput against a local stub server")
+    backfilled.add_argument('--size', type=int, default=20000, help="approaches in the stub's histories")
+    backfilled.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    backfilled.add_argument('--delay', type=float, default=0.02, help="seconds the stub waits per lookup")
+    backfilled.add_argument('--history-days', type=int, default=5 * 365)
+
+    served = sub.add_parser('service', help="service.py cold start and load test: requests/sec and tail latency")
+    served.add_argument('--size', type=int, default=100000)
+    served.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    served.add_argument('--seconds', type=float, default=10.0, help="load per client count")
+    served.add_argument('--url', help="load-test a service already running here instead of starting one")
+
+    archived = sub.add_parser('archive', help="JSON Lines export vs compressed Parquet archive")
+    archived.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    archived.add_argument('--by', choices=['month', 'year'], default='month')
+
+    snap = sub.add_parser('snapshot', help="time to first result and memory per worker process")
+    snap.add_argument('--size', type=int, default=1000000)
+    snap.add_argument('--workers', type=int, default=4)
+
+    suite = sub.add_parser('suite', help="ingest and per-analysis latency/memory at several scales, with baselines")
+    suite.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    suite.add_argument('--repeat', type=int, default=5)
+    suite.add_argument('--batch-size', type=int, default=50000)
+    suite.add_argument('--output', default='benchmark_results.json')
+    suite.add_argument('--baseline', help="baseline results to compare against (or to write with --save-baseline)")
+    suite.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+    suite.add_argument('--save-baseline', action='store_true')
+
+    args = parser.parse_args()
+    if args.command == 'loader':
+        bench_loader(args.sizes, args.batch_size)
+    elif args.command == 'queries':
+        bench_queries(args.db, args.repeat)
+    elif args.command == 'rollups':
+        bench_rollups(args.sizes, args.repeat)
+    elif args.command == 'columnar':
+        bench_columnar(args.sizes, args.repeat)
+    elif args.command == 'partitions':
+        bench_partitions(args.size, args.days, args.by, args.workers, args.repeat)
+    elif args.command == 'records':
+        bench_records(args.size, args.repeat, args.profile)
+    elif args.command == 'report':
+        bench_report(args.sizes, args.repeat)
+    elif args.command == 'bitmaps':
+        bench_bitmaps(args.sizes, args.bins, args.repeat)
+    elif args.command == 'pages':
+        bench_pages(args.sizes, args.repeat)
+    elif args.command == 'pool':
+        bench_pool(args.size, args.readers, args.pool_size, args.seconds)
+    elif args.command == 'fetcher':
+        if not bench_fetcher(args.size, args.workers, args.delay, args.fail_every):
+            sys.exit(1)
+    elif args.command == 'backfill':
+        bench_backfill(args.size, args.workers, args.delay, args.history_days)
+    elif args.command == 'archive':
+        bench_archive(args.sizes, args.by)
+    elif args.command == 'service':
+        bench_service(args.size, args.clients, args.seconds, args.url)
+    elif args.command == 'snapshot':
+        bench_snapshot(args.size, args.workers)
+    elif args.command == 'suite':
+        flags = bench_suite(args.sizes, args.repeat, args.batch_size, args.output, args.baseline,
+                            args.tolerance, args.save_baseline)
+        if flags:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
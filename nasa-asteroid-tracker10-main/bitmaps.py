@@ -0,0 +1,230 @@
+import argparse
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from columnar import PARITY_FILTERS, ColumnStore, to_day
+from migrations import migrate
+from queries import build_params
+
+# Bitmap filter index for the column store.
+#
+# One bit per approach, 64 rows to a uint64 word. The store keeps approaches
+# in date order, so the date range is a contiguous run of rows and only the
+# words under it are touched. Velocity, AU and lunar distance are split into
+# quantile bins and range-encoded: `below[j]` marks the rows whose value is
+# under the j-th bin edge, so a slider position maps to one bitmap instead of
+# an OR over bins. Only rows in the bin holding the slider value need an
+# exact comparison. Hazard and join flags are plain bitmaps.
+
+BINS = 32
+
+# (store column, params key, comparison) for every binned sidebar filter
+BINNED_FILTERS = [
+    ('velocity', 'velocity_min', '>='),
+    ('au', 'astro_limit', '<'),
+    ('lunar', 'lunar_limit', '<'),
+]
+
+ALL_BITS = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def pack(flags):
+    """Bool array as little-endian uint64 words, bit i of word w is row 64 * w + i."""
+    packed = np.packbits(flags, bitorder='little')
+    padded = np.zeros(-(-len(packed) // 8) * 8, dtype=np.uint8)
+    padded[:len(packed)] = packed
+    return padded.view('<u8')
+
+
+def unpack(words, count):
+    return np.unpackbits(words.view(np.uint8), count=count, bitorder='little').view(bool)
+
+
+class BinnedColumn:
+    """Range-encoded bitmaps over the quantile bins of one column."""
+
+    def __init__(self, values, bins=BINS):
+        self.values = values
+        valid = values[~np.isnan(values)]
+        quantiles = np.quantile(valid, np.linspace(0, 1, bins + 1)) if len(valid) else np.array([])
+        self.edges = np.append(np.unique(quantiles), np.inf)
+        self.below = np.stack([pack(values < edge) for edge in self.edges[:-1]] + [pack(~np.isnan(values))])
+
+    def resolve(self, value, comparison, lo, hi):
+        """(definite, boundary) words over [lo, hi) for `column <comparison> value`.
+
+        `boundary` is None when the value falls on a bin edge, i.e. the
+        definite rows are the exact answer.
+        """
+        k = int(np.searchsorted(self.edges, value, side='right')) - 1
+        below = self.below[:, lo:hi]
+        everything = below[-1]
+        if k < 0:
+            lower, upper = np.zeros_like(everything), None
+        elif value == self.edges[k] or k == len(self.edges) - 1:
+            lower, upper = below[k], None
+        else:
+            lower, upper = below[k], below[k + 1]
+        boundary = upper & ~lower if upper is not None else None
+        if comparison == '<':
+            return lower, boundary
+        definite = everything & ~(upper if upper is not None else lower)
+        return definite, boundary
+
+    def nbytes(self):
+        return self.below.nbytes
+
+
+class BitmapIndex:
+    """Resolves any sidebar filter combination to a row bitmap with word-wise AND/OR.
+
+    Built from a ColumnStore, whose approaches are sorted by date. `mask`
+    returns the same bool array as `ColumnStore.mask`.
+    """
+
+    def __init__(self, store, bins=BINS):
+        if len(store.day) and np.any(np.diff(store.day) < 0):
+            raise ValueError("BitmapIndex needs a store sorted by date")
+        self.store = store
+        self.rows = len(store.day)
+        # Date buckets: each distinct day and the row its run of approaches starts at
+        self.days, self.day_starts = np.unique(store.day.astype(np.int64), return_index=True)
+        self.day_starts = np.append(self.day_starts, self.rows)
+        self.columns = {name: BinnedColumn(getattr(store, name), bins) for name, _, _ in BINNED_FILTERS}
+        self.joined = pack(store.has_asteroid)
+        self.hazardous = pack(store.has_asteroid & store.hazard)
+
+    def nbytes(self):
+        return sum(c.nbytes() for c in self.columns.values()) + self.joined.nbytes + self.hazardous.nbytes
+
+    def row_range(self, params):
+        lo = self.day_starts[np.searchsorted(self.days, to_day(params['start_date']), side='left')]
+        hi = self.day_starts[np.searchsorted(self.days, to_day(params['end_date']), side='right')]
+        return int(lo), int(max(lo, hi))
+
+    def resolve(self, params, join=True, hazard=True):
+        """(first row, words) of the rows passing the filters; bit i of the words is row first + i."""
+        lo, hi = self.row_range(params)
+        first, last = lo // 64, -(-hi // 64)
+        words = np.full(last - first, ALL_BITS, dtype=np.uint64)
+        if not len(words):
+            return first * 64, words
+        # Clear the rows of the first and last word that fall outside the date range
+        words[0] &= ALL_BITS << np.uint64(lo % 64)
+        if hi % 64:
+            words[-1] &= ALL_BITS >> np.uint64(64 - hi % 64)
+
+        if join:
+            words &= self.joined[first:last]
+        if hazard and params['hazardous'] is not None:
+            words &= self.joined[first:last]
+            words &= self.hazardous[first:last] if params['hazardous'] else ~self.hazardous[first:last]
+
+        boundaries = np.zeros_like(words)
+        for name, key, comparison in BINNED_FILTERS:
+            definite, boundary = self.columns[name].resolve(params[key], comparison, first, last)
+            if boundary is None:
+                words &= definite
+            else:
+                words &= definite | boundary
+                boundaries |= boundary
+
+        # Exact check for the candidates that sit in a boundary bin
+        unsure = words & boundaries
+        hit = np.flatnonzero(unsure)
+        if len(hit):
+            bits = np.unpackbits(unsure[hit].view(np.uint8), bitorder='little').view(bool)
+            set_bits = np.flatnonzero(bits)
+            rows = (first + hit)[set_bits >> 6] * 64 + (set_bits & 63)
+            keep = np.ones(len(rows), dtype=bool)
+            for name, key, comparison in BINNED_FILTERS:
+                values = getattr(self.store, name)[rows]
+                keep &= values >= params[key] if comparison == '>=' else values < params[key]
+            bits[set_bits] = keep
+            words[hit] = (words[hit] & ~unsure[hit]) | np.packbits(bits, bitorder='little').view('<u8')
+        return first * 64, words
+
+    def mask(self, params, join=True, hazard=True):
+        """Bool array over every row, like ColumnStore.mask."""
+        start, words = self.resolve(params, join, hazard)
+        m = np.zeros(self.rows, dtype=bool)
+        end = min(self.rows, start + 64 * len(words))
+        m[start:end] = unpack(words, end - start)
+        return m
+
+    def count(self, params, join=True, hazard=True):
+        _, words = self.resolve(params, join, hazard)
+        return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def random_filters(store, count, seed=0):
+    """Filter tuples spread over the store's own value ranges, for parity checks."""
+    rng = np.random.default_rng(seed)
+    days = store.day
+    filters = []
+    for _ in range(count):
+        start, end = np.sort(rng.integers(days.min() - 10, days.max() + 10, 2)) if len(days) else (0, 0)
+        filters.append((
+            str(np.datetime64(int(start), 'D')), str(np.datetime64(int(end), 'D')),
+            float(rng.choice([0, rng.uniform(0, 150000), store.velocity[rng.integers(len(days))]])),
+            float(rng.choice([0.5, rng.uniform(0, 1), store.au[rng.integers(len(days))]])),
+            float(rng.choice([10.0, rng.uniform(0, 100), store.lunar[rng.integers(len(days))]])),
+            rng.choice(["All", "Yes", "No"]),
+        ))
+    return filters
+
+
+def check_parity(store, index, filter_sets):
+    """Filters (and join/hazard variants) whose bitmap mask differs from the scanned mask."""
+    mismatches = []
+    for filters in filter_sets:
+        params = build_params(*filters)
+        for join, hazard in ((True, True), (False, True), (True, False)):
+            if not np.array_equal(index.mask(params, join, hazard), store.mask(params, join, hazard)):
+                mismatches.append((filters, join, hazard))
+    return mismatches
+
+
+def time_filters(store, index, filter_sets, repeat=20):
+    """Mean milliseconds per filter for the row-by-row mask, bitmap resolve and bitmap mask."""
+    timings = []
+    for run in (lambda p: store.mask(p), lambda p: index.resolve(p), lambda p: index.mask(p)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for filters in filter_sets:
+                run(build_params(*filters))
+        timings.append((time.perf_counter() - started) * 1000 / (repeat * len(filter_sets)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bitmap filter index for the column store")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--bins', type=int, default=BINS)
+    parser.add_argument('--check-parity', action='store_true', help="compare bitmap masks with scanned masks")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+    store = ColumnStore.from_sqlite(conn)
+    started = time.perf_counter()
+    index = BitmapIndex(store, args.bins)
+    print(f"Indexed {len(store)} approaches in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({index.nbytes() / 1e6:.1f} MB of bitmaps)")
+    filter_sets = PARITY_FILTERS + random_filters(store, 200)
+    scanned, resolved, masked = time_filters(store, index, filter_sets)
+    print(f"Per filter: scan {scanned:.3f} ms, bitmap resolve {resolved:.3f} ms, bitmap mask {masked:.3f} ms")
+    if args.check_parity:
+        mismatches = check_parity(store, index, filter_sets)
+        for filters, join, hazard in mismatches[:20]:
+            print(f"❌ {filters} join={join} hazard={hazard}")
+        if mismatches:
+            sys.exit(1)
+        print(f"✅ Bitmap masks match the scanned masks for {len(filter_sets)} filter sets")
+
+
+if __name__ == '__main__':
+    main()
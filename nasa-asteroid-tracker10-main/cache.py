@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+from queries import UNFILTERED_QUERIES
+
+
+def normalize_filters(query_name, start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous):
+    """Canonical filter tuple for a cache key.
+
+    Values are coerced to the slider resolutions so equivalent inputs share a
+    key, and analyses that ignore the sidebar filters all share the empty tuple.
+    """
+    if query_name in UNFILTERED_QUERIES:
+        return ()
+    return (
+        str(start_date),
+        str(end_date),
+        int(velocity_min),
+        round(float(astro_limit), 2),
+        round(float(lunar_limit), 1),
+        hazardous,
+    )
+
+
+def frame_size(df):
+    """Bytes held by a DataFrame, including object (string) columns."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results bounded by total DataFrame memory.
+
+    Keys are (analysis name, normalized filter tuple, data version); a loader
+    write bumps the data version, so stale entries are never hit again and
+    simply age out. Concurrent misses on the same key run the query once.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def get_or_compute(self, key, compute):
+        started = time.perf_counter()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                df = self.entries[key][0]
+                self.hits += 1
+                self.hit_seconds += time.perf_counter() - started
+                return df
+            event = self.in_flight.get(key)
+            owner = event is None
+            if owner:
+                event = self.in_flight[key] = threading.Event()
+
+        if not owner:
+            # Another session is already running this query; wait for its result
+            event.wait()
+            with self.lock:
+                if key in self.entries:
+                    self.hits += 1
+                    self.hit_seconds += time.perf_counter() - started
+                    return self.entries[key][0]
+            return self.get_or_compute(key, compute)
+
+        try:
+            df = compute()
+            self.put(key, df)
+        finally:
+            with self.lock:
+                self.in_flight.pop(key).set()
+                self.misses += 1
+                self.miss_seconds += time.perf_counter() - started
+        return df
+
+    def put(self, key, df):
+        size = frame_size(df)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (df, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, data_version=None):
+        """Drop every entry, or only entries built from another data version."""
+        with self.lock:
+            for key in list(self.entries):
+                if data_version is None or key[2] != data_version:
+                    self.bytes -= self.entries.pop(key)[1]
+
+    def set_data_version(self, data_version):
+        """Free entries from older data as soon as a new data version is seen."""
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.invalidate(data_version)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'avg_hit_ms': 1000 * self.hit_seconds / self.hits if self.hits else 0.0,
+                'avg_miss_ms': 1000 * self.miss_seconds / self.misses if self.misses else 0.0,
+            }
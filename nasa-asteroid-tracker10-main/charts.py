@@ -0,0 +1,267 @@
+import argparse
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from queries import WHERE_CA, build_params, run_query
+
+# Charts for the time-ordered views, reduced to a fixed point budget before
+# they reach the browser, whatever the filter width.
+#
+# Line charts use MinMaxLTTB: the filtered approaches are grouped into
+# POINT_BUDGET * PRESELECT / 2 equal time buckets in one grouped pass, each
+# bucket contributes its minimum and maximum, and Largest-Triangle-Three-
+# Buckets picks POINT_BUDGET of those points. The scatter counts approaches
+# in a fixed grid of velocity x miss-distance cells. Both run in SQLite or on
+# the column store, with the same buckets and cells.
+
+POINT_BUDGET = 500
+PRESELECT = 4
+
+# Velocity x miss-distance cells of the scatter
+SCATTER_BINS = (48, 32)
+# Upper edges of the scatter axes; values beyond them land in the last cell.
+# The feed lists approaches within 0.5 AU, about 195 lunar distances.
+VELOCITY_MAX = 300000.0
+LUNAR_MAX = 200.0
+
+Chart = namedtuple('Chart', ['name', 'kind', 'columns'])
+
+CHARTS = [
+    Chart("Approaches per month", 'bar', ('month', 'count')),
+    Chart("Velocity over time", 'line', ('date', 'relative_velocity_kmph')),
+    Chart("Miss distance over time", 'line', ('date', 'miss_distance_lunar')),
+    Chart("Velocity vs. miss distance", 'scatter', ('relative_velocity_kmph', 'miss_distance_lunar', 'approaches')),
+]
+
+CHART_NAMES = [c.name for c in CHARTS]
+CHART_KINDS = {c.name: c.kind for c in CHARTS}
+
+# (SQLite column, column store array) of each line chart
+SERIES = {
+    "Velocity over time": ('ca.relative_velocity_kmph', 'velocity'),
+    "Miss distance over time": ('ca.miss_distance_lunar', 'lunar'),
+}
+
+# The filter's date range narrowed to the stored dates, as two index seeks
+DATE_SPAN_SQL = '''
+SELECT (SELECT MIN(close_approach_date) FROM close_approach WHERE close_approach_date BETWEEN :start_date AND :end_date),
+       (SELECT MAX(close_approach_date) FROM close_approach WHERE close_approach_date BETWEEN :start_date AND :end_date)
+'''
+
+SERIES_SQL = '''
+SELECT CAST(julianday(ca.close_approach_date) - julianday(:first_date) AS INTEGER) * :buckets / :span AS bucket,
+       MIN({column}), MAX({column})
+FROM close_approach ca
+WHERE {where}
+GROUP BY bucket
+ORDER BY bucket
+'''
+
+SCATTER_SQL = f'''
+SELECT MIN(CAST((ca.relative_velocity_kmph - :x_first) * :x_bins / :x_span AS INTEGER), :x_bins - 1) AS x,
+       MIN(CAST(ca.miss_distance_lunar * :y_bins / :y_span AS INTEGER), :y_bins - 1) AS y,
+       COUNT(*)
+FROM close_approach ca
+WHERE {WHERE_CA}
+GROUP BY x, y
+ORDER BY x, y
+'''
+
+
+def lttb(x, y, budget):
+    """Indices of `budget` points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between keeps the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    n = len(x)
+    if n <= budget or budget < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    picked = np.empty(budget, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi, following = edges[i], edges[i + 1], edges[i + 2]
+        next_x, next_y = x[hi:following].mean(), y[hi:following].mean()
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def frame(name, *columns):
+    import pandas as pd
+
+    names = next(c.columns for c in CHARTS if c.name == name)
+    return pd.DataFrame({n: np.asarray(col) for n, col in zip(names, columns)}, columns=list(names))
+
+
+def date_span(conn, params):
+    """(first day, day count) of the stored dates inside the filter's range, or None when there are none."""
+    first, last = conn.execute(DATE_SPAN_SQL, params).fetchone()
+    if first is None:
+        return None
+    return first, int((np.datetime64(last) - np.datetime64(first)).astype(np.int64)) + 1
+
+
+def store_date_span(store, params):
+    from columnar import day_strings, to_day
+
+    lo = np.searchsorted(store.day, to_day(params['start_date']), side='left')
+    hi = np.searchsorted(store.day, to_day(params['end_date']), side='right')
+    if hi <= lo:
+        return None
+    first, last = int(store.day[lo]), int(store.day[hi - 1])
+    return str(day_strings(np.array([first]))[0]), last - first + 1
+
+
+def envelope_points(name, first_date, span, buckets, minima, maxima, budget):
+    """Each bucket's min and max at the bucket's middle, thinned to `budget` points with LTTB."""
+    buckets_total = POINT_BUDGET * PRESELECT // 2
+    middle = (np.asarray(buckets, dtype=np.float64) + 0.5) * span / buckets_total
+    days = np.repeat(middle, 2)
+    values = np.column_stack([minima, maxima]).ravel().astype(np.float64)
+    keep = lttb(days, values, budget)
+    dates = np.datetime64(first_date, 'ms') + (days[keep] * 86400000).astype('timedelta64[ms]')
+    return frame(name, dates, values[keep])
+
+
+def monthly_chart(name, monthly, budget):
+    monthly = monthly.sort_values('month', kind='stable')
+    keep = lttb(np.arange(len(monthly), dtype=np.float64), monthly['count'].to_numpy(np.float64), budget)
+    return frame(name, monthly['month'].to_numpy(dtype=object)[keep], monthly['count'].to_numpy(np.int64)[keep])
+
+
+def scatter_params(params):
+    x_first = float(params['velocity_min'])
+    return {
+        'x_first': x_first, 'x_span': max(VELOCITY_MAX - x_first, 1.0), 'x_bins': SCATTER_BINS[0],
+        'y_span': min(float(params['lunar_limit']), LUNAR_MAX), 'y_bins': SCATTER_BINS[1],
+    }
+
+
+def scatter_cells(name, grid, x, y, counts):
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    velocity = grid['x_first'] + (x + 0.5) * grid['x_span'] / grid['x_bins']
+    lunar = (y + 0.5) * grid['y_span'] / grid['y_bins']
+    return frame(name, velocity, lunar, np.asarray(counts, dtype=np.int64))
+
+
+def sqlite_chart(conn, name, params, budget=POINT_BUDGET):
+    """Chart data computed in SQLite; at most `budget` points, or one row per occupied scatter cell."""
+    if name == "Approaches per month":
+        return monthly_chart(name, run_query(conn, name, params), budget)
+    if name in SERIES:
+        first_date, days = date_span(conn, params) or (params['start_date'], 1)
+        sql = SERIES_SQL.format(column=SERIES[name][0], where=WHERE_CA)
+        rows = conn.execute(sql, dict(params, first_date=first_date, span=days,
+                                      buckets=POINT_BUDGET * PRESELECT // 2)).fetchall()
+        buckets, minima, maxima = zip(*rows) if rows else ((), (), ())
+        return envelope_points(name, first_date, days, buckets, minima, maxima, budget)
+    grid = scatter_params(params)
+    if grid['y_span'] <= 0:
+        return frame(name, [], [], [])
+    rows = conn.execute(SCATTER_SQL, dict(params, **grid)).fetchall()
+    x, y, counts = zip(*rows) if rows else ((), (), ())
+    return scatter_cells(name, grid, x, y, counts)
+
+
+def columnar_chart(store, name, params, budget=POINT_BUDGET):
+    """Same result as `sqlite_chart`, from a ColumnStore."""
+    if name == "Approaches per month":
+        return monthly_chart(name, store.run(name, params), budget)
+    rows = np.flatnonzero(store.mask(params, join=False))
+    if name in SERIES:
+        from columnar import to_day
+
+        first_date, days = store_date_span(store, params) or (params['start_date'], 1)
+        if not len(rows):
+            return envelope_points(name, first_date, days, [], [], [], budget)
+        buckets_total = POINT_BUDGET * PRESELECT // 2
+        bucket = (store.day[rows].astype(np.int64) - to_day(first_date)) * buckets_total // days
+        # Rows are in date order, so each bucket is one contiguous run
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        values = getattr(store, SERIES[name][1])[rows]
+        return envelope_points(name, first_date, days, bucket[starts],
+                               np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts), budget)
+    grid = scatter_params(params)
+    if grid['y_span'] <= 0:
+        return frame(name, [], [], [])
+    if not len(rows):
+        return scatter_cells(name, grid, [], [], [])
+    x = np.minimum(((store.velocity[rows] - grid['x_first']) * grid['x_bins'] / grid['x_span']).astype(np.int64),
+                   grid['x_bins'] - 1)
+    y = np.minimum((store.lunar[rows] * grid['y_bins'] / grid['y_span']).astype(np.int64), grid['y_bins'] - 1)
+    cells, counts = np.unique(x * grid['y_bins'] + y, return_counts=True)
+    return scatter_cells(name, grid, cells // grid['y_bins'], cells % grid['y_bins'], counts)
+
+
+def chart_data(name, params, conn=None, store=None, budget=POINT_BUDGET):
+    """Chart data from the column store when one is given, otherwise from SQLite."""
+    if store is not None:
+        return columnar_chart(store, name, params, budget)
+    return sqlite_chart(conn, name, params, budget)
+
+
+def payload_bytes(df):
+    """Size of the chart data as sent to the browser (JSON records)."""
+    return len(df.to_json(orient='records', date_format='iso'))
+
+
+def check_parity(conn, store, filter_sets):
+    """Charts whose SQLite and column store data differ, as (chart, filters)."""
+    mismatches = []
+    for filters in filter_sets:
+        params = build_params(*filters)
+        for name in CHART_NAMES:
+            expected, actual = sqlite_chart(conn, name, params), columnar_chart(store, name, params)
+            if not expected.equals(actual):
+                mismatches.append((name, filters))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsampled chart data for the time-ordered views")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--check-parity', action='store_true', help="compare SQLite and column store chart data")
+    args = parser.parse_args()
+
+    from columnar import PARITY_FILTERS, ColumnStore
+    from migrations import migrate
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+    store = ColumnStore.from_sqlite(conn)
+    low, high = conn.execute('SELECT MIN(close_approach_date), MAX(close_approach_date) FROM close_approach').fetchone()
+    widths = [('1 week', low, str(np.datetime64(low) + 6)), ('1 year', low, str(np.datetime64(low) + 364)),
+              ('everything', low, high)]
+    print(f"{'chart':<28} {'range':<11} {'points':>6} {'payload kB':>10} {'sqlite ms':>9} {'columnar ms':>11}")
+    for name in CHART_NAMES:
+        for label, start, end in widths:
+            params = build_params(start, end, 0, 1.0, 1000.0, "All")
+            timings = []
+            for compute in (lambda: sqlite_chart(conn, name, params), lambda: columnar_chart(store, name, params)):
+                started = time.perf_counter()
+                df = compute()
+                timings.append(1000 * (time.perf_counter() - started))
+            print(f"{name:<28} {label:<11} {len(df):>6} {payload_bytes(df) / 1024:>10.1f} "
+                  f"{timings[0]:>9.1f} {timings[1]:>11.1f}")
+    if args.check_parity:
+        filter_sets = PARITY_FILTERS + [(low, high, 0, 1.0, 1000.0, "All")]
+        mismatches = check_parity(conn, store, filter_sets)
+        for name, filters in mismatches:
+            print(f"❌ {name} {filters}")
+        if mismatches:
+            sys.exit(1)
+        print(f"✅ Chart data matches between SQLite and the column store for {len(filter_sets)} filter sets")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,554 @@
+import argparse
+import sqlite3
+import sys
+
+import numpy as np
+
+from migrations import migrate
+from queries import ANALYSES, FILTER, QUERIES, TREND_LIMIT, TREND_MIN_APPROACHES, build_params
+
+# Approaches are kept in the same order as idx_close_approach_date_cover, so
+# analyses that stop at a LIMIT without an ORDER BY return the same rows as
+# SQLite, which walks that index.
+APPROACH_SELECT = '''
+SELECT ca.neo_reference_id, ca.close_approach_date, ca.relative_velocity_kmph,
+       ca.astronomical, {km}, ca.miss_distance_lunar
+FROM close_approach ca
+{where}
+ORDER BY ca.close_approach_date, ca.astronomical, ca.miss_distance_lunar, ca.relative_velocity_kmph, ca.neo_reference_id
+'''
+
+ASTEROID_SELECT = '''
+SELECT id, name, absolute_magnitude_h, estimated_diameter_min_km,
+       estimated_diameter_max_km, is_potentially_hazardous_asteroid
+FROM asteroids
+{where}
+ORDER BY id
+'''
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def to_day(value):
+    """Day number (days since 1970-01-01) of a YYYY-MM-DD string or date."""
+    return int((np.datetime64(str(value)[:10], 'D') - EPOCH).astype(np.int64))
+
+
+def day_strings(days):
+    return (days.astype('datetime64[D]')).astype(str)
+
+
+def month_strings(months):
+    """YYYY-MM strings for month numbers (year * 12 + month - 1)."""
+    return np.array([f"{m // 12:04d}-{m % 12 + 1:02d}" for m in months.tolist()], dtype=object)
+
+
+# Every array a ColumnStore holds, including the derived ones, so a store can
+# be rebuilt from saved columns without recomputing anything
+STORED_COLUMNS = [
+    'neo_id', 'day', 'velocity', 'au', 'km', 'lunar',
+    'ast_id', 'ast_name_code', 'names', 'ast_magnitude', 'ast_dmin', 'ast_dmax', 'ast_hazard',
+    'month', 'has_asteroid', 'ast_index', 'hazard', 'by_asteroid',
+]
+
+
+class ColumnStore:
+    """close_approach joined with asteroids, held as contiguous NumPy columns.
+
+    Dates are int32 day numbers, the hazard flag is a bool array and asteroid
+    names are dictionary-encoded. Every analysis in queries.py runs as
+    vectorized masks, bincount/reduceat group-bys and argpartition top-k.
+    After `index_filters()` the sidebar filters resolve through a bitmap
+    index (bitmaps.py) instead of comparing every row.
+    """
+
+    bitmaps = None
+
+    def __init__(self, neo_id, day, velocity, au, km, lunar,
+                 ast_id, ast_name_code, names, ast_magnitude, ast_dmin, ast_dmax, ast_hazard):
+        # Approach columns
+        self.neo_id = neo_id
+        self.day = day
+        self.velocity = velocity
+        self.au = au
+        self.km = km
+        self.lunar = lunar
+        # Asteroid columns, sorted by id
+        self.ast_id = ast_id
+        self.ast_name_code = ast_name_code
+        self.names = names
+        self.ast_magnitude = ast_magnitude
+        self.ast_dmin = ast_dmin
+        self.ast_dmax = ast_dmax
+        self.ast_hazard = ast_hazard
+        self.derive()
+
+    def derive(self):
+        """Join keys, month numbers and sort orders computed from the stored columns."""
+        dates = self.day.astype('datetime64[D]')
+        years = dates.astype('datetime64[Y]').astype(np.int32) + 1970
+        month_of_year = dates.astype('datetime64[M]').astype(np.int32) % 12
+        self.month = (years * 12 + month_of_year).astype(np.int32)
+
+        # Row -> asteroid index; has_asteroid marks rows that survive an inner join
+        if len(self.ast_id):
+            position = np.searchsorted(self.ast_id, self.neo_id)
+            position = np.minimum(position, len(self.ast_id) - 1)
+            self.has_asteroid = self.ast_id[position] == self.neo_id
+        else:
+            position = np.zeros(len(self.neo_id), dtype=np.int64)
+            self.has_asteroid = np.zeros(len(self.neo_id), dtype=bool)
+        self.ast_index = position.astype(np.int32)
+        self.hazard = np.where(self.has_asteroid, self.ast_hazard[self.ast_index] if len(self.ast_id) else False, False)
+
+        # Rows grouped by asteroid and ordered by date within each asteroid
+        self.by_asteroid = np.lexsort((self.day, self.neo_id))
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Store over already-derived arrays (e.g. memory-mapped snapshot columns)."""
+        store = cls.__new__(cls)
+        for name in STORED_COLUMNS:
+            setattr(store, name, columns[name])
+        return store
+
+    def columns(self):
+        return {name: getattr(self, name) for name in STORED_COLUMNS}
+
+    @classmethod
+    def from_sqlite(cls, conn, chunk_size=100000, params=None):
+        """Load every approach, or with `params` only those passing the sidebar filters.
+
+        The filter is the date/distance/velocity part of the WHERE clause; the
+        hazard radio is left to `mask`. A filtered store holds only the
+        asteroids its approaches reference, so the asteroid-only analyses
+        (largest, brightest) no longer see every asteroid. It also leaves
+        `km` as NaN: no analysis reads it and it is the one column outside
+        idx_close_approach_date_cover, so skipping it keeps the scan index-only.
+        """
+        where = 'WHERE' + FILTER if params is not None else ''
+        asteroid_where = f'WHERE id IN (SELECT ca.neo_reference_id FROM close_approach ca {where})' if where else ''
+        params = params or {}
+        count = conn.execute(f'SELECT COUNT(*) FROM close_approach ca {where}', params).fetchone()[0]
+        neo_id = np.empty(count, dtype=np.int64)
+        day = np.empty(count, dtype=np.int32)
+        numbers = np.empty((count, 4), dtype=np.float64)
+        km = 'NULL' if where else 'ca.miss_distance_km'
+        cursor = conn.execute(APPROACH_SELECT.format(km=km, where=where), params)
+        offset = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            end = offset + len(rows)
+            columns = list(zip(*rows))
+            neo_id[offset:end] = columns[0]
+            day[offset:end] = (np.array(columns[1], dtype='datetime64[D]') - EPOCH).astype(np.int32)
+            numbers[offset:end] = np.array(columns[2:], dtype=np.float64).T
+            offset = end
+
+        asteroids = conn.execute(ASTEROID_SELECT.format(where=asteroid_where), params).fetchall()
+        columns = list(zip(*asteroids)) or [()] * 6
+        names, name_code = np.unique(np.array(columns[1], dtype=object).astype(str), return_inverse=True)
+        return cls(
+            neo_id, day,
+            np.ascontiguousarray(numbers[:, 0]), np.ascontiguousarray(numbers[:, 1]),
+            np.ascontiguousarray(numbers[:, 2]), np.ascontiguousarray(numbers[:, 3]),
+            np.array(columns[0], dtype=np.int64),
+            name_code.astype(np.int32),
+            names.astype(object),
+            np.array(columns[2], dtype=np.float64),
+            np.array(columns[3], dtype=np.float64),
+            np.array(columns[4], dtype=np.float64),
+            np.array(columns[5], dtype=bool),
+        )
+
+    def __len__(self):
+        return len(self.neo_id)
+
+    def index_filters(self, bins=None):
+        """Build the bitmap filter index that `mask` uses from then on."""
+        from bitmaps import BINS, BitmapIndex
+        self.bitmaps = BitmapIndex(self, bins or BINS)
+        return self
+
+    # Building blocks
+
+    def mask(self, params, join=True, hazard=True):
+        """Rows passing the sidebar filters; `join` also requires a matching asteroid."""
+        if self.bitmaps is not None:
+            return self.bitmaps.mask(params, join, hazard)
+        m = (
+            (self.day >= to_day(params['start_date']))
+            & (self.day <= to_day(params['end_date']))
+            & (self.au < params['astro_limit'])
+            & (self.lunar < params['lunar_limit'])
+            & (self.velocity >= params['velocity_min'])
+        )
+        if join:
+            m &= self.has_asteroid
+        if hazard and params['hazardous'] is not None:
+            m &= self.has_asteroid & (self.hazard == bool(params['hazardous']))
+        return m
+
+    def name_strings(self, codes):
+        names = self.names[codes]
+        # Snapshot dictionaries are fixed-width UTF-8; decode only the rows returned
+        return np.char.decode(names, 'utf-8').astype(object) if names.dtype.kind == 'S' else names
+
+    def name_of(self, rows):
+        return self.name_strings(self.ast_name_code[self.ast_index[rows]])
+
+    def dates_of(self, rows):
+        return day_strings(self.day[rows])
+
+    def groups(self, m):
+        """Masked rows ordered by (asteroid, date), with the start offset of each asteroid."""
+        rows = self.by_asteroid[m[self.by_asteroid]]
+        ids = self.neo_id[rows]
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(rows) else np.array([], dtype=np.int64)
+        return rows, starts
+
+    def per_asteroid(self, m):
+        """(ids, counts, rows, starts) for the asteroids with rows in `m`."""
+        rows, starts = self.groups(m)
+        counts = np.diff(np.r_[starts, len(rows)])
+        return self.neo_id[rows[starts]], counts, rows, starts
+
+    @staticmethod
+    def top_k(values, k, descending):
+        """Indices of the k largest/smallest values, in sorted order (stable for ties)."""
+        keys = -values if descending else values
+        if len(keys) > k:
+            # Keep everything tied with the k-th value so the stable sort below picks like SQLite
+            threshold = keys[np.argpartition(keys, k - 1)[k - 1]]
+            candidates = np.flatnonzero(keys <= threshold)
+        else:
+            candidates = np.arange(len(keys))
+        order = candidates[np.argsort(keys[candidates], kind='stable')]
+        return order[:k]
+
+    def frame(self, query_name, *columns):
+        import pandas as pd
+
+        names = QUERIES[query_name].columns
+        return pd.DataFrame({name: np.asarray(col) for name, col in zip(names, columns)}, columns=list(names))
+
+    # Analyses
+
+    def run(self, query_name, params):
+        """Run an analysis from queries.py and return a DataFrame like the SQLite path."""
+        return ANALYSIS_FUNCTIONS[query_name](self, query_name, params)
+
+    def row_listing(self, query_name, params, extra, columns, limit, join=True):
+        m = self.mask(params, join=join)
+        if extra is not None:
+            m &= extra
+        rows = np.flatnonzero(m)[:limit]
+        return self.frame(query_name, *[column(rows) for column in columns])
+
+    def sorted_listing(self, query_name, params, values, descending, columns, limit):
+        m = self.mask(params)
+        rows = np.flatnonzero(m)
+        rows = rows[self.top_k(values[rows], limit, descending)]
+        return self.frame(query_name, *[column(rows) for column in columns])
+
+
+def all_filtered(store, name, params):
+    m = store.mask(params)
+    rows = np.flatnonzero(m)[:QUERIES[name].limit]
+    ast = store.ast_index[rows]
+    return store.frame(name, store.name_of(rows), store.ast_magnitude[ast], store.ast_dmin[ast],
+                       store.ast_dmax[ast], store.ast_hazard[ast].astype(np.int64), store.dates_of(rows),
+                       store.velocity[rows], store.au[rows], store.lunar[rows])
+
+
+def count_approaches(store, name, params):
+    ids, counts, _, _ = store.per_asteroid(store.mask(params, join=False))
+    limit = QUERIES[name].limit
+    return store.frame(name, ids[:limit], counts[:limit])
+
+
+def average_velocity(store, name, params):
+    ids, counts, rows, starts = store.per_asteroid(store.mask(params, join=False))
+    sums = np.add.reduceat(store.velocity[rows], starts) if len(rows) else np.array([])
+    limit = QUERIES[name].limit
+    return store.frame(name, ids[:limit], (sums / np.maximum(counts, 1))[:limit])
+
+
+def top_fastest(store, name, params):
+    ids, _, rows, starts = store.per_asteroid(store.mask(params, join=False))
+    maxima = np.maximum.reduceat(store.velocity[rows], starts) if len(rows) else np.array([])
+    top = store.top_k(maxima, QUERIES[name].limit, descending=True)
+    return store.frame(name, ids[top], maxima[top])
+
+
+def hazardous_repeaters(store, name, params):
+    ids, counts, _, _ = store.per_asteroid(store.has_asteroid & store.hazard)
+    keep = counts > 3
+    limit = QUERIES[name].limit
+    return store.frame(name, ids[keep][:limit], counts[keep][:limit])
+
+
+def month_counts(store, m):
+    months = store.month[m]
+    if not len(months):
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int64)
+    low = months.min()
+    counts = np.bincount(months - low)
+    present = np.flatnonzero(counts)
+    return present.astype(np.int32) + low, counts[present]
+
+
+def busiest_month(store, name, params):
+    months, counts = month_counts(store, store.mask(params, join=False))
+    top = store.top_k(counts, 1, descending=True)
+    return store.frame(name, month_strings(months[top]), counts[top])
+
+
+def approaches_per_month(store, name, params):
+    months, counts = month_counts(store, store.mask(params, join=False))
+    limit = QUERIES[name].limit
+    return store.frame(name, month_strings(months[:limit]), counts[:limit])
+
+
+def fastest_ever(store, name, params):
+    if not len(store):
+        return store.frame(name, [], [], [])
+    rows = np.flatnonzero(store.velocity == store.velocity.max())[:1]
+    return store.frame(name, store.neo_id[rows], store.velocity[rows], store.dates_of(rows))
+
+
+def largest_asteroids(store, name, params):
+    top = store.top_k(store.ast_dmax, QUERIES[name].limit, descending=True)
+    return store.frame(name, store.ast_id[top], store.name_strings(store.ast_name_code[top]), store.ast_dmax[top])
+
+
+def brightest_asteroid(store, name, params):
+    top = store.top_k(store.ast_magnitude, 1, descending=False)
+    return store.frame(name, store.ast_id[top], store.name_strings(store.ast_name_code[top]), store.ast_magnitude[top])
+
+
+def trend(column, falling):
+    """Least-squares slope per asteroid, ranked, then the monotonicity of the asteroids kept."""
+    def run(store, name, params):
+        values = getattr(store, column)
+        _, counts, rows, starts = store.per_asteroid(store.mask(params, join=False))
+        if not len(rows):
+            return store.frame(name, [], [], [], [])
+        t = (store.day[rows] - to_day(params['start_date'])).astype(np.float64)
+        y = values[rows]
+        n = counts.astype(np.float64)
+        st, sy = np.add.reduceat(t, starts), np.add.reduceat(y, starts)
+        sty, stt = np.add.reduceat(t * y, starts), np.add.reduceat(t * t, starts)
+        denominator = n * stt - st * st
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(denominator != 0, 365.25 * (n * sty - st * sy) / denominator, np.nan)
+        qualifies = (counts >= TREND_MIN_APPROACHES) & (slope < 0 if falling else slope > 0)
+        ids = store.neo_id[rows[starts]]
+        kept = np.flatnonzero(qualifies)
+        kept = kept[np.lexsort((ids[kept], slope[kept] if falling else -slope[kept]))][:TREND_LIMIT]
+
+        # Rows of the kept asteroids, ordered by (asteroid rank, date, value) like the LAG window
+        lengths = counts[kept]
+        group = np.repeat(np.arange(len(kept)), lengths)
+        first = np.repeat(starts[kept] - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+        members = rows[first + np.arange(len(group))]
+        order = np.lexsort((values[members], store.day[members], group))
+        steps = np.diff(values[members[order]])
+        moved = (steps < 0 if falling else steps > 0) & (group[1:] == group[:-1])
+        monotonicity = np.bincount(group[1:][moved], minlength=len(kept)) / (lengths - 1)
+        return store.frame(name, ids[kept], counts[kept], slope[kept], monotonicity)
+    return run
+
+
+def closest_by_asteroid(store, name, params):
+    _, counts, rows, starts = store.per_asteroid(store.mask(params))
+    if not len(rows):
+        return store.frame(name, [], [], [])
+    lunar = store.lunar[rows]
+    minima = np.minimum.reduceat(lunar, starts)
+    # First row of each group holding the group's minimum (SQLite's bare-column rule for MIN)
+    group = np.repeat(np.arange(len(starts)), counts)
+    hits = np.flatnonzero(lunar == minima[group])
+    first_hit = hits[np.r_[True, group[hits][1:] != group[hits][:-1]]]
+    chosen = rows[first_hit]
+    limit = QUERIES[name].limit
+    return store.frame(name, store.name_of(chosen)[:limit], store.dates_of(chosen)[:limit], minima[:limit])
+
+
+def hazard_labels(flags):
+    return np.where(flags, 'Hazardous', 'Non-Hazardous').astype(object)
+
+
+def hazard_asteroid_count(store, name, params):
+    rows = np.flatnonzero(store.mask(params, hazard=False))[:10000]
+    hazardous = np.count_nonzero(store.hazard[rows])
+    pairs = [('Hazardous', hazardous), ('Non-Hazardous', len(rows) - hazardous)]
+    pairs = [p for p in pairs if p[1]]
+    return store.frame(name, np.array([p[0] for p in pairs], dtype=object), np.array([p[1] for p in pairs], dtype=np.int64))
+
+
+def hazard_event_count(store, name, params):
+    flags = store.hazard[store.mask(params)]
+    counts = np.bincount(flags.astype(np.int64), minlength=2)
+    present = np.flatnonzero(counts)
+    return store.frame(name, hazard_labels(present.astype(bool)), counts[present])
+
+
+def month_listing(store, name, params):
+    year, month = str(params['start_date'])[:7].split('-')
+    target = int(year) * 12 + int(month) - 1
+    return store.row_listing(name, params, store.month == target,
+                             [store.name_of, store.dates_of, lambda r: store.lunar[r]], QUERIES[name].limit)
+
+
+def frequent_asteroids(store, name, params):
+    ids, counts, _, _ = store.per_asteroid(store.mask(params, join=False))
+    top = store.top_k(counts, QUERIES[name].limit, descending=True)
+    return store.frame(name, ids[top], counts[top])
+
+
+def monthly_repeaters(store, name, params):
+    rows, _ = store.groups(store.mask(params, join=False))
+    ids, months = store.neo_id[rows], store.month[rows]
+    if not len(rows):
+        return store.frame(name, [], [], [])
+    starts = np.flatnonzero(np.r_[True, (ids[1:] != ids[:-1]) | (months[1:] != months[:-1])])
+    counts = np.diff(np.r_[starts, len(rows)])
+    keep = np.flatnonzero(counts > 1)[:QUERIES[name].limit]
+    return store.frame(name, ids[starts[keep]], month_strings(months[starts[keep]]), counts[keep])
+
+
+ANALYSIS_FUNCTIONS = {
+    "All Filtered Asteroids": all_filtered,
+    "Count asteroid approaches": count_approaches,
+    "Average velocity of each asteroid": average_velocity,
+    "Top 10 fastest asteroids": top_fastest,
+    "Hazardous asteroids with >3 approaches": hazardous_repeaters,
+    "Month with most approaches": busiest_month,
+    "Fastest ever asteroid approach": fastest_ever,
+    "Asteroids sorted by max estimated diameter": largest_asteroids,
+    "Asteroids getting closer over time": trend('lunar', falling=True),
+    "Closest approach details by asteroid": closest_by_asteroid,
+    "Asteroids with velocity > 50000 km/h": lambda s, n, p: s.row_listing(
+        n, p, s.velocity > 50000, [s.name_of, lambda r: s.velocity[r], s.dates_of], QUERIES[n].limit),
+    "Approaches per month": approaches_per_month,
+    "Asteroid with highest brightness (lowest magnitude)": brightest_asteroid,
+    "Hazardous vs non-hazardous asteroid count": hazard_asteroid_count,
+    "Hazardous vs non-hazardous approach events": hazard_event_count,
+    "Asteroids closer than Moon": lambda s, n, p: s.row_listing(
+        n, p, s.lunar < 1.0, [s.name_of, s.dates_of, lambda r: s.lunar[r]], QUERIES[n].limit),
+    "Asteroids within 0.05 AU": lambda s, n, p: s.row_listing(
+        n, p, s.au < 0.05, [s.name_of, s.dates_of, lambda r: s.au[r]], QUERIES[n].limit),
+    "Asteroids with maximum relative velocity": lambda s, n, p: s.sorted_listing(
+        n, p, s.velocity, True, [s.name_of, lambda r: s.velocity[r], s.dates_of], QUERIES[n].limit),
+    "Asteroids with the closest approach to Earth": lambda s, n, p: s.sorted_listing(
+        n, p, s.lunar, False, [s.name_of, s.dates_of, lambda r: s.lunar[r]], QUERIES[n].limit),
+    "Asteroids with the highest estimated diameter": lambda s, n, p: s.sorted_listing(
+        n, p, s.ast_dmax[s.ast_index], True,
+        [s.name_of, lambda r: s.ast_dmax[s.ast_index[r]], lambda r: s.ast_dmin[s.ast_index[r]]], QUERIES[n].limit),
+    "Asteroids approaching at high velocity": lambda s, n, p: s.row_listing(
+        n, p, s.velocity > 60000, [s.name_of, lambda r: s.velocity[r], s.dates_of], QUERIES[n].limit),
+    "Asteroids approaching Earth during a specific month": month_listing,
+    "Asteroids with highest approach frequency": frequent_asteroids,
+    "Asteroids with the highest miss distance": lambda s, n, p: s.sorted_listing(
+        n, p, s.lunar, True, [s.name_of, s.dates_of, lambda r: s.lunar[r]], QUERIES[n].limit),
+    "Asteroids with multiple approaches in a month": monthly_repeaters,
+    "Asteroids that are both fast and hazardous": lambda s, n, p: s.row_listing(
+        n, p, (s.velocity > 50000) & s.hazard, [s.name_of, lambda r: s.velocity[r], s.dates_of], QUERIES[n].limit),
+    "Asteroids with increasing approach velocity over time": trend('velocity', falling=False),
+}
+
+
+# Parity with the SQLite path
+
+# Top-k analyses ranked on counts, where ties at the cut-off make the chosen
+# rows arbitrary; only the ranked values are compared for these.
+TIE_COLUMNS = {
+    "Month with most approaches": "total",
+    "Asteroids with highest approach frequency": "approach_count",
+    "Top 10 fastest asteroids": "max_velocity",
+    "Asteroids sorted by max estimated diameter": "estimated_diameter_max_km",
+    "Asteroids with the highest estimated diameter": "estimated_diameter_max_km",
+}
+
+# Least-squares slopes are differences of large sums, which SQLite and NumPy
+# add up in different orders; they are compared to a relative tolerance.
+APPROXIMATE_COLUMNS = {
+    "Asteroids getting closer over time": "lunar_per_year",
+    "Asteroids with increasing approach velocity over time": "kmph_per_year",
+}
+
+PARITY_FILTERS = [
+    ('2024-01-01', '2025-01-01', 0, 0.5, 10.0, "All"),
+    ('2024-01-01', '2025-01-01', 0, 0.5, 10.0, "Yes"),
+    ('2024-03-01', '2024-08-31', 40000, 0.2, 50.0, "No"),
+    ('2000-01-01', '2100-12-31', 0, 1.0, 1000.0, "All"),
+    ('2024-06-15', '2024-06-20', 0, 1.0, 100.0, "All"),
+]
+
+
+def normalized_rows(df):
+    rows = []
+    for row in df.itertuples(index=False):
+        rows.append(tuple(round(float(v), 6) if isinstance(v, (float, np.floating)) else
+                          int(v) if isinstance(v, (bool, np.bool_, np.integer)) else v for v in row))
+    return rows
+
+
+def check_parity(conn, store, filter_sets=PARITY_FILTERS):
+    """Compare every analysis between SQLite and the column store; returns a list of mismatches."""
+    import pandas as pd
+
+    from queries import run_query
+
+    mismatches = []
+    for filters in filter_sets:
+        params = build_params(*filters)
+        for analysis in ANALYSES:
+            expected = run_query(conn, analysis.name, params)
+            actual = store.run(analysis.name, params)
+            truncated = analysis.limit and len(expected) == analysis.limit and 'ORDER BY' not in analysis.sql
+            if truncated:
+                # LIMIT without ORDER BY may keep any matching rows, depending on SQLite's plan
+                everything = conn.execute(analysis.sql.rsplit('\nLIMIT', 1)[0], params).fetchall()
+                allowed = set(normalized_rows(pd.DataFrame.from_records(everything, columns=expected.columns)))
+                same = len(actual) == len(expected) and set(normalized_rows(actual)) <= allowed
+            elif analysis.name in TIE_COLUMNS:
+                column = TIE_COLUMNS[analysis.name]
+                same = np.allclose(expected[column].astype(float).to_numpy(), actual[column].astype(float).to_numpy()) \
+                    if len(expected) == len(actual) else False
+            elif analysis.name in APPROXIMATE_COLUMNS:
+                column = APPROXIMATE_COLUMNS[analysis.name]
+                same = len(expected) == len(actual) \
+                    and normalized_rows(expected.drop(columns=column)) == normalized_rows(actual.drop(columns=column)) \
+                    and np.allclose(expected[column].to_numpy(float), actual[column].to_numpy(float), rtol=1e-6)
+            else:
+                same = sorted(normalized_rows(expected)) == sorted(normalized_rows(actual))
+            if not same or list(expected.columns) != list(actual.columns):
+                mismatches.append((analysis.name, filters, len(expected), len(actual)))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy column store for the dashboard analyses")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--check-parity', action='store_true', help="compare every analysis with SQLite")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+    store = ColumnStore.from_sqlite(conn)
+    print(f"Loaded {len(store)} approaches and {len(store.ast_id)} asteroids")
+    if args.check_parity:
+        mismatches = check_parity(conn, store)
+        for name, filters, expected, actual in mismatches:
+            print(f"❌ {name} {filters}: sqlite {expected} rows, columnar {actual} rows")
+        if mismatches:
+            sys.exit(1)
+        print("✅ Column store matches SQLite for every analysis")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,94 +1,130 @@
-Code 1:
-import requests
-import time
+import argparse
 import json
-from datetime import datetime, timedelta
+import os
+import sqlite3
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import islice
+
+from fetcher import FeedFetcher
+from http_cache import CACHE_DIR, ResponseCache
+from migrations import bump_data_version, migrate
+from rollups import rebuild_rollups, refresh_rollups
 
 # Your API key
-API_KEY = 'QzGFvBMqEY4nb8uJ19g6AJ4XjutL8C667DxDucpU'
+API_KEY = os.environ.get('NASA_API_KEY', 'QzGFvBMqEY4nb8uJ19g6AJ4XjutL8C667DxDucpU')
 BASE_URL = 'https://api.nasa.gov/neo/rest/v1/feed'
 
 # Starting parameters
-start_date = datetime.strptime('2024-01-01', '%Y-%m-%d')
-record_limit = 10000
-records = []
+START_DATE = '2024-01-01'
+RECORD_LIMIT = 10000
+JSON_PATH = 'nasa_asteroid_data.jsonl'
+DB_PATH = 'nasa_asteroids1.db'
+CHECKPOINT_PATH = 'fetch_checkpoint.json'
 
-def extract_fields(asteroid, approach_data):
-    """Extract required fields from each asteroid and its approach data."""
-    return {
-        "id": int(asteroid.get('id', 0)),
-        "neo_reference_id": int(asteroid.get('neo_reference_id', 0)),
-        "name": asteroid.get('name', ''),
-        "absolute_magnitude_h": float(asteroid.get('absolute_magnitude_h', 0.0)),
-        "estimated_diameter_min_km": float(asteroid['estimated_diameter']['kilometers']['estimated_diameter_min']),
-        "estimated_diameter_max_km": float(asteroid['estimated_diameter']['kilometers']['estimated_diameter_max']),
-        "is_potentially_hazardous_asteroid": bool(asteroid.get('is_potentially_hazardous_asteroid', False)),
-        "close_approach_date": datetime.strptime(approach_data['close_approach_date'], '%Y-%m-%d').date(),
-        "relative_velocity_kmph": float(approach_data['relative_velocity']['kilometers_per_hour']),
-        "astronomical": float(approach_data['miss_distance']['astronomical']),
-        "miss_distance_km": float(approach_data['miss_distance']['kilometers']),
-        "miss_distance_lunar": float(approach_data['miss_distance']['lunar']),
-        "orbiting_body": approach_data.get('orbiting_body', '')
-    }
-
-# Fetch and loop until 10,000 records
-while len(records) < record_limit:
-    end_date = start_date + timedelta(days=7)
-    params = {
-        'start_date': start_date.strftime('%Y-%m-%d'),
-        'end_date': end_date.strftime('%Y-%m-%d'),
-        'api_key': API_KEY
-    }
-    
-    response = requests.get(BASE_URL, params=params)
-    if response.status_code != 200:
-        print("Error fetching data:", response.status_code, response.text)
-        break
-    
-    data = response.json()
-    near_earth_objects = data.get('near_earth_objects', {})
-    
-    for date in near_earth_objects:
-        for asteroid in near_earth_objects[date]:
-            for approach_data in asteroid.get('close_approach_data', []):
-                record = extract_fields(asteroid, approach_data)
-                records.append(record)
-                if len(records) >= record_limit:
-                    break
-            if len(records) >= record_limit:
-                break
-        if len(records) >= record_limit:
-            break
-    
-    # Update start date to next day after current end_date
-    start_date = end_date + timedelta(days=1)
-    
-    print(f"Records collected so far: {len(records)}")
-    
-    # Polite pause to avoid hitting API limits
-    time.sleep(1)
 
-# Save the data to a JSON file
-with open('nasa_asteroid_data.json', 'w') as f:
-    json.dump(records, f, indent=4, default=str)
+# Compact records. An Approach keeps its own fields in slots and shares one
+# Asteroid with every other approach of the same asteroid, so asteroid-level
+# fields are parsed once per id. Both answer record['field'] like the dicts
+# that the synthetic generator and the JSON Lines loader yield, so every writer
+# takes either.
 
-print(f"\n✅ Successfully collected {len(records)} records and saved to 'nasa_asteroid_data.json'!")
+ASTEROID_FIELDS = ('id', 'neo_reference_id', 'name', 'absolute_magnitude_h', 'estimated_diameter_min_km',
+                   'estimated_diameter_max_km', 'is_potentially_hazardous_asteroid')
+APPROACH_FIELDS = ('close_approach_date', 'relative_velocity_kmph', 'astronomical', 'miss_distance_km',
+                   'miss_distance_lunar', 'orbiting_body')
+RECORD_FIELDS = ASTEROID_FIELDS + APPROACH_FIELDS
 
-Code 2:
+# Interned asteroids kept before the table is cleared and starts over
+INTERN_LIMIT = 200000
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """Close-approach date from the feed's YYYY-MM-DD text; a feed page repeats only a few dates."""
+    return date.fromisoformat(text)
+
+
+class Asteroid:
+    __slots__ = ASTEROID_FIELDS + ('row',)
+
+    def __init__(self, asteroid):
+        kilometers = asteroid['estimated_diameter']['kilometers']
+        self.id = int(asteroid.get('id', 0))
+        self.neo_reference_id = int(asteroid.get('neo_reference_id', 0))
+        self.name = asteroid.get('name', '')
+        self.absolute_magnitude_h = float(asteroid.get('absolute_magnitude_h', 0.0))
+        self.estimated_diameter_min_km = float(kilometers['estimated_diameter_min'])
+        self.estimated_diameter_max_km = float(kilometers['estimated_diameter_max'])
+        self.is_potentially_hazardous_asteroid = bool(asteroid.get('is_potentially_hazardous_asteroid', False))
+        # INSERT_ASTEROID parameters, built once per asteroid
+        self.row = (self.id, self.name, self.absolute_magnitude_h, self.estimated_diameter_min_km,
+                    self.estimated_diameter_max_km, int(self.is_potentially_hazardous_asteroid))
+
+
+# Asteroids seen so far, by the feed's id string. Within one run an asteroid
+# keeps the metadata of the first page it was seen on.
+interned_asteroids = {}
+
+
+def intern_asteroid(asteroid):
+    key = asteroid.get('id')
+    interned = interned_asteroids.get(key)
+    if interned is None:
+        if len(interned_asteroids) >= INTERN_LIMIT:
+            interned_asteroids.clear()
+        interned = interned_asteroids[key] = Asteroid(asteroid)
+    return interned
 
-import sqlite3
-import json
 
-# Load the JSON data
-with open('nasa_asteroid_data.json', 'r') as f:
-    asteroid_data = json.load(f)
+class Approach:
+    """One close approach: about a sixth of the memory of the equivalent 13-key dict."""
 
-# Connect to SQLite database (or create one)
-conn = sqlite3.connect('nasa_asteroids1.db')
-cursor = conn.cursor()
+    __slots__ = ('asteroid', 'day', 'relative_velocity_kmph', 'astronomical', 'miss_distance_km',
+                 'miss_distance_lunar', 'orbiting_body')
 
-# Create asteroids table
-cursor.execute('''
+    def __init__(self, asteroid, approach_data):
+        miss_distance = approach_data['miss_distance']
+        self.asteroid = asteroid
+        self.day = approach_data['close_approach_date']
+        self.relative_velocity_kmph = float(approach_data['relative_velocity']['kilometers_per_hour'])
+        self.astronomical = float(miss_distance['astronomical'])
+        self.miss_distance_km = float(miss_distance['kilometers'])
+        self.miss_distance_lunar = float(miss_distance['lunar'])
+        self.orbiting_body = approach_data.get('orbiting_body', '')
+
+    @property
+    def close_approach_date(self):
+        return parse_date(self.day)
+
+    def __getitem__(self, key):
+        if key in ASTEROID_FIELDS:
+            return getattr(self.asteroid, key)
+        if key in APPROACH_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def keys(self):
+        return RECORD_FIELDS
+
+
+def extract_fields(asteroid, approach_data):
+    """Extract required fields from each asteroid and its approach data."""
+    return Approach(intern_asteroid(asteroid), approach_data)
+
+
+def iter_page_records(page):
+    """Yield one extracted record per close approach in a feed page."""
+    near_earth_objects = page.get('near_earth_objects', {})
+    for date in near_earth_objects:
+        for asteroid in near_earth_objects[date]:
+            for approach_data in asteroid.get('close_approach_data', []):
+                yield extract_fields(asteroid, approach_data)
+
+
+# Schema shared by every writer
+ASTEROIDS_DDL = '''
 CREATE TABLE IF NOT EXISTS asteroids (
     id INTEGER PRIMARY KEY,
     name TEXT,
@@ -97,10 +133,9 @@ CREATE TABLE IF NOT EXISTS asteroids (
     estimated_diameter_max_km FLOAT,
     is_potentially_hazardous_asteroid BOOLEAN
 );
-''')
+'''
 
-# Create close_approach table
-cursor.execute('''
+CLOSE_APPROACH_DDL = '''
 CREATE TABLE IF NOT EXISTS close_approach (
     neo_reference_id INTEGER,
     close_approach_date DATE,
@@ -111,44 +146,319 @@ CREATE TABLE IF NOT EXISTS close_approach (
     orbiting_body TEXT,
     FOREIGN KEY (neo_reference_id) REFERENCES asteroids(id)
 );
-''')
-
-# Insert data
-for record in asteroid_data:
-    # Insert into asteroids table
-    cursor.execute('''
-    INSERT OR REPLACE INTO asteroids (id, name, absolute_magnitude_h, 
-                                      estimated_diameter_min_km, estimated_diameter_max_km, 
-                                      is_potentially_hazardous_asteroid)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
+'''
+
+INSERT_ASTEROID = '''
+INSERT OR REPLACE INTO asteroids (id, name, absolute_magnitude_h,
+                                  estimated_diameter_min_km, estimated_diameter_max_km,
+                                  is_potentially_hazardous_asteroid)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_APPROACH = '''
+INSERT OR REPLACE INTO close_approach (neo_reference_id, close_approach_date,
+                                      relative_velocity_kmph, astronomical,
+                                      miss_distance_km, miss_distance_lunar, orbiting_body)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def create_tables(conn):
+    """Create the asteroids and close_approach tables if they are missing and bring them up to date."""
+    conn.execute(ASTEROIDS_DDL)
+    conn.execute(CLOSE_APPROACH_DDL)
+    conn.commit()
+    migrate(conn)
+
+
+def asteroid_row(record):
+    if isinstance(record, Approach):
+        return record.asteroid.row
+    hazardous = record['is_potentially_hazardous_asteroid']
+    return (
         record['id'],
         record['name'],
         record['absolute_magnitude_h'],
         record['estimated_diameter_min_km'],
         record['estimated_diameter_max_km'],
-        int(record['is_potentially_hazardous_asteroid'])  # boolean stored as 0/1
-    ))
-    
-    # Insert into close_approach table
-    cursor.execute('''
-    INSERT OR REPLACE INTO close_approach (neo_reference_id, close_approach_date, 
-                                          relative_velocity_kmph, astronomical, 
-                                          miss_distance_km, miss_distance_lunar, orbiting_body)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
+        # Boolean stored as 0/1; None for an approach whose asteroid row is missing
+        int(hazardous) if hazardous is not None else None
+    )
+
+
+def approach_row(record):
+    if isinstance(record, Approach):
+        return (record.asteroid.neo_reference_id, record.day, record.relative_velocity_kmph, record.astronomical,
+                record.miss_distance_km, record.miss_distance_lunar, record.orbiting_body)
+    return (
         record['neo_reference_id'],
-        record['close_approach_date'],
+        str(record['close_approach_date']),
         record['relative_velocity_kmph'],
         record['astronomical'],
         record['miss_distance_km'],
         record['miss_distance_lunar'],
         record['orbiting_body']
-    ))
+    )
+
+
+# Code 1: fetch feed pages and stream them through the pipeline
+#
+#   fetch page -> extract_fields -> batch -> write
+#
+# Every stage is a generator, so at most a few in-flight pages and one batch
+# of records are held in memory no matter how many records are fetched.
+
+def iter_records(pages, record_limit=None):
+    """Yield (window, record) for every approach, then (window, None) once a window is complete."""
+    collected = 0
+    for window, page in pages:
+        for record in iter_page_records(page):
+            if record_limit is not None and collected >= record_limit:
+                return
+            yield window, record
+            collected += 1
+        yield window, None
+
+
+def iter_batches(items, batch_size):
+    """Group records into lists of at most `batch_size`, with the windows they complete."""
+    batch, finished = [], []
+    for window, record in items:
+        if record is None:
+            finished.append(window)
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch, finished
+            batch, finished = [], []
+    if batch or finished:
+        yield batch, finished
+
+
+def write_batch(conn, batch):
+    """Write one batch of records in a single transaction."""
+    with conn:
+        conn.executemany(INSERT_ASTEROID, {row[0]: row for row in map(asteroid_row, batch)}.values())
+        conn.executemany(INSERT_APPROACH, [approach_row(r) for r in batch])
+        refresh_rollups(conn, batch)
+        bump_data_version(conn)
+
+
+# Bulk load mode: WAL plus relaxed syncing and a big page cache while loading
+LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -262144',  # 256 MiB
+    'PRAGMA temp_store = MEMORY',
+]
+
+
+class BulkLoader:
+    """Bulk writer that dedupes asteroids in memory and inserts approaches with executemany.
+
+    Secondary indexes on close_approach are dropped on start and rebuilt by
+    `finish()`, so they are built once over the loaded data instead of being
+    maintained row by row.
+    """
+
+    def __init__(self, conn, batch_size=50000, rebuild_indexes=True):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.rebuild_indexes = rebuild_indexes
+        self.asteroids = set()
+        self.dropped_indexes = []
+        self.rows = 0
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        create_tables(conn)
+        if rebuild_indexes:
+            self.dropped_indexes = conn.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'close_approach' AND sql IS NOT NULL"
+            ).fetchall()
+            with conn:
+                for name, _ in self.dropped_indexes:
+                    conn.execute(f'DROP INDEX "{name}"')
+
+    def write(self, records):
+        """Write records in transactions of at most `batch_size` rows."""
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.batch_size))
+            if not chunk:
+                break
+            self.write_rows(map(asteroid_row, chunk), [approach_row(r) for r in chunk])
+
+    def write_rows(self, asteroid_rows, approach_rows):
+        """Write INSERT_ASTEROID / INSERT_APPROACH parameter tuples in one transaction."""
+        # Each asteroid is written once per load, however many approaches it has
+        asteroids = []
+        for row in asteroid_rows:
+            if row[0] is not None and row[0] not in self.asteroids:
+                self.asteroids.add(row[0])
+                asteroids.append(row)
+        with self.conn:
+            self.conn.executemany(INSERT_ASTEROID, asteroids)
+            self.conn.executemany(INSERT_APPROACH, approach_rows)
+            bump_data_version(self.conn)
+        self.rows += len(approach_rows)
+
+    def finish(self):
+        """Rebuild the dropped indexes and the rollups, then restore durable syncing."""
+        with self.conn:
+            for _, sql in self.dropped_indexes:
+                self.conn.execute(sql)
+        self.dropped_indexes = []
+        rebuild_rollups(self.conn)
+        self.conn.execute('PRAGMA synchronous = FULL')
+        self.conn.execute('PRAGMA optimize')
+
+
+def write_jsonl(batch, f):
+    """Append a batch to the optional JSON Lines export."""
+    for record in batch:
+        f.write(json.dumps(dict(record), default=str) + '\n')
+    f.flush()
+
+
+def run_pipeline(start_date, end_date, db_path=DB_PATH, record_limit=RECORD_LIMIT, batch_size=1000,
+                 jsonl_path=None, checkpoint_path=CHECKPOINT_PATH, base_url=BASE_URL, workers=4, rate=2.0,
+                 bulk=False, cache=None, archive_path=None):
+    """Stream feed pages straight into SQLite, committing one bounded batch at a time.
+
+    A window is checkpointed only after the batch holding its last record is
+    committed, so re-running after a crash resumes without losing records.
+    """
+    fetcher = FeedFetcher(API_KEY, base_url=base_url, workers=workers, rate=rate,
+                          checkpoint_path=checkpoint_path, cache=cache)
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    loader = BulkLoader(conn, batch_size) if bulk else None
+    jsonl = open(jsonl_path, 'a') if jsonl_path else None
+    if archive_path:
+        from archive import ArchiveWriter
+        archive = ArchiveWriter(archive_path)
+    else:
+        archive = None
+    written = 0
+    try:
+        pages = fetcher.iter_pages(start_date, end_date, record_limit, auto_checkpoint=False)
+        for batch, finished in iter_batches(iter_records(pages, record_limit), batch_size):
+            if loader:
+                loader.write(batch)
+            else:
+                write_batch(conn, batch)
+            if jsonl:
+                write_jsonl(batch, jsonl)
+            if archive:
+                archive.write(batch)
+            for window in finished:
+                fetcher.checkpoint.mark_done(window)
+            written += len(batch)
+            print(f"Records written so far: {written} ({fetcher.records_per_sec():.0f} records/sec fetched)")
+    finally:
+        if loader:
+            loader.finish()
+        conn.close()
+        if jsonl:
+            jsonl.close()
+        if archive:
+            # Published even after an error, since the checkpoint already skips these windows
+            archive.finish()
+
+    print(f"\n✅ Successfully streamed {written} records into '{db_path}'!")
+    if cache:
+        print(f"Response cache: {cache.stats()}")
+    return written
+
+
+# Code 2: load a JSON Lines export into SQLite
+
+def insert_records(cursor, records):
+    """Row-by-row insert of every record (the default, non-bulk load path)."""
+    for record in records:
+        cursor.execute(INSERT_ASTEROID, asteroid_row(record))
+        cursor.execute(INSERT_APPROACH, approach_row(record))
+
+
+def load_into_sqlite(json_path=JSON_PATH, db_path=DB_PATH, bulk=False, batch_size=50000):
+    """Insert every record of a JSON Lines export into the asteroids/close_approach tables."""
+    # Connect to SQLite database (or create one)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_tables(conn)
+
+    # Insert data, reading the export one line at a time
+    with open(json_path, 'r') as f:
+        records = (json.loads(line) for line in f)
+        if bulk:
+            loader = BulkLoader(conn, batch_size)
+            loader.write(records)
+            loader.finish()
+        else:
+            insert_records(cursor, records)
+            bump_data_version(conn)
+            conn.commit()
+            rebuild_rollups(conn)
+
+    # Commit and close
+    conn.commit()
+    conn.close()
+
+    print("✅ Data inserted successfully into SQLite database")
+
 
-# Commit and close
-conn.commit()
-conn.close()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch NASA NeoWs feed data and load it into SQLite")
+    parser.add_argument('--start', default=START_DATE, help="first close-approach date (YYYY-MM-DD)")
+    parser.add_argument('--end', default=datetime.today().strftime('%Y-%m-%d'), help="last date (YYYY-MM-DD)")
+    parser.add_argument('--limit', type=int, default=RECORD_LIMIT, help="stop after this many records (0 = no limit)")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent feed requests")
+    parser.add_argument('--rate', type=float, default=2.0, help="max API requests per second")
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--batch-size', type=int, default=1000, help="records per SQLite transaction")
+    parser.add_argument('--bulk', action='store_true',
+                        help="bulk load mode: executemany batches, load-time PRAGMAs, indexes built last")
+    parser.add_argument('--jsonl', help="also export records to this JSON Lines file")
+    parser.add_argument('--from-jsonl', help="load an existing JSON Lines export instead of fetching")
+    parser.add_argument('--archive', help="also add records to this compressed Parquet archive (archive.py)")
+    parser.add_argument('--from-archive', help="rebuild the database from a Parquet archive instead of fetching")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="skip writing the memory-mapped column snapshot next to the database")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="on-disk cache of feed responses")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch from the API")
+    parser.add_argument('--replay', action='store_true',
+                        help="serve every window from the response cache without touching the network")
+    parser.add_argument('--partition', choices=['year', 'month'],
+                        help="also write year or month partitions of the database (partitions.py)")
+    return parser.parse_args()
 
-print("✅ Data inserted successfully into SQLite database")
 
+if __name__ == '__main__':
+    args = parse_args()
+    if args.from_jsonl:
+        load_into_sqlite(args.from_jsonl, args.db, args.bulk, args.batch_size)
+    elif args.from_archive:
+        from archive import rebuild_database
+        if os.path.exists(args.db):
+            print(f"❌ '{args.db}' exists; rebuild into a new file")
+            sys.exit(1)
+        rows = rebuild_database(args.from_archive, args.db, max(args.batch_size, 50000))
+        print(f"✅ Loaded {rows} approaches from '{args.from_archive}' into '{args.db}'")
+    else:
+        start_date = datetime.strptime(args.start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(args.end, '%Y-%m-%d').date()
+        cache = None if args.no_cache else ResponseCache(args.cache_dir, replay=args.replay)
+        # A replay is local and quick, so it re-reads every window instead of resuming
+        checkpoint = None if args.replay else args.checkpoint
+        run_pipeline(start_date, end_date, args.db, args.limit or None, args.batch_size, args.jsonl,
+                     checkpoint, args.base_url, args.workers, args.rate, args.bulk, cache, args.archive)
+    if not args.no_snapshot:
+        from snapshot import write_snapshot
+        write_snapshot(args.db)
+    if args.partition:
+        from partitions import split_database
+        manifest = split_database(args.db, by=args.partition)
+        print(f"✅ Wrote {len(manifest['partitions'])} {args.partition} partitions")
@@ -0,0 +1,248 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'https://api.nasa.gov/neo/rest/v1/feed'
+# One asteroid with its full close-approach history: GET {LOOKUP_URL}/{id}
+LOOKUP_URL = 'https://api.nasa.gov/neo/rest/v1/neo'
+
+# The feed endpoint accepts at most 7 days per request (start and end inclusive)
+WINDOW_DAYS = 7
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def split_windows(start_date, end_date, days=WINDOW_DAYS):
+    """Split the inclusive range [start_date, end_date] into back-to-back windows."""
+    windows = []
+    current = start_date
+    while current <= end_date:
+        window_end = min(current + timedelta(days=days - 1), end_date)
+        windows.append((current, window_end))
+        current = window_end + timedelta(days=1)
+    return windows
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class Checkpoint:
+    """Set of finished windows persisted to a JSON file so an interrupted run can resume."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.done = json.load(f).get('completed', {})
+
+    def is_done(self, window):
+        return window[0].isoformat() in self.done
+
+    def mark_done(self, window, record_count=None):
+        with self.lock:
+            self.done[window[0].isoformat()] = {'end_date': window[1].isoformat(), 'records': record_count}
+            if not self.path:
+                return
+            # Write to a temp file and rename so a crash never leaves a torn checkpoint
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'completed': self.done}, f)
+            os.replace(tmp_path, self.path)
+
+
+def make_session(pool_size):
+    """requests.Session whose connection pool is big enough for every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_with_retry(session, url, params, bucket=None, max_retries=5, backoff=1.0, timeout=30):
+    """GET `url`, retrying 429/5xx and connection errors with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        if bucket:
+            bucket.acquire()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                time.sleep(int(retry_after))
+                continue
+        time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+
+
+def count_approaches(data):
+    """Number of close-approach records contained in one feed page."""
+    return sum(
+        len(asteroid.get('close_approach_data', []))
+        for asteroids in data.get('near_earth_objects', {}).values()
+        for asteroid in asteroids
+    )
+
+
+class FeedFetcher:
+    """Fetch NeoWs feed windows concurrently on a bounded thread pool.
+
+    With a `cache` (http_cache.ResponseCache), cached windows are served from
+    disk without taking a rate-limit token, and fetched ones are stored.
+    """
+
+    def __init__(self, api_key, base_url=BASE_URL, workers=4, rate=2.0, burst=None,
+                 checkpoint_path=None, max_retries=5, backoff=1.0, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.session = make_session(workers)
+        self.records = 0
+        self.started = None
+
+    def fetch_window(self, window):
+        params = {
+            'start_date': window[0].strftime('%Y-%m-%d'),
+            'end_date': window[1].strftime('%Y-%m-%d'),
+            'api_key': self.api_key
+        }
+        if self.cache:
+            body = self.cache.lookup(self.base_url, params)
+            if body is not None:
+                return json.loads(body)
+        response = get_with_retry(self.session, self.base_url, params, self.bucket,
+                                  self.max_retries, self.backoff)
+        if self.cache:
+            self.cache.store(self.base_url, params, response.content)
+        return response.json()
+
+    def records_per_sec(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    def iter_pages(self, start_date, end_date, record_limit=None, auto_checkpoint=True):
+        """Yield (window, page) as windows finish.
+
+        With `auto_checkpoint` a window is checkpointed as soon as the consumer
+        asks for the next page; otherwise the consumer calls
+        `checkpoint.mark_done` itself once the window's data is durable.
+        """
+        return self.iter_window_pages(split_windows(start_date, end_date), record_limit, auto_checkpoint)
+
+    def iter_window_pages(self, windows, record_limit=None, auto_checkpoint=True):
+        """Like `iter_pages`, for an explicit list of (start, end) windows."""
+        pending = [w for w in windows if not self.checkpoint.is_done(w)]
+        pending.reverse()
+        self.started = time.monotonic()
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while pending or in_flight:
+                    # Keep a bounded number of windows in flight, stop submitting once the limit is reached
+                    while pending and len(in_flight) < self.workers * 2 and \
+                            (record_limit is None or self.records < record_limit):
+                        window = pending.pop()
+                        in_flight[pool.submit(self.fetch_window, window)] = window
+                    if not in_flight:
+                        break
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        window = in_flight.pop(future)
+                        page = future.result()
+                        count = count_approaches(page)
+                        self.records += count
+                        yield window, page
+                        if auto_checkpoint:
+                            self.checkpoint.mark_done(window, count)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+
+class LookupFetcher:
+    """Look up asteroids by id concurrently on a bounded thread pool, sharing one rate limit."""
+
+    def __init__(self, api_key, base_url=LOOKUP_URL, workers=4, rate=2.0, burst=None, max_retries=5, backoff=1.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = make_session(workers)
+        self.fetched = 0
+        self.started = None
+
+    def fetch_asteroid(self, neo_id):
+        """The lookup response for `neo_id`, or None when the API does not know the asteroid."""
+        try:
+            response = get_with_retry(self.session, f"{self.base_url}/{neo_id}", {'api_key': self.api_key},
+                                      self.bucket, self.max_retries, self.backoff)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+        return response.json()
+
+    def asteroids_per_sec(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return self.fetched / elapsed if elapsed > 0 else 0.0
+
+    def iter_asteroids(self, ids):
+        """Yield (id, asteroid or None) as lookups finish, with at most two per worker in flight."""
+        pending = list(reversed(ids))
+        self.started = time.monotonic()
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while pending or in_flight:
+                    while pending and len(in_flight) < self.workers * 2:
+                        neo_id = pending.pop()
+                        in_flight[pool.submit(self.fetch_asteroid, neo_id)] = neo_id
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        neo_id = in_flight.pop(future)
+                        asteroid = future.result()
+                        self.fetched += 1
+                        yield neo_id, asteroid
+            finally:
+                for future in in_flight:
+                    future.cancel()
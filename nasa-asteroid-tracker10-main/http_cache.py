@@ -0,0 +1,206 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+# On-disk cache of feed responses.
+#
+#   index/ab/<request key>.json   request, body hash, fetch time, window end
+#   blobs/cd/<body sha256>.gz     gzip-compressed response body
+#
+# The request key is the SHA-256 of the normalized request (lower-case host,
+# sorted parameters, no api_key), so the same window hits the same entry
+# whatever key or parameter order fetched it. Bodies are stored once per
+# distinct content, so re-fetching a window that did not change adds nothing.
+
+CACHE_DIR = 'http_cache'
+
+# Same policy as sync.py: a window fetched at least this many days after it
+# ended is final and never expires; fresher windows expire after RECENT_TTL.
+SETTLE_DAYS = 7
+RECENT_TTL = timedelta(hours=6)
+
+# Parameters that never take part in the key
+SECRET_PARAMS = {'api_key'}
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode for a request that is not in the cache."""
+
+
+def normalize_request(url, params=None):
+    """Canonical 'GET url?sorted-params' text for a request, without secrets."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + list((params or {}).items())
+    query = sorted((k, str(v)) for k, v in query if k not in SECRET_PARAMS)
+    path = parts.path.rstrip('/') or '/'
+    base = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+    return 'GET ' + base + ('?' + '&'.join(f"{k}={v}" for k, v in query) if query else '')
+
+
+def request_key(url, params=None):
+    return hashlib.sha256(normalize_request(url, params).encode()).hexdigest()
+
+
+def sharded(directory, name, suffix):
+    return os.path.join(directory, name[:2], name + suffix)
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(entry, now, recent_ttl=RECENT_TTL, settle_days=SETTLE_DAYS):
+    """True while a cached entry may be served without going to the network."""
+    fetched_at = datetime.fromisoformat(entry['fetched_at'])
+    window_end = entry.get('window_end')
+    if window_end and fetched_at.date() - date.fromisoformat(window_end) >= timedelta(days=settle_days):
+        return True
+    return now - fetched_at < recent_ttl
+
+
+class ResponseCache:
+    """Thread-safe response cache shared by the fetcher's worker threads.
+
+    In replay mode every lookup is answered from disk regardless of age, and
+    a request that was never cached raises ReplayMiss instead of reaching the
+    network.
+    """
+
+    def __init__(self, directory=CACHE_DIR, recent_ttl=RECENT_TTL, settle_days=SETTLE_DAYS, replay=False):
+        self.directory = directory
+        self.recent_ttl = recent_ttl
+        self.settle_days = settle_days
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.bytes_served = 0
+
+    def index_path(self, key):
+        return sharded(os.path.join(self.directory, 'index'), key, '.json')
+
+    def blob_path(self, digest):
+        return sharded(os.path.join(self.directory, 'blobs'), digest, '.gz')
+
+    def read_entry(self, key):
+        try:
+            with open(self.index_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def lookup(self, url, params=None):
+        """Cached body bytes for the request, or None when missing or expired."""
+        entry = self.read_entry(request_key(url, params))
+        body = None
+        if entry is not None and (self.replay or is_fresh(entry, datetime.now(), self.recent_ttl, self.settle_days)):
+            try:
+                with gzip.open(self.blob_path(entry['blob']), 'rb') as f:
+                    body = f.read()
+            except FileNotFoundError:
+                body = None
+        with self.lock:
+            if body is not None:
+                self.hits += 1
+                self.bytes_served += len(body)
+            elif entry is not None:
+                self.expired += 1
+            else:
+                self.misses += 1
+        if body is None and self.replay:
+            raise ReplayMiss(normalize_request(url, params))
+        return body
+
+    def store(self, url, params, body):
+        """Record a fetched body. The blob is written before the index entry that points to it."""
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = self.blob_path(digest)
+        if not os.path.exists(blob_path):
+            write_atomic(blob_path, gzip.compress(body, compresslevel=6))
+        entry = {
+            'request': normalize_request(url, params),
+            'blob': digest,
+            'size': len(body),
+            'fetched_at': datetime.now().isoformat(timespec='seconds'),
+            'window_end': (params or {}).get('end_date'),
+        }
+        write_atomic(self.index_path(request_key(url, params)), json.dumps(entry).encode())
+        with self.lock:
+            self.stores += 1
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'expired': self.expired,
+                    'stores': self.stores, 'bytes_served': self.bytes_served}
+
+
+def iter_files(directory, suffix):
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(suffix):
+                yield os.path.join(root, name)
+
+
+def usage(directory=CACHE_DIR):
+    """Entries, blobs, body bytes and compressed bytes on disk."""
+    entries, raw, blobs, compressed = 0, 0, set(), 0
+    for path in iter_files(os.path.join(directory, 'index'), '.json'):
+        with open(path) as f:
+            entry = json.load(f)
+        entries += 1
+        raw += entry['size']
+        blobs.add(entry['blob'])
+    for path in iter_files(os.path.join(directory, 'blobs'), '.gz'):
+        compressed += os.path.getsize(path)
+    return {'entries': entries, 'blobs': len(blobs), 'body_bytes': raw, 'disk_bytes': compressed}
+
+
+def collect_garbage(directory=CACHE_DIR, drop_expired=False):
+    """Delete blobs no entry points to (and, optionally, expired entries). Returns files removed."""
+    cache = ResponseCache(directory)
+    now = datetime.now()
+    referenced = set()
+    removed = 0
+    for path in iter_files(os.path.join(directory, 'index'), '.json'):
+        with open(path) as f:
+            entry = json.load(f)
+        if drop_expired and not is_fresh(entry, now, cache.recent_ttl, cache.settle_days):
+            os.remove(path)
+            removed += 1
+        else:
+            referenced.add(entry['blob'])
+    for path in iter_files(os.path.join(directory, 'blobs'), '.gz'):
+        if os.path.basename(path)[:-len('.gz')] not in referenced:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clean the feed response cache")
+    parser.add_argument('directory', nargs='?', default=CACHE_DIR)
+    parser.add_argument('--gc', action='store_true', help="delete unreferenced blobs")
+    parser.add_argument('--drop-expired', action='store_true', help="with --gc, also delete expired entries")
+    args = parser.parse_args()
+
+    if args.gc:
+        print(f"✅ Removed {collect_garbage(args.directory, args.drop_expired)} file(s)")
+    stats = usage(args.directory)
+    ratio = stats['body_bytes'] / stats['disk_bytes'] if stats['disk_bytes'] else 0
+    print(f"{stats['entries']} entries, {stats['blobs']} distinct bodies, "
+          f"{stats['body_bytes'] / 1e6:.1f} MB of responses in {stats['disk_bytes'] / 1e6:.1f} MB ({ratio:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from migrations import query_plan, scans_table
+from queries import QUERIES
+from rollups import rollup_sql
+
+# Query diagnostics. Nothing here runs unless the dashboard's diagnostics
+# switch is on: the normal path calls run_query / Pager directly, so switched
+# off the cost is one boolean check per rerun.
+
+LOG_PATH = "query_log.jsonl"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+
+# SQLite calls the progress handler every this many VM instructions, so
+# vm_steps is exact to within one interval
+PROGRESS_INTERVAL = 1000
+
+# Profiles kept in memory for the diagnostics panel
+RECENT = 50
+
+METRIC_PREFIX = "nasa_query"
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+class StepCounter:
+    """Counts VM instructions on one connection through sqlite3's progress handler."""
+
+    def __init__(self, conn, interval=PROGRESS_INTERVAL):
+        self.conn = conn
+        self.interval = interval
+        self.calls = 0
+
+    def tick(self):
+        self.calls += 1
+        return 0
+
+    def __enter__(self):
+        self.conn.set_progress_handler(self.tick, self.interval)
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.set_progress_handler(None, 0)
+
+    @property
+    def steps(self):
+        return self.calls * self.interval
+
+
+class Profiler:
+    """Times dashboard queries and keeps what it saw.
+
+    Each profile is appended to a size-rotated JSONL log, kept in a short
+    in-memory history for the diagnostics panel and folded into per-analysis
+    totals that `prometheus()` renders in the Prometheus text format.
+    """
+
+    def __init__(self, log_path=LOG_PATH, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.log_path = log_path
+        self.handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True) if log_path else None
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT)
+        self.totals = {}
+
+    def run_query(self, conn, query_name, params):
+        """`queries.run_query` with a profile: returns (DataFrame, profile)."""
+        import pandas as pd
+
+        sql = rollup_sql(conn, query_name, params)
+        source = 'rollup' if sql else 'base'
+        sql = sql or QUERIES[query_name].sql
+        started = time.perf_counter()
+        with StepCounter(conn) as counter:
+            rows = conn.execute(sql, params).fetchall()
+        fetched = time.perf_counter()
+        df = pd.DataFrame.from_records(rows, columns=list(QUERIES[query_name].columns))
+        built = time.perf_counter()
+        return df, self.record(conn, query_name, 'SQLite', source, sql, params,
+                               started, fetched, built, len(df), counter.steps)
+
+    def page_frame(self, pager, after=None):
+        """`Pager.page_frame` with a profile: returns (DataFrame, next key, profile)."""
+        import pandas as pd
+        from pagination import keyset_sql
+
+        started = time.perf_counter()
+        with StepCounter(pager.conn) as counter:
+            rows, next_key = pager.page(after)
+        fetched = time.perf_counter()
+        df = pd.DataFrame.from_records(rows, columns=pager.columns)
+        built = time.perf_counter()
+        sql = keyset_sql(pager.query_name, after is None, pager.use_asteroid_index)
+        params = dict(pager.params, **{f"_key{i}": value for i, value in enumerate(after or ())})
+        source = 'page' if after is None else 'page (after key)'
+        return df, next_key, self.record(pager.conn, pager.query_name, 'SQLite', source, sql, params,
+                                         started, fetched, built, len(df), counter.steps)
+
+    def run_columnar(self, store, query_name, params):
+        """`ColumnStore.run` with a profile. Arrays and frame are built together, so there is no split."""
+        started = time.perf_counter()
+        df = store.run(query_name, params)
+        built = time.perf_counter()
+        return df, self.record(None, query_name, 'NumPy columnar', 'columnar', None, params,
+                               started, built, built, len(df), None)
+
+    def record(self, conn, query_name, engine, source, sql, params, started, fetched, built, rows, vm_steps):
+        plan = query_plan(conn, sql, params) if sql else []
+        profile = {
+            'time': now_iso(),
+            'analysis': query_name,
+            'engine': engine,
+            'source': source,
+            'wall_ms': round(1000 * (built - started), 3),
+            'fetch_ms': round(1000 * (fetched - started), 3),
+            'frame_ms': round(1000 * (built - fetched), 3),
+            'rows': rows,
+            'vm_steps': vm_steps,
+            'full_scan': scans_table(sql, plan) if sql else False,
+            'plan': plan,
+            'params': params,
+        }
+        self.add(profile)
+        return profile
+
+    def add(self, profile):
+        with self.lock:
+            self.recent.append(profile)
+            fold(self.totals, profile)
+        if self.handler is not None:
+            self.handler.handle(logging.makeLogRecord({'msg': json.dumps(profile, default=str)}))
+
+    def history(self):
+        with self.lock:
+            return list(self.recent)
+
+    def prometheus(self):
+        with self.lock:
+            return render_prometheus(self.totals)
+
+    def close(self):
+        if self.handler is not None:
+            self.handler.close()
+
+
+def fold(totals, profile):
+    """Add one profile to the per-(analysis, engine) totals."""
+    key = (profile['analysis'], profile['engine'])
+    entry = totals.setdefault(key, {'runs': 0, 'wall': 0.0, 'fetch': 0.0, 'frame': 0.0,
+                                    'rows': 0, 'vm_steps': 0, 'full_scans': 0})
+    entry['runs'] += 1
+    entry['wall'] += profile['wall_ms'] / 1000
+    entry['fetch'] += profile['fetch_ms'] / 1000
+    entry['frame'] += profile['frame_ms'] / 1000
+    entry['rows'] += profile['rows']
+    entry['vm_steps'] += profile['vm_steps'] or 0
+    entry['full_scans'] += bool(profile['full_scan'])
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+METRICS = [
+    ('runs', 'runs_total', 'counter', "Profiled query runs"),
+    ('wall', 'seconds_total', 'counter', "Wall time of profiled runs, fetch plus DataFrame build"),
+    ('fetch', 'fetch_seconds_total', 'counter', "Time spent executing and fetching rows"),
+    ('frame', 'frame_seconds_total', 'counter', "Time spent building DataFrames"),
+    ('rows', 'rows_total', 'counter', "Rows returned"),
+    ('vm_steps', 'vm_steps_total', 'counter', "SQLite VM instructions executed"),
+    ('full_scans', 'full_scans_total', 'counter', "Runs whose plan scans a whole table"),
+]
+
+
+def render_prometheus(totals):
+    """Prometheus text exposition of per-analysis totals."""
+    lines = []
+    for field, suffix, kind, help_text in METRICS:
+        name = f"{METRIC_PREFIX}_{suffix}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (analysis, engine), entry in sorted(totals.items()):
+            lines.append(f'{name}{{analysis="{label(analysis)}",engine="{label(engine)}"}} {entry[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def read_log(log_path=LOG_PATH, backups=LOG_BACKUPS):
+    """Profiles from the log and its rotated backups, oldest first."""
+    paths = [f"{log_path}.{i}" for i in range(backups, 0, -1)] + [log_path]
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            continue
+
+
+def summarize(profiles):
+    """(analysis, engine, runs, p50 ms, p95 ms, mean rows, mean VM steps) rows, slowest p95 first."""
+    groups = {}
+    for profile in profiles:
+        groups.setdefault((profile['analysis'], profile['engine']), []).append(profile)
+    rows = []
+    for (analysis, engine), group in groups.items():
+        wall = sorted(p['wall_ms'] for p in group)
+        steps = [p['vm_steps'] for p in group if p['vm_steps'] is not None]
+        rows.append((analysis, engine, len(group), wall[len(wall) // 2], wall[int(0.95 * (len(wall) - 1))],
+                     sum(p['rows'] for p in group) / len(group), sum(steps) / len(steps) if steps else None))
+    return sorted(rows, key=lambda row: row[4], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the dashboard's query log")
+    parser.add_argument('log', nargs='?', default=LOG_PATH)
+    parser.add_argument('--prometheus', metavar='PATH',
+                        help="write Prometheus text metrics for the logged runs ('-' for stdout)")
+    args = parser.parse_args()
+
+    profiles = list(read_log(args.log))
+    if not profiles:
+        print(f"❌ No profiles in '{args.log}'")
+        return
+    if args.prometheus:
+        totals = {}
+        for profile in profiles:
+            fold(totals, profile)
+        text = render_prometheus(totals)
+        if args.prometheus == '-':
+            print(text, end='')
+        else:
+            # Written whole and renamed, as the node_exporter textfile collector expects
+            with open(args.prometheus + '.tmp', 'w') as f:
+                f.write(text)
+            os.replace(args.prometheus + '.tmp', args.prometheus)
+            print(f"✅ Wrote metrics for {len(totals)} analysis/engine pairs to '{args.prometheus}'")
+        return
+    print(f"{'analysis':<55} {'engine':<15} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'rows':>9} {'VM steps':>12}")
+    for analysis, engine, runs, p50, p95, rows, steps in summarize(profiles):
+        steps_text = f"{steps:>12,.0f}" if steps is not None else f"{'-':>12}"
+        print(f"{analysis[:55]:<55} {engine:<15} {runs:>5} {p50:>9.2f} {p95:>9.2f} {rows:>9,.0f} {steps_text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,290 +1,177 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-from datetime import datetime
 
-# Database connection
-conn = sqlite3.connect("nasa_asteroids_10k.db")
+from cache import QueryCache, normalize_filters
+from charts import CHART_KINDS, CHART_NAMES, chart_data
+from filters import get_filters
+from migrations import get_data_version, get_database_id
+from pagination import Pager, is_paged
+from pool import ConnectionPool, ReleasePool, prepare_database
+from queries import build_params, run_query
+from releases import read_pointer, releases_dir
+
+DB_PATH = "nasa_asteroids_10k.db"
+
+
+@st.cache_resource
+def get_pool():
+    # One pool of read-only WAL connections per server process, shared by every
+    # session. When scheduler.py publishes releases the pool follows the newest
+    # one; otherwise the database is migrated and switched to WAL once, up front
+    if read_pointer(releases_dir(DB_PATH)):
+        return ReleasePool(releases_dir(DB_PATH), size=4)
+    prepare_database(DB_PATH)
+    return ConnectionPool(DB_PATH, size=4)
+
+
+@st.cache_resource
+def get_query_cache():
+    # One cache per server process, shared by every session
+    return QueryCache(max_bytes=256 * 1024 * 1024)
+
+
+@st.cache_resource
+def get_profiler():
+    # Created only once diagnostics are first switched on
+    from instrumentation import Profiler
+    return Profiler()
+
+
+@st.cache_resource(max_entries=1)
+def get_column_store(_conn, db_path, data_version, database_id):
+    # Loaded once per data version and shared by every session; a matching
+    # snapshot is memory-mapped instead, sharing one copy across server processes.
+    # The sidebar filters then resolve through a bitmap index built alongside.
+    from columnar import ColumnStore
+    from snapshot import open_snapshot
+    store = open_snapshot(db_path, data_version, database_id)
+    store = store if store is not None else ColumnStore.from_sqlite(_conn)
+    return store.index_filters()
+
+
+@st.cache_data(max_entries=256)
+def total_rows(_conn, query_name, filters, data_version, params):
+    # Keyed on the normalized filters and data version like the query cache
+    return Pager(_conn, query_name, params).count()
+
+
+def profiled(result):
+    # Keeps the profile of a cache miss for the diagnostics panel
+    global profile
+    df, profile = result
+    return df
+
+
+def show_next_page(key):
+    st.session_state.page_keys.append(key)
+
+
+def show_previous_page():
+    st.session_state.page_keys.pop()
+
 
 st.set_page_config(layout="wide", page_title="🚀 NASA Asteroid Tracker", page_icon="🚀")
 st.title("🚀 NASA Asteroid Tracker")
 st.markdown("### Explore close-approach data of asteroids from NASA's NEO database")
 
 # Sidebar filters
-with st.sidebar:
-    st.header("🔎 Filters")
-    start_date = st.date_input("Start Date", value=datetime(2024, 1, 1))
-    end_date = st.date_input("End Date", value=datetime(2025, 1, 1))
-    velocity_min = st.slider("Min Velocity (km/h)", 0, 150000, 0, step=1000)
-    astro_limit = st.slider("Max Astronomical Unit", 0.0, 1.0, 0.5)
-    lunar_limit = st.slider("Max Lunar Distance", 0.0, 100.0, 10.0)
-    hazardous = st.radio("Potentially Hazardous", ["All", "Yes", "No"])
+start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous, selected_query = get_filters()
+params = build_params(start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous)
+engine = st.sidebar.radio("⚙️ Query engine", ["SQLite", "NumPy columnar"])
+diagnostics = st.sidebar.checkbox("🩺 Diagnostics")
+
+pool = get_pool()
+# Every query of this run reads the same release, even if a newer one is published meanwhile
+active_pool = pool.current()
+cache = get_query_cache()
+profiler = get_profiler() if diagnostics else None
+# The profile of this rerun's query, when diagnostics are on and it actually ran
+profile = None
+
+# Query execution based on user selection, on a pooled connection held for this
+# run only, served from the cache when the effective filters and the data are unchanged
+with active_pool.connection() as conn:
+    filters = normalize_filters(selected_query, start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous)
+    # Each release is its own file with its own counter, so the file is part of the version,
+    # and the database id tells a file rebuilt from scratch at the same path from the old one
+    data_version = (active_pool.db_path, get_data_version(conn), get_database_id(conn))
+    cache.set_data_version(data_version)
+    cache_key = (selected_query, filters, data_version, engine)
+    if engine == "SQLite" and is_paged(selected_query):
+        # Large results are shown one keyset page at a time; page_keys holds the
+        # key each visited page starts after, reset when the view changes
+        if st.session_state.get('page_view') != cache_key:
+            st.session_state.page_view = cache_key
+            st.session_state.page_keys = [None]
+        page_keys = st.session_state.page_keys
+        pager = Pager(conn, selected_query, params)
+        if profiler:
+            df, next_key, profile = profiler.page_frame(pager, page_keys[-1])
+        else:
+            df, next_key = pager.page_frame(page_keys[-1])
+        first_row = (len(page_keys) - 1) * pager.page_size
+        summary = st.empty()
+        st.write(df)
+        previous_column, next_column = st.columns(2)
+        previous_column.button("◀ Previous", on_click=show_previous_page, disabled=len(page_keys) == 1)
+        next_column.button("Next ▶", on_click=show_next_page, args=(next_key,), disabled=next_key is None)
+        # The total is counted after the first rows are on screen
+        total = total_rows(conn, selected_query, filters, data_version, params)
+        summary.caption(f"Rows {first_row + min(1, len(df)):,}–{first_row + len(df):,} of {total:,}")
+    else:
+        if engine == "SQLite":
+            compute = lambda: run_query(conn, selected_query, params)
+            if profiler:
+                compute = lambda: profiled(profiler.run_query(conn, selected_query, params))
+        else:
+            store = get_column_store(conn, *data_version)
+            compute = lambda: store.run(selected_query, params)
+            if profiler:
+                compute = lambda: profiled(profiler.run_columnar(store, selected_query, params))
+        df = cache.get_or_compute(cache_key, compute)
+        st.write(df)
 
-    st.markdown("---")
-    selected_query = st.selectbox("📊 Choose Analysis", [
-        "All Filtered Asteroids",
-        "Count asteroid approaches",
-        "Average velocity of each asteroid",
-        "Top 10 fastest asteroids",
-        "Hazardous asteroids with >3 approaches",
-        "Month with most approaches",
-        "Fastest ever asteroid approach",
-        "Asteroids sorted by max estimated diameter",
-        "Asteroids getting closer over time",
-        "Closest approach details by asteroid",
-        "Asteroids with velocity > 50000 km/h",
-        "Approaches per month",
-        "Asteroid with highest brightness (lowest magnitude)",
-        "Hazardous vs non-hazardous asteroid count",
-        "Hazardous vs non-hazardous approach events",
-        "Asteroids closer than Moon",
-        "Asteroids within 0.05 AU",
-        "Asteroids with maximum relative velocity",
-        "Asteroids with the closest approach to Earth",
-        "Asteroids with the highest estimated diameter",
-        "Asteroids approaching at high velocity",
-        "Asteroids approaching Earth during a specific month",
-        "Asteroids with highest approach frequency",
-        "Asteroids with the highest miss distance",
-        "Asteroids with multiple approaches in a month",
-        "Asteroids that are both fast and hazardous",
-        "Asteroids with increasing approach velocity over time"
-    ])
+with st.expander("📈 Charts"):
+    # Reduced to a fixed point budget in the query layer, so the chart sent to
+    # the browser is the same size for a week of data as for every year of it
+    chart_name = st.selectbox("Chart", CHART_NAMES)
+    chart_filters = normalize_filters(chart_name, start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous)
+    with active_pool.connection() as conn:
+        store = get_column_store(conn, *data_version) if engine != "SQLite" else None
+        chart = cache.get_or_compute(('chart', chart_name, chart_filters, data_version, engine),
+                                     lambda: chart_data(chart_name, params, conn, store))
+    if CHART_KINDS[chart_name] == 'bar':
+        st.bar_chart(chart, x='month', y='count')
+    elif CHART_KINDS[chart_name] == 'line':
+        st.line_chart(chart, x='date', y=chart.columns[1])
+    else:
+        st.scatter_chart(chart, x='relative_velocity_kmph', y='miss_distance_lunar', size='approaches')
+    st.caption(f"{len(chart):,} points")
 
-# Filter construction
-where_clause = f"""
-ca.close_approach_date BETWEEN '{start_date}' AND '{end_date}'
-AND ca.astronomical < {astro_limit}
-AND ca.miss_distance_lunar < {lunar_limit}
-AND ca.relative_velocity_kmph >= {velocity_min}
-"""
+if profiler:
+    with st.expander("🩺 Diagnostics", expanded=True):
+        if profile is None:
+            st.caption("Served from the query cache: no query ran for this view.")
+        else:
+            timing, plan = st.columns(2)
+            timing.json({k: profile[k] for k in ('source', 'wall_ms', 'fetch_ms', 'frame_ms', 'rows', 'vm_steps')})
+            plan.code("\n".join(profile['plan']) or "(no SQL plan)", language=None)
+            if profile['full_scan']:
+                st.warning("This plan scans a whole table.")
+        st.dataframe([{k: p[k] for k in ('time', 'analysis', 'engine', 'wall_ms', 'rows', 'vm_steps')}
+                      for p in reversed(profiler.history())])
+        st.download_button("Prometheus metrics", profiler.prometheus(), file_name="metrics.prom")
 
-hazard_filter = ""
-if hazardous == "Yes":
-    hazard_filter = "AND a.is_potentially_hazardous_asteroid = 1"
-elif hazardous == "No":
-    hazard_filter = "AND a.is_potentially_hazardous_asteroid = 0"
+with st.expander("📦 Full report"):
+    st.caption("Every analysis for the current filters, computed from one filtered scan into a single SQLite file.")
+    if st.button("Build report"):
+        from report import build_report, bundle_bytes
+        with active_pool.connection() as conn:
+            full_report = build_report(conn, params)
+        st.json(full_report.timings)
+        st.download_button("Download report.db", bundle_bytes(full_report), file_name="report.db")
 
-# All queries
-query_map = {
-    "All Filtered Asteroids": f"""
-    SELECT a.name, a.absolute_magnitude_h, a.estimated_diameter_min_km,
-           a.estimated_diameter_max_km, a.is_potentially_hazardous_asteroid,
-           ca.close_approach_date, ca.relative_velocity_kmph,
-           ca.astronomical, ca.miss_distance_lunar
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE {where_clause} {hazard_filter}
-    LIMIT 10000
-    """,
-    "Count asteroid approaches": f"""
-    SELECT ca.neo_reference_id, COUNT(*) as approach_count
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY ca.neo_reference_id
-    LIMIT 10000
-    """,
-    "Average velocity of each asteroid": f"""
-    SELECT ca.neo_reference_id, AVG(ca.relative_velocity_kmph) as avg_velocity
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY ca.neo_reference_id
-    LIMIT 10000
-    """,
-    "Top 10 fastest asteroids": f"""
-    SELECT ca.neo_reference_id, MAX(ca.relative_velocity_kmph) as max_velocity
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY ca.neo_reference_id
-    ORDER BY max_velocity DESC
-    LIMIT 10
-    """,
-    "Hazardous asteroids with >3 approaches": f"""
-    SELECT ca.neo_reference_id, COUNT(*) as approach_count
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE a.is_potentially_hazardous_asteroid = 1
-    GROUP BY ca.neo_reference_id
-    HAVING approach_count > 3
-    LIMIT 10000
-    """,
-    "Month with most approaches": f"""
-    SELECT STRFTIME('%Y-%m', ca.close_approach_date) as month, COUNT(*) as total
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY month
-    ORDER BY total DESC
-    LIMIT 1
-    """,
-    "Fastest ever asteroid approach": """
-    SELECT ca.neo_reference_id, ca.relative_velocity_kmph, ca.close_approach_date
-    FROM close_approach ca
-    WHERE ca.relative_velocity_kmph = (SELECT MAX(relative_velocity_kmph) FROM close_approach)
-    LIMIT 1
-    """,
-    "Asteroids sorted by max estimated diameter": """
-    SELECT id, name, estimated_diameter_max_km
-    FROM asteroids
-    ORDER BY estimated_diameter_max_km DESC
-    LIMIT 10
-    """,
-    "Asteroids getting closer over time": f"""
-    SELECT ca.neo_reference_id, ca.close_approach_date, ca.miss_distance_lunar
-    FROM close_approach ca
-    WHERE {where_clause}
-    ORDER BY ca.neo_reference_id, ca.close_approach_date
-    LIMIT 10000
-    """,
-    "Closest approach details by asteroid": f"""
-    SELECT a.name, ca.close_approach_date, MIN(ca.miss_distance_lunar) as closest
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE {where_clause}
-    GROUP BY ca.neo_reference_id
-    LIMIT 10000
-    """,
-    "Asteroids with velocity > 50000 km/h": f"""
-    SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE ca.relative_velocity_kmph > 50000 AND {where_clause}
-    LIMIT 10000
-    """,
-    "Approaches per month": f"""
-    SELECT STRFTIME('%Y-%m', ca.close_approach_date) as month, COUNT(*) as count
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY month
-    LIMIT 10000
-    """,
-    "Asteroid with highest brightness (lowest magnitude)": """
-    SELECT id, name, absolute_magnitude_h
-    FROM asteroids
-    ORDER BY absolute_magnitude_h ASC
-    LIMIT 1
-    """,
-    "Hazardous vs non-hazardous asteroid count": f"""
-    SELECT hazard_status, COUNT(*) as count
-    FROM (
-        SELECT 
-            CASE 
-                WHEN a.is_potentially_hazardous_asteroid = 1 THEN 'Hazardous'
-                ELSE 'Non-Hazardous'
-            END AS hazard_status
-        FROM asteroids a
-        JOIN close_approach ca ON ca.neo_reference_id = a.id
-        WHERE ca.close_approach_date BETWEEN '{start_date}' AND '{end_date}'
-        AND ca.astronomical < {astro_limit}
-        AND ca.miss_distance_lunar < {lunar_limit}
-        AND ca.relative_velocity_kmph >= {velocity_min}
-        LIMIT 10000
-    )
-    GROUP BY hazard_status
-    """,
-    "Hazardous vs non-hazardous approach events": f"""
-    SELECT 
-        CASE WHEN a.is_potentially_hazardous_asteroid = 1 THEN 'Hazardous'
-             ELSE 'Non-Hazardous'
-        END AS hazard_status,
-        COUNT(*) as count
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE {where_clause}
-    GROUP BY a.is_potentially_hazardous_asteroid
-    LIMIT 10000
-    """,
-    "Asteroids closer than Moon": f"""
-    SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE ca.miss_distance_lunar < 1.0 AND {where_clause}
-    LIMIT 10000
-    """,
-    "Asteroids within 0.05 AU": f"""
-    SELECT a.name, ca.close_approach_date, ca.astronomical
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE ca.astronomical < 0.05 AND {where_clause}
-    LIMIT 10000
-    """,
-    # Additional 10 queries
-    "Asteroids with maximum relative velocity": f"""
-    SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE {where_clause}
-    ORDER BY ca.relative_velocity_kmph DESC
-    LIMIT 10
-    """,
-    "Asteroids with the closest approach to Earth": f"""
-    SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE {where_clause}
-    ORDER BY ca.miss_distance_lunar ASC
-    LIMIT 10
-    """,
-    "Asteroids with the highest estimated diameter": f"""
-    SELECT a.name, a.estimated_diameter_max_km, a.estimated_diameter_min_km
-    FROM asteroids a
-    WHERE {where_clause}
-    ORDER BY a.estimated_diameter_max_km DESC
-    LIMIT 10
-    """,
-    "Asteroids approaching at high velocity": f"""
-    SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE ca.relative_velocity_kmph > 60000 AND {where_clause}
-    LIMIT 10
-    """,
-    "Asteroids approaching Earth during a specific month": f"""
-    SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE STRFTIME('%Y-%m', ca.close_approach_date) = STRFTIME('%Y-%m', '{start_date}') AND {where_clause}
-    LIMIT 10
-    """,
-    "Asteroids with highest approach frequency": f"""
-    SELECT ca.neo_reference_id, COUNT(*) as approach_count
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY ca.neo_reference_id
-    ORDER BY approach_count DESC
-    LIMIT 10
-    """,
-    "Asteroids with the highest miss distance": f"""
-    SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE {where_clause}
-    ORDER BY ca.miss_distance_lunar DESC
-    LIMIT 10
-    """,
-    "Asteroids with multiple approaches in a month": f"""
-    SELECT ca.neo_reference_id, STRFTIME('%Y-%m', ca.close_approach_date) as month, COUNT(*) as approach_count
-    FROM close_approach ca
-    WHERE {where_clause}
-    GROUP BY ca.neo_reference_id, month
-    HAVING approach_count > 1
-    LIMIT 10
-    """,
-    "Asteroids that are both fast and hazardous": f"""
-    SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
-    FROM close_approach ca
-    JOIN asteroids a ON ca.neo_reference_id = a.id
-    WHERE ca.relative_velocity_kmph > 50000 AND a.is_potentially_hazardous_asteroid = 1 AND {where_clause}
-    LIMIT 10
-    """,
-    "Asteroids with increasing approach velocity over time": f"""
-    SELECT ca.neo_reference_id, ca.close_approach_date, ca.relative_velocity_kmph
-    FROM close_approach ca
-    WHERE {where_clause}
-    ORDER BY ca.neo_reference_id, ca.close_approach_date
-    """
-}
+with st.sidebar.expander("Cache stats"):
+    st.json(cache.stats())
 
-# Query execution based on user selection
-query = query_map[selected_query]
-df = pd.read_sql_query(query, conn)
-st.write(df)
+with st.sidebar.expander("Connection pool"):
+    st.json(pool.stats())
@@ -0,0 +1,283 @@
+import argparse
+import re
+import sqlite3
+import sys
+
+# Each migration is a list of statements; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    # 1: real keys for both tables and covering indexes for the dashboard filters
+    [
+        # asteroids.id becomes the rowid, keeping one row per asteroid
+        '''
+        CREATE TABLE asteroids_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            absolute_magnitude_h FLOAT,
+            estimated_diameter_min_km FLOAT,
+            estimated_diameter_max_km FLOAT,
+            is_potentially_hazardous_asteroid BOOLEAN
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO asteroids_new
+        SELECT id, name, absolute_magnitude_h, estimated_diameter_min_km,
+               estimated_diameter_max_km, is_potentially_hazardous_asteroid
+        FROM asteroids
+        ''',
+        'DROP TABLE asteroids',
+        'ALTER TABLE asteroids_new RENAME TO asteroids',
+
+        # close_approach gets its natural key, so INSERT OR REPLACE really replaces
+        '''
+        CREATE TABLE close_approach_new (
+            neo_reference_id INTEGER NOT NULL,
+            close_approach_date DATE NOT NULL,
+            relative_velocity_kmph FLOAT,
+            astronomical FLOAT,
+            miss_distance_km FLOAT,
+            miss_distance_lunar FLOAT,
+            orbiting_body TEXT NOT NULL DEFAULT '',
+            UNIQUE (neo_reference_id, close_approach_date, orbiting_body),
+            FOREIGN KEY (neo_reference_id) REFERENCES asteroids(id)
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO close_approach_new
+        SELECT neo_reference_id, close_approach_date, relative_velocity_kmph, astronomical,
+               miss_distance_km, miss_distance_lunar, COALESCE(orbiting_body, '')
+        FROM close_approach
+        ORDER BY rowid
+        ''',
+        'DROP TABLE close_approach',
+        'ALTER TABLE close_approach_new RENAME TO close_approach',
+
+        # Date-bounded filters: every filter column plus the join key, so the
+        # filtered analyses are answered from the index alone
+        '''
+        CREATE INDEX idx_close_approach_date_cover ON close_approach (
+            close_approach_date, astronomical, miss_distance_lunar,
+            relative_velocity_kmph, neo_reference_id
+        )
+        ''',
+        # "Fastest ever asteroid approach" (MAX and equality lookup)
+        'CREATE INDEX idx_close_approach_velocity ON close_approach (relative_velocity_kmph)',
+        # Unfiltered top-1/top-10 analyses on asteroids and the hazard-only join
+        'CREATE INDEX idx_asteroids_diameter ON asteroids (estimated_diameter_max_km)',
+        'CREATE INDEX idx_asteroids_magnitude ON asteroids (absolute_magnitude_h)',
+        'CREATE INDEX idx_asteroids_hazard ON asteroids (is_potentially_hazardous_asteroid)',
+    ],
+    # 2: ledger of fetched feed windows for incremental sync
+    [
+        '''
+        CREATE TABLE sync_ledger (
+            window_start DATE PRIMARY KEY,
+            window_end DATE NOT NULL,
+            fetched_at TEXT NOT NULL,
+            record_count INTEGER NOT NULL,
+            content_hash TEXT NOT NULL
+        )
+        ''',
+    ],
+    # 3: data version, bumped by every loader write so readers can invalidate caches
+    [
+        'CREATE TABLE db_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+        "INSERT INTO db_meta VALUES ('data_version', 0)",
+    ],
+    # 4: rollup tables for the monthly and per-asteroid analyses
+    [
+        '''
+        CREATE TABLE monthly_rollup (
+            month TEXT NOT NULL,
+            is_hazardous INTEGER,
+            approach_count INTEGER NOT NULL
+        )
+        ''',
+        'CREATE INDEX idx_monthly_rollup_month ON monthly_rollup (month, is_hazardous)',
+        '''
+        CREATE TABLE asteroid_rollup (
+            neo_reference_id INTEGER PRIMARY KEY,
+            approach_count INTEGER NOT NULL,
+            min_velocity FLOAT,
+            max_velocity FLOAT,
+            sum_velocity FLOAT,
+            avg_velocity FLOAT,
+            first_approach DATE,
+            last_approach DATE
+        )
+        ''',
+        'CREATE INDEX idx_asteroid_rollup_max_velocity ON asteroid_rollup (max_velocity)',
+        'CREATE INDEX idx_asteroid_rollup_count ON asteroid_rollup (approach_count)',
+        '''
+        CREATE TABLE rollup_bounds (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            min_date DATE,
+            max_date DATE,
+            max_astronomical FLOAT,
+            max_lunar FLOAT,
+            min_velocity FLOAT
+        )
+        ''',
+        '''
+        INSERT INTO monthly_rollup
+        SELECT STRFTIME('%Y-%m', ca.close_approach_date), a.is_potentially_hazardous_asteroid, COUNT(*)
+        FROM close_approach ca
+        LEFT JOIN asteroids a ON ca.neo_reference_id = a.id
+        GROUP BY 1, 2
+        ''',
+        '''
+        INSERT INTO asteroid_rollup
+        SELECT neo_reference_id, COUNT(*), MIN(relative_velocity_kmph), MAX(relative_velocity_kmph),
+               SUM(relative_velocity_kmph), AVG(relative_velocity_kmph),
+               MIN(close_approach_date), MAX(close_approach_date)
+        FROM close_approach
+        GROUP BY neo_reference_id
+        ''',
+        '''
+        INSERT INTO rollup_bounds
+        SELECT 1, MIN(close_approach_date), MAX(close_approach_date),
+               MAX(astronomical), MAX(miss_distance_lunar), MIN(relative_velocity_kmph)
+        FROM close_approach
+        ''',
+    ],
+    # 5: per-asteroid order for keyset pages over wide date ranges, covering every
+    # column the per-asteroid analyses read, so those pages stream without a sort
+    [
+        '''
+        CREATE INDEX idx_close_approach_asteroid_cover ON close_approach (
+            neo_reference_id, close_approach_date, orbiting_body,
+            astronomical, miss_distance_lunar, relative_velocity_kmph
+        )
+        ''',
+    ],
+    # 6: ledger of asteroids whose full approach history was looked up (backfill.py)
+    [
+        '''
+        CREATE TABLE backfill_ledger (
+            neo_reference_id INTEGER PRIMARY KEY,
+            fetched_at TEXT NOT NULL,
+            approach_count INTEGER NOT NULL,
+            content_hash TEXT NOT NULL
+        )
+        ''',
+    ],
+    # 7: random id of the database file, so one rebuilt from scratch is told apart
+    # from the old one even when their data versions are equal
+    [
+        "INSERT INTO db_meta VALUES ('database_id', RANDOM() & 9007199254740991)",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def get_data_version(conn):
+    """Counter bumped on every loader write; 0 for databases that predate it."""
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def get_database_id(conn):
+    """Random id given to the database when it was created or first migrated; None before migration 7."""
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'database_id'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def bump_data_version(conn):
+    """Mark the data as changed; call inside the writing transaction."""
+    conn.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'data_version'")
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction. Returns the new version."""
+    version = get_version(conn)
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in MIGRATIONS[number - 1]:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            print(f"✅ Applied schema migration {number}")
+    finally:
+        conn.isolation_level = isolation_level
+    if version < SCHEMA_VERSION:
+        conn.execute('ANALYZE')
+    return SCHEMA_VERSION
+
+
+# Plan details like "SCAN ca" or "SCAN close_approach": a scan of the table itself
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+# "name AS (" in a WITH clause, and "FROM name alias" / "JOIN name alias" references
+CTE_NAME = re.compile(r'(\w+) AS \(')
+REFERENCE = re.compile(r'\b(?:FROM|JOIN) (\w+) (\w+)')
+
+
+def cte_names(sql):
+    """Common table expressions of `sql` and their aliases; scanning those reads no table."""
+    names = set(CTE_NAME.findall(sql))
+    names.update(alias for name, alias in REFERENCE.findall(sql) if name in names)
+    return names
+
+
+def query_plan(conn, sql, params=()):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def scans_table(sql, plan):
+    """True when `plan`, the query plan of `sql`, scans a whole table rather than one of its CTEs."""
+    ctes = cte_names(sql)
+    return any(match and match.group(1) not in ctes for match in map(FULL_SCAN.match, plan))
+
+
+def check_query_plans(conn):
+    """Return {analysis: plan} for every analysis in get_query whose plan has a full table scan."""
+    from queries import QUERY_NAMES, build_params, get_query
+
+    params = build_params('2024-01-01', '2025-01-01', 0, 0.5, 10.0, "All")
+    offenders = {}
+    for name in QUERY_NAMES:
+        sql = get_query(name)
+        plan = query_plan(conn, sql, params)
+        if scans_table(sql, plan):
+            offenders[name] = plan
+    return offenders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations to an asteroid database")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--check-plans', action='store_true',
+                        help="fail if any dashboard analysis does a full table scan")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    print(f"Schema version: {migrate(conn)}")
+    if args.check_plans:
+        offenders = check_query_plans(conn)
+        for name, plan in offenders.items():
+            print(f"❌ {name}: {' | '.join(plan)}")
+        if offenders:
+            sys.exit(1)
+        print("✅ No analysis does a full table scan")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import re
+from datetime import date
+
+from queries import QUERIES
+from rollups import get_bounds
+
+# Rows per page shown in the dashboard
+PAGE_SIZE = 500
+
+# Per-asteroid pages walk idx_close_approach_asteroid_cover, which returns rows
+# in key order without a sort, once the date filter spans at least this share
+# of the stored dates; narrower ranges are cheaper to seek by date and sort.
+WIDE_RANGE_SHARE = 0.25
+
+ASTEROID_INDEX = "idx_close_approach_asteroid_cover"
+
+# Keyset SQL is derived from the registry's text once and reused, so every page
+# is one prepared statement from sqlite3's statement cache
+_sql_cache = {}
+
+
+def is_paged(query_name):
+    """True for analyses that declare keyset keys; the rest are small enough to show whole."""
+    return bool(QUERIES[query_name].keys)
+
+
+def keyset_sql(query_name, first_page, use_asteroid_index=False):
+    """SQL returning the analysis' rows in key order, after the key bound as :_key0, :_key1, ...
+
+    The declared keys are selected as trailing hidden columns, so a page's
+    last row gives the bound for the next page. The analysis' own LIMIT is
+    dropped: paging replaces the cap.
+    """
+    cache_key = (query_name, first_page, use_asteroid_index)
+    if cache_key not in _sql_cache:
+        analysis = QUERIES[query_name]
+        keys = analysis.keys
+        body = analysis.sql.rsplit('\nLIMIT', 1)[0] if analysis.limit else analysis.sql
+        body = re.sub(r'\s*ORDER BY [^\n]*$', '', body)
+
+        hidden = ', '.join(f"{key} AS _key{i}" for i, key in enumerate(keys))
+        body = re.sub(r'\n(\s*)FROM ', rf', {hidden}\n\1FROM ', body, count=1)
+        if not first_page:
+            bound = ', '.join(f":_key{i}" for i in range(len(keys)))
+            body = body.replace('WHERE ', f"WHERE ({', '.join(keys)}) > ({bound}) AND ", 1)
+        if use_asteroid_index:
+            body = body.replace('close_approach ca', f'close_approach ca INDEXED BY {ASTEROID_INDEX}', 1)
+        _sql_cache[cache_key] = f"{body}\nORDER BY {', '.join(keys)}"
+    return _sql_cache[cache_key]
+
+
+def count_sql(query_name, use_asteroid_index=False):
+    """SQL counting every row the analysis would return without its LIMIT."""
+    analysis = QUERIES[query_name]
+    body = analysis.sql.rsplit('\nLIMIT', 1)[0] if analysis.limit else analysis.sql
+    body = re.sub(r'\s*ORDER BY [^\n]*$', '', body)
+    if use_asteroid_index:
+        # Groups then stream in key order instead of going through a temp b-tree
+        body = body.replace('close_approach ca', f'close_approach ca INDEXED BY {ASTEROID_INDEX}', 1)
+    return f"SELECT COUNT(*) FROM (\n{body}\n)"
+
+
+def date_share(conn, params):
+    """Share of the stored date range covered by the date filter (1.0 when unknown)."""
+    bounds = get_bounds(conn)
+    if not bounds or bounds[0] is None:
+        return 1.0
+    low, high = date.fromisoformat(bounds[0]), date.fromisoformat(bounds[1])
+    start = max(low, date.fromisoformat(params['start_date']))
+    end = min(high, date.fromisoformat(params['end_date']))
+    span = (high - low).days + 1
+    return max(0, (end - start).days + 1) / span
+
+
+class Pager:
+    """Keyset pages of one analysis for fixed filters.
+
+    Each page is a seek past the previous page's last key followed by
+    `fetchmany`, so page N costs the same as page 1 and nothing beyond the
+    page is materialized. The total row count is a separate query.
+    """
+
+    def __init__(self, conn, query_name, params, page_size=PAGE_SIZE):
+        self.conn = conn
+        self.query_name = query_name
+        self.params = params
+        self.page_size = page_size
+        self.columns = list(QUERIES[query_name].columns)
+        self.key_count = len(QUERIES[query_name].keys)
+        self.use_asteroid_index = (
+            QUERIES[query_name].keys[0] == "ca.neo_reference_id"
+            and (not QUERIES[query_name].filtered or date_share(conn, params) >= WIDE_RANGE_SHARE)
+        )
+
+    def cursor(self, after=None):
+        params = dict(self.params)
+        if after is not None:
+            params.update({f"_key{i}": value for i, value in enumerate(after)})
+        sql = keyset_sql(self.query_name, after is None, self.use_asteroid_index)
+        return self.conn.execute(sql, params)
+
+    def split(self, rows):
+        """(visible rows, key of the last row or None)."""
+        width = len(self.columns)
+        last = tuple(rows[-1][width:]) if rows else None
+        return [row[:width] for row in rows], last
+
+    def page(self, after=None):
+        """One page of rows after key `after` (None for the first page) and the next page's key.
+
+        The next key is None when this is the last page.
+        """
+        cursor = self.cursor(after)
+        rows, last = self.split(cursor.fetchmany(self.page_size))
+        has_more = len(rows) == self.page_size and cursor.fetchone() is not None
+        cursor.close()
+        return rows, last if has_more else None
+
+    def page_frame(self, after=None):
+        import pandas as pd
+
+        rows, next_key = self.page(after)
+        return pd.DataFrame.from_records(rows, columns=self.columns), next_key
+
+    def iter_pages(self, after=None):
+        """Every page from one cursor, fetched lazily with fetchmany."""
+        cursor = self.cursor(after)
+        try:
+            while True:
+                rows, last = self.split(cursor.fetchmany(self.page_size))
+                if not rows:
+                    return
+                yield rows, last
+        finally:
+            cursor.close()
+
+    def count(self):
+        return self.conn.execute(count_sql(self.query_name, self.use_asteroid_index), self.params).fetchone()[0]
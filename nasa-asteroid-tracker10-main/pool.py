@@ -0,0 +1,218 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from migrations import migrate
+from queries import STATEMENT_CACHE_SIZE
+from releases import pointer_path, read_pointer
+
+# Per-connection page cache (negative = KiB) and memory-mapped I/O window
+READER_CACHE_KIB = 64 * 1024
+READER_MMAP_BYTES = 256 * 1024 * 1024
+
+# Wait-time samples kept for the percentile in stats()
+WAIT_SAMPLES = 1000
+
+
+def prepare_database(db_path):
+    """Apply pending migrations and switch the database to WAL, once, before readers open it.
+
+    Read-only connections can neither migrate nor change the journal mode;
+    WAL is persistent, so this sticks for every later connection.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        migrate(conn)
+        conn.execute('PRAGMA journal_mode=WAL')
+    finally:
+        conn.close()
+
+
+def open_reader(db_path, cache_kib=READER_CACHE_KIB, mmap_bytes=READER_MMAP_BYTES):
+    """Read-only connection usable from any thread (one thread at a time)."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute(f'PRAGMA cache_size = -{int(cache_kib)}')
+    conn.execute(f'PRAGMA mmap_size = {int(mmap_bytes)}')
+    return conn
+
+
+class ConnectionPool:
+    """Fixed-size pool of read-only WAL connections shared by all Streamlit sessions.
+
+    Connections are opened lazily up to `size`; a session holding one has it
+    to itself until it is returned. Under WAL, readers keep serving the last
+    committed snapshot while a loader writes.
+    """
+
+    def __init__(self, db_path, size=4, timeout=30.0, cache_kib=READER_CACHE_KIB, mmap_bytes=READER_MMAP_BYTES):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.cache_kib = cache_kib
+        self.mmap_bytes = mmap_bytes
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.samples = deque(maxlen=WAIT_SAMPLES)
+
+    def acquire(self):
+        started = time.perf_counter()
+        conn = None
+        with self.lock:
+            if self.idle.empty() and self.opened < self.size:
+                self.opened += 1
+                opening = True
+            else:
+                opening = False
+        if opening:
+            try:
+                conn = open_reader(self.db_path, self.cache_kib, self.mmap_bytes)
+            except Exception:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        else:
+            try:
+                conn = self.idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No pooled connection free after {self.timeout}s") from None
+
+        waited = time.perf_counter() - started
+        with self.lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.samples.append(waited)
+            self.wait_seconds += waited
+            self.max_wait = max(self.max_wait, waited)
+            if not opening and waited > 0.001:
+                self.waits += 1
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            self.in_use -= 1
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def current(self):
+        """The pool serving this run's queries; a plain pool always serves itself."""
+        return self
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+            with self.lock:
+                self.opened -= 1
+
+    def stats(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            return {
+                'size': self.size,
+                'open': self.opened,
+                'in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'avg_wait_ms': 1000 * self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                'p95_wait_ms': 1000 * samples[int(0.95 * (len(samples) - 1))] if samples else 0.0,
+                'max_wait_ms': 1000 * self.max_wait,
+            }
+
+
+class ReleasePool:
+    """Follows the releases published by scheduler.py, one ConnectionPool per release.
+
+    The pointer file is checked at most every `check_interval` seconds with a
+    stat. When it names a new release, later checkouts get connections to the
+    new file; connections already handed out finish on the old one, and the
+    old pool's connections are closed as they come back idle. Nothing waits
+    for the swap: the new pool opens its connections lazily.
+    """
+
+    def __init__(self, directory, size=4, check_interval=1.0, **options):
+        self.directory = directory
+        self.size = size
+        self.check_interval = check_interval
+        self.options = options
+        self.lock = threading.Lock()
+        self.pool = None
+        self.release = None
+        self.pointer_mtime = None
+        self.checked = 0.0
+        self.retired = []
+        self.swaps = 0
+        self.refresh(force=True)
+        if self.pool is None:
+            raise FileNotFoundError(f"No release published in '{directory}'")
+
+    def refresh(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.checked < self.check_interval:
+                return
+            self.checked = now
+            # Connections of older releases that came back since the last check
+            for pool in self.retired:
+                pool.close()
+            self.retired = [pool for pool in self.retired if pool.opened]
+            try:
+                mtime = os.stat(pointer_path(self.directory)).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime == self.pointer_mtime:
+                return
+            self.pointer_mtime = mtime
+            pointer = read_pointer(self.directory)
+            if pointer is None or (self.release and pointer['version'] == self.release['version']):
+                return
+            if self.pool is not None:
+                self.retired.append(self.pool)
+                self.pool.close()
+                self.swaps += 1
+            self.pool = ConnectionPool(os.path.join(self.directory, pointer['path']), self.size, **self.options)
+            self.release = pointer
+
+    def current(self):
+        """Pool of the newest published release; use one per run so every query sees the same data."""
+        self.refresh()
+        return self.pool
+
+    @property
+    def db_path(self):
+        return self.current().db_path
+
+    @contextmanager
+    def connection(self):
+        with self.current().connection() as conn:
+            yield conn
+
+    def close(self):
+        with self.lock:
+            for pool in self.retired + [self.pool]:
+                pool.close()
+
+    def stats(self):
+        stats = self.pool.stats()
+        stats.update(release=self.release['version'], published_at=self.release['published_at'],
+                     swaps=self.swaps, retired_open=sum(pool.opened for pool in self.retired))
+        return stats
@@ -1,235 +1,338 @@
-def build_where_clause(start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous):
-    base_clause = f"""
-    ca.close_approach_date BETWEEN '{start_date}' AND '{end_date}'
-    AND ca.astronomical < {astro_limit}
-    AND ca.miss_distance_lunar < {lunar_limit}
-    AND ca.relative_velocity_kmph >= {velocity_min}
-    """
+from collections import namedtuple
+
+from rollups import rollup_sql
+
+# Every dashboard analysis is defined once here. The SQL text is constant and
+# takes the sidebar filters as bound parameters, so sqlite3 prepares each
+# statement once per connection and reuses it from its statement cache.
+Analysis = namedtuple('Analysis', ['name', 'sql', 'columns', 'limit', 'filtered', 'keys'])
+
+# Sidebar filters on close_approach (alias ca)
+FILTER = """
+    ca.close_approach_date BETWEEN :start_date AND :end_date
+    AND ca.astronomical < :astro_limit
+    AND ca.miss_distance_lunar < :lunar_limit
+    AND ca.relative_velocity_kmph >= :velocity_min
+"""
+
+# Hazard radio for analyses that join asteroids (alias a) and for those that don't
+HAZARD_FILTER = "AND (:hazardous IS NULL OR a.is_potentially_hazardous_asteroid = :hazardous)"
+HAZARD_FILTER_CA = """AND (:hazardous IS NULL OR ca.neo_reference_id IN (
+        SELECT id FROM asteroids WHERE is_potentially_hazardous_asteroid = :hazardous))"""
+
+WHERE = FILTER + HAZARD_FILTER
+WHERE_CA = FILTER + HAZARD_FILTER_CA
+
+# Unique sort keys for keyset pagination (pagination.py). Row listings follow
+# idx_close_approach_date_cover, whose entries end with the rowid; per-asteroid
+# groups follow the group key.
+APPROACH_KEYS = ("ca.close_approach_date", "ca.astronomical", "ca.miss_distance_lunar",
+                 "ca.relative_velocity_kmph", "ca.neo_reference_id", "ca.rowid")
+ASTEROID_KEYS = ("ca.neo_reference_id",)
+
 
-    if hazardous == "Yes":
-        base_clause += " AND a.is_potentially_hazardous_asteroid = 1"
-    elif hazardous == "No":
-        base_clause += " AND a.is_potentially_hazardous_asteroid = 0"
+def analysis(name, body, columns, limit=None, filtered=True, keys=()):
+    sql = body.strip() + (f"\nLIMIT {limit}" if limit else "")
+    return Analysis(name, sql, tuple(columns), limit, filtered, tuple(keys))
 
-    return base_clause
 
-def get_query(query_name, where_clause, start_date, end_date, velocity_min, astro_limit, lunar_limit):
-    query_map = {
-        "All Filtered Asteroids": f"""
+# Trend analyses fit a least-squares line through each asteroid's approaches
+# and keep the asteroids whose line goes the asked-for way; slopes are per
+# year. Time is counted in whole days from the filter's start date, so the
+# sums of t and t*t are exact and stay small next to the sums they are
+# subtracted from. Monotonicity is the share of consecutive approaches (by
+# date, then value) that move in that direction; 1.0 means every one does.
+TREND_MIN_APPROACHES = 3
+TREND_LIMIT = 100
+
+
+def trend_analysis(name, column, columns, falling):
+    # The fit is one grouped pass; the LAG window that measures monotonicity
+    # only runs over the approaches of the asteroids that made the cut
+    step, order = ("< 0", "ASC") if falling else ("> 0", "DESC")
+    return analysis(name, f"""
+        WITH fits AS (
+            SELECT neo_reference_id, COUNT(*) AS n,
+                   365.25 * (COUNT(*) * SUM(t * y) - SUM(t) * SUM(y))
+                       / NULLIF(COUNT(*) * SUM(t * t) - SUM(t) * SUM(t), 0) AS slope
+            FROM (
+                SELECT ca.neo_reference_id,
+                       julianday(ca.close_approach_date) - julianday(:start_date) AS t, {column} AS y
+                FROM close_approach ca
+                WHERE {WHERE_CA}
+            )
+            GROUP BY neo_reference_id
+            HAVING n >= {TREND_MIN_APPROACHES} AND slope {step}
+            ORDER BY slope {order}, neo_reference_id
+            LIMIT {TREND_LIMIT}
+        ), steps AS (
+            SELECT ca.neo_reference_id,
+                   {column} - LAG({column}) OVER (
+                       PARTITION BY ca.neo_reference_id ORDER BY ca.close_approach_date, {column}) AS step
+            FROM close_approach ca
+            WHERE ca.neo_reference_id IN (SELECT neo_reference_id FROM fits) AND {WHERE_CA}
+        )
+        SELECT f.neo_reference_id, f.n, f.slope, CAST(SUM(s.step {step}) AS REAL) / (f.n - 1) AS monotonicity
+        FROM fits f
+        JOIN steps s ON s.neo_reference_id = f.neo_reference_id
+        GROUP BY f.neo_reference_id
+        ORDER BY f.slope {order}, f.neo_reference_id
+        """, columns, TREND_LIMIT)
+
+
+ANALYSES = [
+    analysis("All Filtered Asteroids", f"""
         SELECT a.name, a.absolute_magnitude_h, a.estimated_diameter_min_km,
                a.estimated_diameter_max_km, a.is_potentially_hazardous_asteroid,
                ca.close_approach_date, ca.relative_velocity_kmph,
                ca.astronomical, ca.miss_distance_lunar
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
-        LIMIT 10000
+        WHERE {WHERE}
         """,
-        "Count asteroid approaches": f"""
+        ["name", "absolute_magnitude_h", "estimated_diameter_min_km", "estimated_diameter_max_km",
+         "is_potentially_hazardous_asteroid", "close_approach_date", "relative_velocity_kmph",
+         "astronomical", "miss_distance_lunar"], 10000, keys=APPROACH_KEYS),
+    analysis("Count asteroid approaches", f"""
         SELECT ca.neo_reference_id, COUNT(*) as approach_count
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY ca.neo_reference_id
-        LIMIT 10000
         """,
-        "Average velocity of each asteroid": f"""
+        ["neo_reference_id", "approach_count"], 10000, keys=ASTEROID_KEYS),
+    analysis("Average velocity of each asteroid", f"""
         SELECT ca.neo_reference_id, AVG(ca.relative_velocity_kmph) as avg_velocity
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY ca.neo_reference_id
-        LIMIT 10000
         """,
-        "Top 10 fastest asteroids": f"""
+        ["neo_reference_id", "avg_velocity"], 10000, keys=ASTEROID_KEYS),
+    analysis("Top 10 fastest asteroids", f"""
         SELECT ca.neo_reference_id, MAX(ca.relative_velocity_kmph) as max_velocity
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY ca.neo_reference_id
         ORDER BY max_velocity DESC
-        LIMIT 10
         """,
-        "Hazardous asteroids with >3 approaches": f"""
+        ["neo_reference_id", "max_velocity"], 10),
+    analysis("Hazardous asteroids with >3 approaches", """
         SELECT ca.neo_reference_id, COUNT(*) as approach_count
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
         WHERE a.is_potentially_hazardous_asteroid = 1
         GROUP BY ca.neo_reference_id
         HAVING approach_count > 3
-        LIMIT 10000
         """,
-        "Month with most approaches": f"""
+        ["neo_reference_id", "approach_count"], 10000, filtered=False, keys=ASTEROID_KEYS),
+    analysis("Month with most approaches", f"""
         SELECT STRFTIME('%Y-%m', ca.close_approach_date) as month, COUNT(*) as total
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY month
         ORDER BY total DESC
-        LIMIT 1
         """,
-        "Fastest ever asteroid approach": """
+        ["month", "total"], 1),
+    analysis("Fastest ever asteroid approach", """
         SELECT ca.neo_reference_id, ca.relative_velocity_kmph, ca.close_approach_date
         FROM close_approach ca
         WHERE ca.relative_velocity_kmph = (SELECT MAX(relative_velocity_kmph) FROM close_approach)
-        LIMIT 1
         """,
-        "Asteroids sorted by max estimated diameter": """
+        ["neo_reference_id", "relative_velocity_kmph", "close_approach_date"], 1, filtered=False),
+    analysis("Asteroids sorted by max estimated diameter", """
         SELECT id, name, estimated_diameter_max_km
         FROM asteroids
         ORDER BY estimated_diameter_max_km DESC
-        LIMIT 10
-        """,
-        "Asteroids getting closer over time": f"""
-        SELECT ca.neo_reference_id, ca.close_approach_date, ca.miss_distance_lunar
-        FROM close_approach ca
-        WHERE {where_clause}
-        ORDER BY ca.neo_reference_id, ca.close_approach_date
-        LIMIT 10000
         """,
-        "Closest approach details by asteroid": f"""
+        ["id", "name", "estimated_diameter_max_km"], 10, filtered=False),
+    trend_analysis("Asteroids getting closer over time", "ca.miss_distance_lunar",
+                   ["neo_reference_id", "approach_count", "lunar_per_year", "monotonicity"], falling=True),
+    analysis("Closest approach details by asteroid", f"""
         SELECT a.name, ca.close_approach_date, MIN(ca.miss_distance_lunar) as closest
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
+        WHERE {WHERE}
         GROUP BY ca.neo_reference_id
-        LIMIT 10000
         """,
-        "Asteroids with velocity > 50000 km/h": f"""
+        ["name", "close_approach_date", "closest"], 10000, keys=ASTEROID_KEYS),
+    analysis("Asteroids with velocity > 50000 km/h", f"""
         SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE ca.relative_velocity_kmph > 50000 AND {where_clause}
-        LIMIT 10000
+        WHERE ca.relative_velocity_kmph > 50000 AND {WHERE}
         """,
-        "Approaches per month": f"""
+        ["name", "relative_velocity_kmph", "close_approach_date"], 10000, keys=APPROACH_KEYS),
+    analysis("Approaches per month", f"""
         SELECT STRFTIME('%Y-%m', ca.close_approach_date) as month, COUNT(*) as count
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY month
-        LIMIT 10000
         """,
-        "Asteroid with highest brightness (lowest magnitude)": """
+        ["month", "count"], 10000),
+    analysis("Asteroid with highest brightness (lowest magnitude)", """
         SELECT id, name, absolute_magnitude_h
         FROM asteroids
         ORDER BY absolute_magnitude_h ASC
-        LIMIT 1
         """,
-        "Hazardous vs non-hazardous asteroid count": f"""
+        ["id", "name", "absolute_magnitude_h"], 1, filtered=False),
+    analysis("Hazardous vs non-hazardous asteroid count", f"""
         SELECT hazard_status, COUNT(*) as count
         FROM (
-            SELECT 
-                CASE 
+            SELECT
+                CASE
                     WHEN a.is_potentially_hazardous_asteroid = 1 THEN 'Hazardous'
                     ELSE 'Non-Hazardous'
                 END AS hazard_status
             FROM asteroids a
             JOIN close_approach ca ON ca.neo_reference_id = a.id
-            WHERE ca.close_approach_date BETWEEN '{start_date}' AND '{end_date}'
-            AND ca.astronomical < {astro_limit}
-            AND ca.miss_distance_lunar < {lunar_limit}
-            AND ca.relative_velocity_kmph >= {velocity_min}
+            WHERE {FILTER}
             LIMIT 10000
         )
         GROUP BY hazard_status
         """,
-        "Hazardous vs non-hazardous approach events": f"""
-        SELECT 
+        ["hazard_status", "count"]),
+    analysis("Hazardous vs non-hazardous approach events", f"""
+        SELECT
             CASE WHEN a.is_potentially_hazardous_asteroid = 1 THEN 'Hazardous'
                  ELSE 'Non-Hazardous'
             END AS hazard_status,
             COUNT(*) as count
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
+        WHERE {WHERE}
         GROUP BY a.is_potentially_hazardous_asteroid
-        LIMIT 10000
         """,
-        "Asteroids closer than Moon": f"""
+        ["hazard_status", "count"], 10000),
+    analysis("Asteroids closer than Moon", f"""
         SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE ca.miss_distance_lunar < 1.0 AND {where_clause}
-        LIMIT 10000
+        WHERE ca.miss_distance_lunar < 1.0 AND {WHERE}
         """,
-        "Asteroids within 0.05 AU": f"""
+        ["name", "close_approach_date", "miss_distance_lunar"], 10000, keys=APPROACH_KEYS),
+    analysis("Asteroids within 0.05 AU", f"""
         SELECT a.name, ca.close_approach_date, ca.astronomical
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE ca.astronomical < 0.05 AND {where_clause}
-        LIMIT 10000
+        WHERE ca.astronomical < 0.05 AND {WHERE}
         """,
-        "Asteroids with maximum relative velocity": f"""
+        ["name", "close_approach_date", "astronomical"], 10000, keys=APPROACH_KEYS),
+    analysis("Asteroids with maximum relative velocity", f"""
         SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
+        WHERE {WHERE}
         ORDER BY ca.relative_velocity_kmph DESC
-        LIMIT 10
         """,
-        "Asteroids with the closest approach to Earth": f"""
+        ["name", "relative_velocity_kmph", "close_approach_date"], 10),
+    analysis("Asteroids with the closest approach to Earth", f"""
         SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
+        WHERE {WHERE}
         ORDER BY ca.miss_distance_lunar ASC
-        LIMIT 10
         """,
-        "Asteroids with the highest estimated diameter": f"""
+        ["name", "close_approach_date", "miss_distance_lunar"], 10),
+    analysis("Asteroids with the highest estimated diameter", f"""
         SELECT a.name, a.estimated_diameter_max_km, a.estimated_diameter_min_km
         FROM asteroids a
         JOIN close_approach ca ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
+        WHERE {WHERE}
         ORDER BY a.estimated_diameter_max_km DESC
-        LIMIT 10
         """,
-        "Asteroids approaching at high velocity": f"""
+        ["name", "estimated_diameter_max_km", "estimated_diameter_min_km"], 10),
+    analysis("Asteroids approaching at high velocity", f"""
         SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE ca.relative_velocity_kmph > 60000 AND {where_clause}
-        LIMIT 10
+        WHERE ca.relative_velocity_kmph > 60000 AND {WHERE}
         """,
-        "Asteroids approaching Earth during a specific month": f"""
+        ["name", "relative_velocity_kmph", "close_approach_date"], 10),
+    analysis("Asteroids approaching Earth during a specific month", f"""
         SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE STRFTIME('%Y-%m', ca.close_approach_date) = STRFTIME('%Y-%m', '{start_date}') AND {where_clause}
-        LIMIT 10
+        WHERE STRFTIME('%Y-%m', ca.close_approach_date) = STRFTIME('%Y-%m', :start_date) AND {WHERE}
         """,
-        "Asteroids with highest approach frequency": f"""
+        ["name", "close_approach_date", "miss_distance_lunar"], 10),
+    analysis("Asteroids with highest approach frequency", f"""
         SELECT ca.neo_reference_id, COUNT(*) as approach_count
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY ca.neo_reference_id
         ORDER BY approach_count DESC
-        LIMIT 10
         """,
-        "Asteroids with the highest miss distance": f"""
+        ["neo_reference_id", "approach_count"], 10),
+    analysis("Asteroids with the highest miss distance", f"""
         SELECT a.name, ca.close_approach_date, ca.miss_distance_lunar
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE {where_clause}
+        WHERE {WHERE}
         ORDER BY ca.miss_distance_lunar DESC
-        LIMIT 10
         """,
-        "Asteroids with multiple approaches in a month": f"""
+        ["name", "close_approach_date", "miss_distance_lunar"], 10),
+    analysis("Asteroids with multiple approaches in a month", f"""
         SELECT ca.neo_reference_id, STRFTIME('%Y-%m', ca.close_approach_date) as month, COUNT(*) as approach_count
         FROM close_approach ca
-        WHERE {where_clause}
+        WHERE {WHERE_CA}
         GROUP BY ca.neo_reference_id, month
         HAVING approach_count > 1
-        LIMIT 10
         """,
-        "Asteroids that are both fast and hazardous": f"""
+        ["neo_reference_id", "month", "approach_count"], 10),
+    analysis("Asteroids that are both fast and hazardous", f"""
         SELECT a.name, ca.relative_velocity_kmph, ca.close_approach_date
         FROM close_approach ca
         JOIN asteroids a ON ca.neo_reference_id = a.id
-        WHERE ca.relative_velocity_kmph > 50000 AND a.is_potentially_hazardous_asteroid = 1 AND {where_clause}
-        LIMIT 10
+        WHERE ca.relative_velocity_kmph > 50000 AND a.is_potentially_hazardous_asteroid = 1 AND {WHERE}
         """,
-        "Asteroids with increasing approach velocity over time": f"""
-        SELECT ca.neo_reference_id, ca.close_approach_date, ca.relative_velocity_kmph
-        FROM close_approach ca
-        WHERE {where_clause}
-        ORDER BY ca.neo_reference_id, ca.close_approach_date
-        """
+        ["name", "relative_velocity_kmph", "close_approach_date"], 10),
+    trend_analysis("Asteroids with increasing approach velocity over time", "ca.relative_velocity_kmph",
+                   ["neo_reference_id", "approach_count", "kmph_per_year", "monotonicity"], falling=False),
+]
+
+QUERIES = {a.name: a for a in ANALYSES}
+
+# Analyses offered in the dashboard, in display order
+QUERY_NAMES = [a.name for a in ANALYSES]
+
+# Analyses that ignore the sidebar filters
+UNFILTERED_QUERIES = {a.name for a in ANALYSES if not a.filtered}
+
+# Room in sqlite3's per-connection statement cache for every analysis, its
+# rollup version and its keyset page and count variants (pagination.py)
+STATEMENT_CACHE_SIZE = 8 * len(ANALYSES)
+
+
+def build_params(start_date, end_date, velocity_min, astro_limit, lunar_limit, hazardous):
+    """Bound parameters for the sidebar filters, shared by every analysis."""
+    return {
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "velocity_min": velocity_min,
+        "astro_limit": astro_limit,
+        "lunar_limit": lunar_limit,
+        "hazardous": {"Yes": 1, "No": 0}.get(hazardous),
     }
 
-    return query_map.get(query_name, "")
+
+def get_query(query_name):
+    """SQL text of an analysis, or "" for an unknown name."""
+    analysis = QUERIES.get(query_name)
+    return analysis.sql if analysis else ""
+
+
+def execute(conn, query_name, params):
+    """Run an analysis and return the open cursor.
+
+    Monthly and per-asteroid aggregates are answered from the rollup tables
+    whenever the filters allow it.
+    """
+    sql = rollup_sql(conn, query_name, params) or QUERIES[query_name].sql
+    return conn.execute(sql, params)
+
+
+def run_query(conn, query_name, params):
+    """Run an analysis into a DataFrame with its declared columns."""
+    import pandas as pd
+
+    rows = execute(conn, query_name, params).fetchall()
+    return pd.DataFrame.from_records(rows, columns=list(QUERIES[query_name].columns))
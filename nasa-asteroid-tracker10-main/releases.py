@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+# Published database releases, written by scheduler.py and read by the app.
+#
+#   <db stem>.releases/
+#       v000007.db, v000007.snapshot/   a complete, validated database and its column snapshot
+#       v000008.db, v000008.snapshot/
+#       current.json                    pointer: which release readers should open
+#       staging.db                      the release being built (never read by the app)
+#
+# A release file is never written once published. The pointer is replaced
+# atomically, so a reader sees either the old release or the new one.
+
+POINTER = 'current.json'
+STAGING = 'staging.db'
+
+# Releases kept on disk: the current one plus the one before it, which
+# sessions that have not yet noticed the swap may still be reading
+KEEP_RELEASES = 2
+
+
+def releases_dir(db_path):
+    """Directory holding the releases of `db_path`, e.g. nasa_asteroids_10k.releases/."""
+    return os.path.splitext(db_path)[0] + '.releases'
+
+
+def release_name(version):
+    return f"v{version:06d}.db"
+
+
+def release_path(directory, version):
+    return os.path.join(directory, release_name(version))
+
+
+def pointer_path(directory):
+    return os.path.join(directory, POINTER)
+
+
+def read_pointer(directory):
+    """The current release's pointer ({'version', 'path', ...}), or None when nothing is published."""
+    try:
+        with open(pointer_path(directory)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_pointer(directory, version, stats):
+    """Point readers at release `version`; written whole and renamed over the old pointer."""
+    pointer = dict(stats, version=version, path=release_name(version),
+                   published_at=datetime.now().isoformat(timespec='seconds'))
+    tmp = pointer_path(directory) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(pointer, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer_path(directory))
+    return pointer
+
+
+def list_versions(directory):
+    """Versions of the release files on disk, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[1:-3]) for name in names
+                  if name.startswith('v') and name.endswith('.db') and name[1:-3].isdigit())
+
+
+def next_version(directory):
+    pointer = read_pointer(directory)
+    return max(list_versions(directory) + [pointer['version'] if pointer else 0]) + 1
+
+
+def remove_database(path):
+    """Delete a database file with its WAL/shared-memory files and its column snapshot."""
+    from snapshot import snapshot_dir
+
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.rmtree(snapshot_dir(path), ignore_errors=True)
+
+
+def collect_garbage(directory, keep=KEEP_RELEASES):
+    """Delete all but the `keep` newest releases up to the current one, plus newer unpublished files.
+
+    Unlinking is safe on POSIX while a reader still has an old release open;
+    it keeps reading the file until it closes its connection.
+    """
+    pointer = read_pointer(directory)
+    if pointer is None:
+        return []
+    versions = list_versions(directory)
+    published = [v for v in versions if v <= pointer['version']]
+    doomed = published[:-keep] + [v for v in versions if v > pointer['version']]
+    for version in doomed:
+        remove_database(release_path(directory, version))
+    return [release_name(v) for v in doomed]
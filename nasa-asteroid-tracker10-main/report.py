@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+from columnar import ColumnStore, check_parity
+from migrations import get_data_version, migrate
+from queries import QUERY_NAMES, UNFILTERED_QUERIES, build_params, run_query
+
+# Full report: every dashboard analysis from one filtered scan.
+#
+# Running the 27 analyses one by one filters and joins close_approach 27
+# times. A report reads the filtered rows once, along the date cover index,
+# into a ColumnStore and answers every filtered analysis from those arrays
+# (counts, per-asteroid group-bys, month histograms, top-k and min/max are
+# all vectorized passes over the same rows). Analyses that ignore the
+# filters run as their own query, since the filtered rows can't answer them.
+
+REPORT_FORMAT = 1
+
+
+def report_path(db_path):
+    """Default bundle path: next to the database, named after it."""
+    return os.path.splitext(db_path)[0] + '.report.db'
+
+
+def table_name(query_name):
+    """SQL-safe table name for an analysis in a SQLite bundle."""
+    return re.sub(r'[^a-z0-9]+', '_', query_name.lower()).strip('_')
+
+
+class Report:
+    """Result of every analysis for one set of filters, plus how long it took."""
+
+    def __init__(self, params, data_version, results, timings):
+        self.params = params
+        self.data_version = data_version
+        self.results = results
+        self.timings = timings
+
+    def run(self, query_name, params):
+        # Same interface as ColumnStore.run, for columnar.check_parity
+        return self.results[query_name]
+
+    def meta(self):
+        return {
+            'format': REPORT_FORMAT,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'data_version': self.data_version,
+            'params': self.params,
+            'timings_ms': self.timings,
+        }
+
+
+def build_report(conn, params):
+    """Run every analysis for `params` over one filtered scan; returns a Report."""
+    started = time.perf_counter()
+    store = ColumnStore.from_sqlite(conn, params=params)
+    scanned = time.perf_counter()
+    results = {}
+    for name in QUERY_NAMES:
+        if name in UNFILTERED_QUERIES:
+            results[name] = run_query(conn, name, params)
+        else:
+            results[name] = store.run(name, params)
+    finished = time.perf_counter()
+    timings = {
+        'scan': round(1000 * (scanned - started), 3),
+        'analyses': round(1000 * (finished - scanned), 3),
+        'total': round(1000 * (finished - started), 3),
+        'rows_scanned': len(store),
+    }
+    return Report(params, get_data_version(conn), results, timings)
+
+
+def write_sqlite(report, path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE report_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT INTO report_meta VALUES (?, ?)",
+                         [(k, json.dumps(v)) for k, v in report.meta().items()])
+        conn.execute("CREATE TABLE report_index (analysis TEXT PRIMARY KEY, table_name TEXT, rows INTEGER)")
+        for name, df in report.results.items():
+            df.to_sql(table_name(name), conn, index=False)
+            conn.execute("INSERT INTO report_index VALUES (?, ?, ?)", (name, table_name(name), len(df)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_json(report, path):
+    bundle = {
+        'meta': report.meta(),
+        'analyses': {name: json.loads(df.to_json(orient='split', index=False))
+                     for name, df in report.results.items()},
+    }
+    with open(path, 'w') as f:
+        json.dump(bundle, f)
+
+
+def write_bundle(report, path):
+    """Write every result table to one file: JSON for a .json path, otherwise a SQLite database."""
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    if path.endswith('.json'):
+        write_json(report, tmp_path)
+    else:
+        write_sqlite(report, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def bundle_bytes(report, suffix='.db'):
+    """Bundle contents as bytes, for a download button."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report' + suffix)
+        write_bundle(report, path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def time_one_by_one(conn, params):
+    """Milliseconds to run every analysis as its own query, the way the dashboard does."""
+    started = time.perf_counter()
+    for name in QUERY_NAMES:
+        run_query(conn, name, params)
+    return 1000 * (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every analysis over one filtered scan and save the results")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--out', help="bundle path (default: <db stem>.report.db); .json writes JSON, anything else SQLite")
+    parser.add_argument('--start-date', default='2024-01-01')
+    parser.add_argument('--end-date', default='2025-01-01')
+    parser.add_argument('--velocity-min', type=float, default=0)
+    parser.add_argument('--astro-limit', type=float, default=0.5)
+    parser.add_argument('--lunar-limit', type=float, default=10.0)
+    parser.add_argument('--hazardous', choices=['All', 'Yes', 'No'], default='All')
+    parser.add_argument('--compare', action='store_true',
+                        help="also run the analyses one by one, compare timings and results")
+    args = parser.parse_args()
+
+    # Imported up front so the import isn't counted in the report's timings
+    import pandas  # noqa: F401
+
+    out = args.out or report_path(args.db)
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+    params = build_params(args.start_date, args.end_date, args.velocity_min,
+                          args.astro_limit, args.lunar_limit, args.hazardous)
+    report = build_report(conn, params)
+    write_bundle(report, out)
+    timings = report.timings
+    print(f"✅ Wrote {len(report.results)} analyses to '{out}' in {timings['total']:.1f} ms "
+          f"(scan of {timings['rows_scanned']:,} rows {timings['scan']:.1f} ms, analyses {timings['analyses']:.1f} ms)")
+
+    if args.compare:
+        separate = time_one_by_one(conn, params)
+        print(f"One query per analysis: {separate:.1f} ms ({separate / timings['total']:.1f}x the report)")
+        mismatches = check_parity(conn, report, [(args.start_date, args.end_date, args.velocity_min,
+                                                  args.astro_limit, args.lunar_limit, args.hazardous)])
+        for name, filters, expected, actual in mismatches:
+            print(f"❌ {name}: sqlite {expected} rows, report {actual} rows")
+        if mismatches:
+            sys.exit(1)
+        print("✅ Report matches the per-analysis queries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import sqlite3
+from datetime import date, timedelta
+
+# Rollup tables (created by migration 4) are kept in step with close_approach
+# by the loaders, inside the same transaction as the rows they summarize:
+#   monthly_rollup   approaches per month and hazard class
+#   asteroid_rollup  per-asteroid count/min/max/sum/avg velocity, first/last approach
+#   rollup_bounds    one row of data bounds used to decide when filters are a no-op
+
+MONTHLY_SELECT = '''
+SELECT STRFTIME('%Y-%m', ca.close_approach_date) AS month,
+       a.is_potentially_hazardous_asteroid AS is_hazardous,
+       COUNT(*) AS approach_count
+FROM close_approach ca
+LEFT JOIN asteroids a ON ca.neo_reference_id = a.id
+'''
+
+ASTEROID_SELECT = '''
+SELECT neo_reference_id, COUNT(*), MIN(relative_velocity_kmph), MAX(relative_velocity_kmph),
+       SUM(relative_velocity_kmph), AVG(relative_velocity_kmph),
+       MIN(close_approach_date), MAX(close_approach_date)
+FROM close_approach
+'''
+
+BOUNDS_SELECT = '''
+SELECT 1, MIN(close_approach_date), MAX(close_approach_date),
+       MAX(astronomical), MAX(miss_distance_lunar), MIN(relative_velocity_kmph)
+FROM close_approach
+'''
+
+
+def month_range(month):
+    """First day of `month` (YYYY-MM) and first day of the next month."""
+    first = date.fromisoformat(month + '-01')
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first.isoformat(), following.isoformat()
+
+
+def refresh_rollups(conn, records):
+    """Recompute the rollup rows touched by `records`; call inside the writing transaction."""
+    if not records:
+        return
+    ids = {r['neo_reference_id'] for r in records}
+    conn.executemany(
+        'INSERT OR REPLACE INTO asteroid_rollup ' + ASTEROID_SELECT + 'WHERE neo_reference_id = ?',
+        [(i,) for i in ids]
+    )
+
+    # A changed hazard flag moves every approach of that asteroid between classes,
+    # so refresh all months those asteroids appear in, not just the batch's months
+    months = set()
+    for i in ids:
+        months.update(row[0] for row in conn.execute(
+            "SELECT DISTINCT STRFTIME('%Y-%m', close_approach_date) FROM close_approach "
+            "WHERE neo_reference_id = ?", (i,)))
+    for month in months:
+        first, following = month_range(month)
+        conn.execute('DELETE FROM monthly_rollup WHERE month = ?', (month,))
+        conn.execute(
+            'INSERT INTO monthly_rollup ' + MONTHLY_SELECT +
+            'WHERE ca.close_approach_date >= ? AND ca.close_approach_date < ? GROUP BY month, is_hazardous',
+            (first, following)
+        )
+
+    # Bounds only ever widen, which keeps them safe upper/lower limits
+    conn.execute('''
+        UPDATE rollup_bounds SET
+            min_date = MIN(COALESCE(min_date, :min_date), :min_date),
+            max_date = MAX(COALESCE(max_date, :max_date), :max_date),
+            max_astronomical = MAX(COALESCE(max_astronomical, :max_au), :max_au),
+            max_lunar = MAX(COALESCE(max_lunar, :max_lunar), :max_lunar),
+            min_velocity = MIN(COALESCE(min_velocity, :min_velocity), :min_velocity)
+    ''', {
+        'min_date': min(str(r['close_approach_date']) for r in records),
+        'max_date': max(str(r['close_approach_date']) for r in records),
+        'max_au': max(r['astronomical'] for r in records),
+        'max_lunar': max(r['miss_distance_lunar'] for r in records),
+        'min_velocity': min(r['relative_velocity_kmph'] for r in records),
+    })
+
+
+def rebuild_rollups(conn):
+    """Rebuild every rollup from scratch, e.g. after a bulk load."""
+    with conn:
+        conn.execute('DELETE FROM asteroid_rollup')
+        conn.execute('INSERT INTO asteroid_rollup ' + ASTEROID_SELECT + 'GROUP BY neo_reference_id')
+        conn.execute('DELETE FROM monthly_rollup')
+        conn.execute('INSERT INTO monthly_rollup ' + MONTHLY_SELECT + 'GROUP BY month, is_hazardous')
+        conn.execute('DELETE FROM rollup_bounds')
+        conn.execute('INSERT INTO rollup_bounds ' + BOUNDS_SELECT)
+
+
+# Rollup versions of the analyses that only need monthly or per-asteroid aggregates
+MONTH_FILTER = '''
+    month BETWEEN SUBSTR(:start_date, 1, 7) AND SUBSTR(:end_date, 1, 7)
+    AND (:hazardous IS NULL OR is_hazardous = :hazardous)
+'''
+
+ASTEROID_HAZARD = '''(:hazardous IS NULL OR neo_reference_id IN (
+    SELECT id FROM asteroids WHERE is_potentially_hazardous_asteroid = :hazardous))'''
+
+MONTHLY_QUERIES = {
+    "Approaches per month": f'''
+        SELECT month, SUM(approach_count) AS count
+        FROM monthly_rollup
+        WHERE {MONTH_FILTER}
+        GROUP BY month
+        ORDER BY month
+        LIMIT 10000
+    ''',
+    "Month with most approaches": f'''
+        SELECT month, SUM(approach_count) AS total
+        FROM monthly_rollup
+        WHERE {MONTH_FILTER}
+        GROUP BY month
+        ORDER BY total DESC
+        LIMIT 1
+    ''',
+}
+
+ASTEROID_QUERIES = {
+    "Count asteroid approaches": f'''
+        SELECT neo_reference_id, approach_count
+        FROM asteroid_rollup
+        WHERE {ASTEROID_HAZARD}
+        ORDER BY neo_reference_id
+        LIMIT 10000
+    ''',
+    "Average velocity of each asteroid": f'''
+        SELECT neo_reference_id, avg_velocity
+        FROM asteroid_rollup
+        WHERE {ASTEROID_HAZARD}
+        ORDER BY neo_reference_id
+        LIMIT 10000
+    ''',
+    "Top 10 fastest asteroids": f'''
+        SELECT neo_reference_id, max_velocity
+        FROM asteroid_rollup
+        WHERE {ASTEROID_HAZARD}
+        ORDER BY max_velocity DESC
+        LIMIT 10
+    ''',
+    "Asteroids with highest approach frequency": f'''
+        SELECT neo_reference_id, approach_count
+        FROM asteroid_rollup
+        WHERE {ASTEROID_HAZARD}
+        ORDER BY approach_count DESC
+        LIMIT 10
+    ''',
+}
+
+
+def get_bounds(conn):
+    try:
+        return conn.execute(
+            'SELECT min_date, max_date, max_astronomical, max_lunar, min_velocity FROM rollup_bounds'
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+def numeric_filters_open(bounds, params):
+    """True when the AU, lunar and velocity filters exclude no stored row."""
+    _, _, max_au, max_lunar, min_velocity = bounds
+    return (params['astro_limit'] > max_au
+            and params['lunar_limit'] > max_lunar
+            and params['velocity_min'] <= min_velocity)
+
+
+def is_month_aligned(start_date, end_date, min_date, max_date):
+    """True when the date range selects whole months of the stored data."""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    starts_clean = start.day == 1 or start_date <= min_date
+    ends_clean = (end + timedelta(days=1)).day == 1 or end_date >= max_date
+    return starts_clean and ends_clean
+
+
+def rollup_sql(conn, query_name, params):
+    """SQL answering `query_name` from the rollups, or None when the filters rule them out."""
+    if query_name not in MONTHLY_QUERIES and query_name not in ASTEROID_QUERIES:
+        return None
+    bounds = get_bounds(conn)
+    if not bounds or bounds[0] is None or not numeric_filters_open(bounds, params):
+        return None
+    min_date, max_date = bounds[0], bounds[1]
+    start_date, end_date = params['start_date'], params['end_date']
+    if query_name in MONTHLY_QUERIES:
+        if is_month_aligned(start_date, end_date, min_date, max_date):
+            return MONTHLY_QUERIES[query_name]
+    elif start_date <= min_date and end_date >= max_date:
+        return ASTEROID_QUERIES[query_name]
+    return None
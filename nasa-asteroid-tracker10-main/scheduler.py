@@ -0,0 +1,227 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date
+
+from data_loader import BASE_URL, START_DATE, run_pipeline
+from http_cache import CACHE_DIR, ResponseCache
+from migrations import SCHEMA_VERSION, get_data_version, get_version
+from pool import prepare_database
+from releases import KEEP_RELEASES, STAGING, collect_garbage, next_version, read_pointer, \
+    release_path, releases_dir, remove_database, write_pointer
+from sync import SETTLE_DAYS, sync
+
+# Long-running refresh: every `interval` seconds the current release is copied
+# to a staging database, synced with the feed, validated and published as a
+# new release (releases.py). The app never sees a half-loaded database and is
+# never blocked by the loader's write locks: it keeps reading the old release
+# until the pointer moves.
+
+DEFAULT_DB = 'nasa_asteroids_10k.db'
+INTERVAL = 6 * 60 * 60
+
+# A refresh may lose at most this share of the previous release's approaches
+MAX_SHRINK = 0.01
+
+# (problem, query counting the offending rows); every count must be 0
+INVARIANTS = [
+    ("approaches with a missing key",
+     "SELECT COUNT(*) FROM close_approach WHERE neo_reference_id IS NULL OR close_approach_date IS NULL"),
+    ("approaches with a malformed date",
+     "SELECT COUNT(*) FROM close_approach "
+     "WHERE close_approach_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"),
+    ("approaches with a negative distance or velocity",
+     "SELECT COUNT(*) FROM close_approach WHERE relative_velocity_kmph < 0 OR astronomical < 0 "
+     "OR miss_distance_km < 0 OR miss_distance_lunar < 0"),
+    ("asteroids with a hazard flag other than 0/1",
+     "SELECT COUNT(*) FROM asteroids WHERE is_potentially_hazardous_asteroid NOT IN (0, 1)"),
+    ("approaches missing from monthly_rollup",
+     "SELECT ABS((SELECT COUNT(*) FROM close_approach) - (SELECT COALESCE(SUM(approach_count), 0) FROM monthly_rollup))"),
+    ("approaches missing from asteroid_rollup",
+     "SELECT ABS((SELECT COUNT(*) FROM close_approach) - (SELECT COALESCE(SUM(approach_count), 0) FROM asteroid_rollup))"),
+]
+
+
+def database_stats(conn):
+    return {
+        'approaches': conn.execute('SELECT COUNT(*) FROM close_approach').fetchone()[0],
+        'asteroids': conn.execute('SELECT COUNT(*) FROM asteroids').fetchone()[0],
+        'data_version': get_data_version(conn),
+    }
+
+
+def validate(db_path, previous=None, max_shrink=MAX_SHRINK):
+    """(problems, stats) for a staged database; it may be published only when `problems` is empty."""
+    conn = sqlite3.connect(db_path)
+    try:
+        problems = []
+        check = conn.execute('PRAGMA quick_check').fetchone()[0]
+        if check != 'ok':
+            problems.append(f"integrity check failed: {check}")
+        if get_version(conn) != SCHEMA_VERSION:
+            problems.append(f"schema version {get_version(conn)}, expected {SCHEMA_VERSION}")
+            return problems, {}
+        stats = database_stats(conn)
+        if not stats['approaches'] or not stats['asteroids']:
+            problems.append("no approaches or no asteroids")
+        for problem, sql in INVARIANTS:
+            count = conn.execute(sql).fetchone()[0]
+            if count:
+                problems.append(f"{count} {problem}")
+        if previous and stats['approaches'] < previous['approaches'] * (1 - max_shrink):
+            problems.append(f"{stats['approaches']} approaches, down from {previous['approaches']}")
+        return problems, stats
+    finally:
+        conn.close()
+
+
+def copy_database(source, target):
+    """Consistent copy of `source` through SQLite's online backup, safe while others read it."""
+    remove_database(target)
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def stage(directory, seed, start_date, end_date, fetch, fetch_options):
+    """Build the next release in the staging file. Returns (staging path, rows changed)."""
+    staging = os.path.join(directory, STAGING)
+    pointer = read_pointer(directory)
+    base = os.path.join(directory, pointer['path']) if pointer else seed
+    if base and os.path.exists(base):
+        copy_database(base, staging)
+        prepare_database(staging)
+        changed = sync(staging, start_date, end_date, **fetch_options)[1] if fetch else 0
+        # A seed is new to the releases even when the feed has nothing to add
+        return staging, changed if pointer else max(changed, 1)
+    remove_database(staging)
+    if not fetch:
+        raise FileNotFoundError(f"Nothing to publish: no release and no seed database '{seed}'")
+    options = dict(fetch_options)
+    options.pop('settle_days', None)
+    written = run_pipeline(start_date or date.fromisoformat(START_DATE), end_date or date.today(), staging,
+                           record_limit=None, batch_size=50000, checkpoint_path=None, bulk=True, **options)
+    prepare_database(staging)
+    return staging, written
+
+
+def publish(directory, staging, stats, snapshot=True):
+    """Turn the validated staging database into the next release and point readers at it."""
+    conn = sqlite3.connect(staging)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    version = next_version(directory)
+    path = release_path(directory, version)
+    os.replace(staging, path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(staging + suffix):
+            os.remove(staging + suffix)
+    if snapshot:
+        from snapshot import write_snapshot
+        write_snapshot(path)
+    return write_pointer(directory, version, stats)
+
+
+def refresh(db_path, start_date=None, end_date=None, fetch=True, fetch_options=None,
+            max_shrink=MAX_SHRINK, keep=KEEP_RELEASES, snapshot=True):
+    """One refresh cycle. Returns the new pointer, or None when nothing was published."""
+    started = time.perf_counter()
+    directory = releases_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+    previous = read_pointer(directory)
+    fetch_options = fetch_options or {'settle_days': SETTLE_DAYS}
+    staging, changed = stage(directory, db_path, start_date, end_date, fetch, fetch_options)
+    if not changed:
+        remove_database(staging)
+        print(f"✅ No changes; release {previous['version']} stays current" if previous else "✅ Nothing to publish")
+        return None
+    problems, stats = validate(staging, previous, max_shrink)
+    if problems:
+        # Kept for inspection; the next cycle starts over from the current release
+        for problem in problems:
+            print(f"❌ {problem}")
+        print(f"❌ Not publishing '{staging}'")
+        return None
+    pointer = publish(directory, staging, stats, snapshot)
+    removed = collect_garbage(directory, keep)
+    print(f"✅ Published release {pointer['version']} ({stats['approaches']} approaches, "
+          f"{stats['asteroids']} asteroids) in {time.perf_counter() - started:.1f}s"
+          + (f"; removed {', '.join(removed)}" if removed else ""))
+    return pointer
+
+
+def run_forever(interval, **options):
+    """Refresh every `interval` seconds; a failed cycle is reported and retried on the next one."""
+    while True:
+        started = time.monotonic()
+        try:
+            refresh(**options)
+        except Exception as e:
+            print(f"❌ Refresh failed: {e!r}")
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Periodically refresh the database and publish validated releases")
+    parser.add_argument('--db', default=DEFAULT_DB,
+                        help="database the app serves; releases go to <db stem>.releases/ and the "
+                             "first one is seeded from this file when it exists")
+    parser.add_argument('--interval', type=float, default=INTERVAL, help="seconds between refreshes")
+    parser.add_argument('--once', action='store_true', help="run one refresh and exit")
+    parser.add_argument('--status', action='store_true', help="show the current release and exit")
+    parser.add_argument('--no-fetch', action='store_true', help="publish the seed/current data without syncing")
+    parser.add_argument('--start', help="first date to cover (default: earliest stored date)")
+    parser.add_argument('--end', help="last date to cover (default: today)")
+    parser.add_argument('--settle-days', type=int, default=SETTLE_DAYS)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2.0)
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="on-disk cache of feed responses")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch from the API")
+    parser.add_argument('--replay', action='store_true', help="serve every window from the response cache")
+    parser.add_argument('--max-shrink', type=float, default=MAX_SHRINK,
+                        help="largest allowed drop in approaches between releases, 0.01 = 1%%")
+    parser.add_argument('--keep', type=int, default=KEEP_RELEASES, help="releases kept on disk")
+    parser.add_argument('--no-snapshot', action='store_true', help="skip the column snapshot of each release")
+    args = parser.parse_args()
+
+    if args.status:
+        pointer = read_pointer(releases_dir(args.db))
+        if pointer is None:
+            print(f"❌ No release published for '{args.db}'")
+            sys.exit(1)
+        print(f"Release {pointer['version']} ({pointer['path']}), published {pointer['published_at']}: "
+              f"{pointer['approaches']} approaches, {pointer['asteroids']} asteroids")
+        return
+
+    options = {
+        'db_path': args.db,
+        'start_date': date.fromisoformat(args.start) if args.start else None,
+        'end_date': date.fromisoformat(args.end) if args.end else None,
+        'fetch': not args.no_fetch,
+        'fetch_options': {
+            'base_url': args.base_url, 'workers': args.workers, 'rate': args.rate,
+            'settle_days': args.settle_days,
+            'cache': None if args.no_cache else ResponseCache(args.cache_dir, replay=args.replay),
+        },
+        'max_shrink': args.max_shrink,
+        'keep': args.keep,
+        'snapshot': not args.no_snapshot,
+    }
+    if args.once:
+        refresh(**options)
+    else:
+        try:
+            run_forever(args.interval, **options)
+        except KeyboardInterrupt:
+            print("Stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from pagination import Pager, is_paged
+from pool import ConnectionPool, ReleasePool, prepare_database
+from queries import QUERIES, QUERY_NAMES, build_params, execute
+from releases import read_pointer, releases_dir
+
+# Headless access to the analyses, over HTTP or on the command line:
+#
+#   GET /analyses                          name, columns and filtered flag of every analysis
+#   GET /query?analysis=<name>&format=csv  one analysis, with the sidebar filters as parameters
+#
+# Rows are read from the cursor BATCH_ROWS at a time and written out as they
+# come (chunked transfer encoding), so no DataFrame is built and the first
+# bytes leave before the query finishes; row listings are streamed whole.
+# Each request holds a pooled read-only connection only while it streams.
+# pandas and streamlit are never imported, and pyarrow only for Arrow
+# output, which keeps start-up to the stdlib.
+
+DEFAULT_DB = 'nasa_asteroids_10k.db'
+PORT = 8793
+BATCH_ROWS = 1000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# The sidebar's initial values (filters.py), used for parameters left out
+DEFAULT_FILTERS = {
+    'start_date': '2024-01-01',
+    'end_date': '2025-01-01',
+    'velocity_min': 0,
+    'astro_limit': 0.5,
+    'lunar_limit': 10.0,
+    'hazardous': 'All',
+}
+
+
+def parse_filters(values):
+    """build_params() from a mapping of filter parameters given as strings; ValueError for bad values."""
+    unknown = set(values) - set(DEFAULT_FILTERS)
+    if unknown:
+        raise ValueError(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+    filters = dict(DEFAULT_FILTERS, **values)
+    hazardous = str(filters['hazardous'])
+    if hazardous not in ("All", "Yes", "No"):
+        raise ValueError("hazardous must be All, Yes or No")
+    return build_params(
+        date.fromisoformat(str(filters['start_date'])), date.fromisoformat(str(filters['end_date'])),
+        float(filters['velocity_min']), float(filters['astro_limit']), float(filters['lunar_limit']), hazardous)
+
+
+def iter_batches(cursor, size=BATCH_ROWS):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows).encode()
+
+
+class ChunkSink:
+    """Write-only file object collecting what the Arrow stream writer emits."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def arrow_chunks(columns, batches):
+    """Arrow IPC stream; column types come from the first batch, float64 for columns with no value in it."""
+    import pyarrow as pa
+
+    sink = ChunkSink()
+    writer = schema = None
+    for rows in batches:
+        values = list(zip(*rows))
+        if schema is None:
+            arrays = [pa.array(v) for v in values]
+            schema = pa.schema([(name, pa.float64() if a.type == pa.null() else a.type)
+                                for name, a in zip(columns, arrays)])
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(pa.record_batch([pa.array(v, type=f.type) for v, f in zip(values, schema)],
+                                           schema=schema))
+        yield sink.drain()
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.schema([(name, pa.float64()) for name in columns]))
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {'csv': csv_chunks, 'ndjson': ndjson_chunks, 'arrow': arrow_chunks}
+
+
+def stream(conn, query_name, params, fmt, batch_rows=BATCH_ROWS):
+    """Chunks of an analysis' result in `fmt`, read from the cursor as they are written.
+
+    Paged analyses are read in key order through one keyset cursor, like the
+    dashboard's pages, and are not capped at the analysis' LIMIT.
+    """
+    columns = list(QUERIES[query_name].columns)
+    if is_paged(query_name):
+        batches = (rows for rows, _ in Pager(conn, query_name, params, batch_rows).iter_pages())
+    else:
+        batches = iter_batches(execute(conn, query_name, params), batch_rows)
+    return ENCODERS[fmt](columns, batches)
+
+
+def open_pool(db_path, size):
+    """Pool over the newest published release of `db_path`, or over the file itself."""
+    if read_pointer(releases_dir(db_path)):
+        return ReleasePool(releases_dir(db_path), size=size)
+    prepare_database(db_path)
+    return ConnectionPool(db_path, size=size)
+
+
+def make_server(db_path=DEFAULT_DB, host='127.0.0.1', port=PORT, pool_size=4, batch_rows=BATCH_ROWS):
+    """ThreadingHTTPServer answering /analyses and /query; serve with `serve_forever()`."""
+    pool = open_pool(db_path, pool_size)
+    catalog = json.dumps([{'name': a.name, 'columns': list(a.columns), 'filtered': a.filtered}
+                          for a in QUERIES.values()]).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and chunks go out as separate small writes; with Nagle on,
+        # each waits for the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/analyses':
+                self.send_body(200, 'application/json', catalog)
+            elif url.path == '/query':
+                self.query(parse_qs(url.query))
+            else:
+                self.send_error_json(404, f"no such path: {url.path}")
+
+        def query(self, query):
+            values = {k: v[-1] for k, v in query.items()}
+            query_name = values.pop('analysis', None)
+            fmt = values.pop('format', 'csv')
+            if query_name not in QUERIES:
+                return self.send_error_json(404, f"unknown analysis: {query_name!r}")
+            if fmt not in ENCODERS:
+                return self.send_error_json(400, f"format must be one of {', '.join(ENCODERS)}")
+            try:
+                params = parse_filters(values)
+            except ValueError as e:
+                return self.send_error_json(400, str(e))
+            if fmt == 'arrow':
+                try:
+                    import pyarrow  # noqa: F401
+                except ImportError:
+                    return self.send_error_json(501, "Arrow output needs pyarrow")
+
+            with pool.current().connection() as conn:
+                chunks = stream(conn, query_name, params, fmt, batch_rows)
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPES[fmt])
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        if chunk:
+                            self.wfile.write(b'%X\r\n%s\r\n' % (len(chunk), chunk))
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                except Exception as e:
+                    # Too late for an error status: ending without the last chunk
+                    # tells the client the body is incomplete
+                    self.log_error("%s failed mid-stream: %r", query_name, e)
+                    self.close_connection = True
+
+        def send_body(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_error_json(self, status, message):
+            self.send_body(status, 'application/json', json.dumps({'error': message}).encode())
+
+        def log_message(self, *args):
+            pass
+
+        def log_error(self, fmt, *args):
+            sys.stderr.write(f"{self.address_string()} {fmt % args}\n")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.pool = pool
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve or export the analyses without the dashboard")
+    parser.add_argument('--db', default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    served = sub.add_parser('serve', help="HTTP service streaming analyses as CSV, NDJSON or Arrow")
+    served.add_argument('--host', default='127.0.0.1')
+    served.add_argument('--port', type=int, default=PORT)
+    served.add_argument('--pool-size', type=int, default=4, help="read-only connections shared by all clients")
+
+    sub.add_parser('list', help="list the analyses and their columns")
+
+    queried = sub.add_parser('query', help="stream one analysis to stdout")
+    queried.add_argument('analysis', choices=QUERY_NAMES, metavar='ANALYSIS')
+    queried.add_argument('--format', choices=list(ENCODERS), default='csv')
+    for name, default in DEFAULT_FILTERS.items():
+        queried.add_argument(f"--{name.replace('_', '-')}", dest=name, default=default)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name in QUERY_NAMES:
+            print(f"{name}: {', '.join(QUERIES[name].columns)}")
+    elif args.command == 'query':
+        try:
+            params = parse_filters({name: getattr(args, name) for name in DEFAULT_FILTERS})
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(2)
+        pool = open_pool(args.db, 1)
+        with pool.current().connection() as conn:
+            for chunk in stream(conn, args.analysis, params, args.format):
+                sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        started = time.perf_counter()
+        server = make_server(args.db, args.host, args.port, args.pool_size)
+        print(f"✅ Serving {len(QUERIES)} analyses from '{args.db}' at "
+              f"http://{args.host}:{server.server_address[1]}/query (ready in "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms, Ctrl+C to stop)", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
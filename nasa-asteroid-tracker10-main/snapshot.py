@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+
+from columnar import STORED_COLUMNS, ColumnStore
+from migrations import get_data_version, get_database_id, migrate
+
+# Bump when the on-disk layout changes; readers ignore snapshots of another format
+SNAPSHOT_FORMAT = 2
+
+# Snapshot versions kept on disk: the current one plus the one before it, which
+# workers that have not yet noticed the new data version may still have mapped
+KEEP_VERSIONS = 2
+
+
+def snapshot_dir(db_path):
+    """Directory holding the snapshots of `db_path`, e.g. nasa_asteroids_10k.snapshot/."""
+    return os.path.splitext(db_path)[0] + '.snapshot'
+
+
+def fixed_width(array):
+    """Column as a contiguous fixed-width array; strings become UTF-8 bytes."""
+    if array.dtype == object:
+        encoded = [str(value).encode('utf-8') for value in array]
+        return np.array(encoded, dtype=f"S{max(map(len, encoded), default=1) or 1}")
+    return np.ascontiguousarray(array)
+
+
+def write_snapshot(db_path, store=None):
+    """Write the database's column store as fixed-width column files plus a manifest.
+
+    Column files go into a directory named after the data version; the
+    manifest naming that directory is replaced atomically last, so readers
+    only ever see a complete snapshot.
+    """
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    data_version = get_data_version(conn)
+    database_id = get_database_id(conn)
+    store = store or ColumnStore.from_sqlite(conn)
+    conn.close()
+
+    root = snapshot_dir(db_path)
+    version = f"v{data_version}"
+    path = os.path.join(root, version)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+    columns = {}
+    for name, array in store.columns().items():
+        array = fixed_width(array)
+        with open(os.path.join(path, name + '.bin'), 'wb') as f:
+            array.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        columns[name] = {'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'data_version': data_version,
+        'database_id': database_id,
+        'path': version,
+        'rows': len(store),
+        'asteroids': len(store.ast_id),
+        'columns': columns,
+    }
+    tmp = os.path.join(root, 'manifest.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, 'manifest.json'))
+
+    remove_old_versions(root, data_version)
+    print(f"✅ Wrote snapshot {version} ({len(store)} approaches) to '{root}'")
+    return manifest
+
+
+def remove_old_versions(root, data_version):
+    versions = sorted(
+        int(entry[1:]) for entry in os.listdir(root)
+        if entry.startswith('v') and entry[1:].isdigit() and int(entry[1:]) <= data_version
+    )
+    for old in versions[:-KEEP_VERSIONS]:
+        # Unlinking is safe on POSIX even while another process still has the files mapped
+        shutil.rmtree(os.path.join(root, f"v{old}"), ignore_errors=True)
+
+
+def read_manifest(db_path):
+    try:
+        with open(os.path.join(snapshot_dir(db_path), 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != SNAPSHOT_FORMAT or set(manifest['columns']) != set(STORED_COLUMNS):
+        return None
+    return manifest
+
+
+def open_snapshot(db_path, data_version=None, database_id=None):
+    """ColumnStore over read-only memory maps of the current snapshot, or None.
+
+    Nothing is parsed or copied: every column is an np.memmap, so processes
+    opening the same snapshot share one copy of the data in the page cache.
+    Returns None when there is no snapshot or it does not match `data_version`
+    and `database_id`. The id tells a database rebuilt from scratch apart from
+    the one the snapshot was written from, whose data version it may reach.
+    """
+    manifest = read_manifest(db_path)
+    if manifest is None or (data_version is not None and manifest['data_version'] != data_version):
+        return None
+    if database_id is not None and manifest['database_id'] != database_id:
+        return None
+    path = os.path.join(snapshot_dir(db_path), manifest['path'])
+    columns = {}
+    for name, meta in manifest['columns'].items():
+        dtype, shape = np.dtype(meta['dtype']), tuple(meta['shape'])
+        if 0 in shape:
+            columns[name] = np.empty(shape, dtype=dtype)
+        else:
+            columns[name] = np.memmap(os.path.join(path, name + '.bin'), dtype=dtype, mode='r', shape=shape)
+    store = ColumnStore.from_columns(columns)
+    store.data_version = manifest['data_version']
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write or inspect the memory-mapped column snapshot of a database")
+    parser.add_argument('db', nargs='?', default='nasa_asteroids_10k.db')
+    parser.add_argument('--info', action='store_true', help="print the current manifest instead of writing")
+    args = parser.parse_args()
+
+    if args.info:
+        manifest = read_manifest(args.db)
+        print(json.dumps(manifest, indent=2) if manifest else "No snapshot")
+    else:
+        write_snapshot(args.db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from data_loader import API_KEY, BASE_URL, DB_PATH, START_DATE, approach_row, asteroid_row, \
+    create_tables, iter_page_records
+from fetcher import FeedFetcher, split_windows
+from http_cache import CACHE_DIR, ResponseCache
+from migrations import bump_data_version
+from rollups import refresh_rollups
+
+# Windows whose end date was less than this many days before they were fetched
+# may still change (orbit refinements, predicted approaches) and are re-fetched
+# on the next day's sync; older windows are treated as final.
+SETTLE_DAYS = 7
+
+# Upserts only touch rows whose values actually changed
+UPSERT_ASTEROID = '''
+INSERT INTO asteroids (id, name, absolute_magnitude_h, estimated_diameter_min_km,
+                       estimated_diameter_max_km, is_potentially_hazardous_asteroid)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    name = excluded.name,
+    absolute_magnitude_h = excluded.absolute_magnitude_h,
+    estimated_diameter_min_km = excluded.estimated_diameter_min_km,
+    estimated_diameter_max_km = excluded.estimated_diameter_max_km,
+    is_potentially_hazardous_asteroid = excluded.is_potentially_hazardous_asteroid
+WHERE name IS NOT excluded.name
+   OR absolute_magnitude_h IS NOT excluded.absolute_magnitude_h
+   OR estimated_diameter_min_km IS NOT excluded.estimated_diameter_min_km
+   OR estimated_diameter_max_km IS NOT excluded.estimated_diameter_max_km
+   OR is_potentially_hazardous_asteroid IS NOT excluded.is_potentially_hazardous_asteroid
+'''
+
+UPSERT_APPROACH = '''
+INSERT INTO close_approach (neo_reference_id, close_approach_date, relative_velocity_kmph,
+                            astronomical, miss_distance_km, miss_distance_lunar, orbiting_body)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (neo_reference_id, close_approach_date, orbiting_body) DO UPDATE SET
+    relative_velocity_kmph = excluded.relative_velocity_kmph,
+    astronomical = excluded.astronomical,
+    miss_distance_km = excluded.miss_distance_km,
+    miss_distance_lunar = excluded.miss_distance_lunar
+WHERE relative_velocity_kmph IS NOT excluded.relative_velocity_kmph
+   OR astronomical IS NOT excluded.astronomical
+   OR miss_distance_km IS NOT excluded.miss_distance_km
+   OR miss_distance_lunar IS NOT excluded.miss_distance_lunar
+'''
+
+
+def week_start(day):
+    """Monday of the week containing `day`; ledger windows are always Monday to Sunday."""
+    return day - timedelta(days=day.weekday())
+
+
+def stored_date_range(conn):
+    """(min, max) close_approach_date in the database, or (None, None) when empty."""
+    low, high = conn.execute('SELECT MIN(close_approach_date), MAX(close_approach_date) FROM close_approach').fetchone()
+    if low is None:
+        return None, None
+    return date.fromisoformat(low), date.fromisoformat(high)
+
+
+def is_stale(entry, today, settle_days=SETTLE_DAYS):
+    """A ledger entry needs refreshing if it was not yet settled when fetched and was fetched before today."""
+    window_end, fetched_at = entry
+    fetched_on = datetime.fromisoformat(fetched_at).date()
+    settled = fetched_on - date.fromisoformat(window_end) >= timedelta(days=settle_days)
+    return not settled and fetched_on < today
+
+
+def plan_windows(conn, start_date, end_date, today=None, settle_days=SETTLE_DAYS):
+    """Windows in [start_date, end_date] that are missing from the ledger or stale."""
+    today = today or date.today()
+    ledger = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute('SELECT window_start, window_end, fetched_at FROM sync_ledger')
+    }
+    needed = []
+    for window in split_windows(week_start(start_date), end_date):
+        entry = ledger.get(window[0].isoformat())
+        if entry is None or entry[0] != window[1].isoformat() or is_stale(entry, today, settle_days):
+            needed.append(window)
+    return needed
+
+
+def seed_ledger(conn, start_date, end_date, today=None, settle_days=SETTLE_DAYS):
+    """Record the settled weeks the database already holds, so data loaded by data_loader.py isn't re-fetched.
+
+    The feed lists approaches every day, so a week with stored approaches on
+    all seven days was loaded in full. Its entry has no content hash, and the
+    first fetch of that window upserts its records. Returns the weeks recorded.
+    """
+    today = today or date.today()
+    ledger = {row[0] for row in conn.execute('SELECT window_start FROM sync_ledger')}
+    stored = {row[0] for row in conn.execute(
+        'SELECT DISTINCT close_approach_date FROM close_approach WHERE close_approach_date BETWEEN ? AND ?',
+        (week_start(start_date).isoformat(), end_date.isoformat()))}
+    fetched_at = datetime.now().isoformat(timespec='seconds')
+    entries = []
+    for first, last in split_windows(week_start(start_date), end_date):
+        if first.isoformat() in ledger or (last - first).days != 6 or today - last < timedelta(days=settle_days):
+            continue
+        if all((first + timedelta(days=i)).isoformat() in stored for i in range(7)):
+            entries.append((first.isoformat(), last.isoformat(), fetched_at, row_count(conn, (first, last)), ''))
+    with conn:
+        conn.executemany('INSERT INTO sync_ledger VALUES (?, ?, ?, ?, ?)', entries)
+    return len(entries)
+
+
+def page_hash(page):
+    return hashlib.sha1(json.dumps(page.get('near_earth_objects', {}), sort_keys=True).encode()).hexdigest()
+
+
+def apply_window(conn, window, page):
+    """Upsert one window's changed rows and record it in the ledger. Returns rows changed."""
+    digest = page_hash(page)
+    row = conn.execute('SELECT content_hash FROM sync_ledger WHERE window_start = ?',
+                       (window[0].isoformat(),)).fetchone()
+    records = [] if row and row[0] == digest else list(iter_page_records(page))
+    before = conn.total_changes
+    with conn:
+        if records:
+            conn.executemany(UPSERT_ASTEROID, {r['id']: asteroid_row(r) for r in records}.values())
+            conn.executemany(UPSERT_APPROACH, map(approach_row, records))
+        changed = conn.total_changes - before
+        if changed:
+            refresh_rollups(conn, records)
+            bump_data_version(conn)
+        conn.execute(
+            'INSERT OR REPLACE INTO sync_ledger VALUES (?, ?, ?, ?, ?)',
+            (window[0].isoformat(), window[1].isoformat(), datetime.now().isoformat(timespec='seconds'),
+             len(records) if records else row_count(conn, window), digest)
+        )
+    return changed
+
+
+def row_count(conn, window):
+    return conn.execute('SELECT COUNT(*) FROM close_approach WHERE close_approach_date BETWEEN ? AND ?',
+                        (window[0].isoformat(), window[1].isoformat())).fetchone()[0]
+
+
+def sync(db_path=DB_PATH, start_date=None, end_date=None, base_url=BASE_URL, workers=4, rate=2.0,
+         settle_days=SETTLE_DAYS, cache=None):
+    """Fetch only missing or stale windows and upsert only the rows that changed."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+
+    # Default range: everything already stored, extended up to today
+    low, high = stored_date_range(conn)
+    start_date = start_date or low or date.fromisoformat(START_DATE)
+    end_date = end_date or max(filter(None, [high, date.today()]))
+
+    seed_ledger(conn, start_date, end_date, settle_days=settle_days)
+    windows = plan_windows(conn, start_date, end_date, settle_days=settle_days)
+    changed = 0
+    if windows:
+        fetcher = FeedFetcher(API_KEY, base_url=base_url, workers=workers, rate=rate, cache=cache)
+        for window, page in fetcher.iter_window_pages(windows):
+            changed += apply_window(conn, window, page)
+    conn.close()
+
+    # Keep an existing column snapshot in step with the database
+    if changed:
+        from snapshot import read_manifest, write_snapshot
+        if read_manifest(db_path):
+            write_snapshot(db_path)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Synced {len(windows)} window(s), {changed} row(s) changed in {elapsed:.2f}s")
+    return len(windows), changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync the asteroid database with the NeoWs feed")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--start', help="first date to cover (default: earliest stored date)")
+    parser.add_argument('--end', help="last date to cover (default: today or the latest stored date)")
+    parser.add_argument('--settle-days', type=int, default=SETTLE_DAYS,
+                        help="windows fetched less than this many days after they ended are re-fetched daily")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2.0)
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="on-disk cache of feed responses")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch from the API")
+    parser.add_argument('--replay', action='store_true', help="serve every window from the response cache")
+    args = parser.parse_args()
+
+    sync(args.db,
+         date.fromisoformat(args.start) if args.start else None,
+         date.fromisoformat(args.end) if args.end else None,
+         args.base_url, args.workers, args.rate, args.settle_days,
+         None if args.no_cache else ResponseCache(args.cache_dir, replay=args.replay))
+
+
+if __name__ == '__main__':
+    main()
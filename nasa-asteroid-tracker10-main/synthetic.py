@@ -0,0 +1,380 @@
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import NormalDist
+from urllib.parse import parse_qs, urlparse
+
+# Deterministic synthetic NeoWs data. Distributions are fitted to the bundled
+# nasa_asteroids_10k.db: about 1.2 approaches per asteroid (geometric tail),
+# log-normal velocities around 40,000 km/h, miss distances skewed towards the
+# 0.5 AU edge of the feed, absolute magnitudes around H = 24.4, and about 6%
+# hazardous asteroids, all of them brighter than H = 22.
+
+SEED = 42
+START_DATE = date(2024, 1, 1)
+# The whole dataset lands in this many days, so larger sizes mean denser days
+DAYS = 730
+
+REPEAT_SHARE = 0.17          # chance an approach is by an asteroid already seen
+VELOCITY_LOG_MEAN = 10.574   # ln(km/h)
+VELOCITY_LOG_STD = 0.571
+VELOCITY_JITTER = 0.1        # log-std between approaches of the same asteroid
+MAX_AU = 0.5
+AU_SKEW = 1.5                # au = MAX_AU * u ** AU_SKEW
+MAGNITUDE = NormalDist(24.4, 2.7)
+HAZARD_MAGNITUDE = 22.0
+HAZARD_SHARE = 0.28          # of asteroids with H <= HAZARD_MAGNITUDE
+NUMBERED_MAGNITUDE = 20.0    # brighter asteroids get numbered names and 2xxxxxx ids
+
+KM_PER_AU = 149597870.7
+LUNAR_PER_AU = 389.1729
+MILES_PER_KM = 0.621371
+
+HALF_MONTHS = "ABCDEFGHJKLMNOPQRSTUVWXY"
+LETTERS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+MASK = (1 << 64) - 1
+
+
+def mix(x):
+    """splitmix64 finalizer: a well-spread 64-bit hash of `x`."""
+    x = (x + 0x9E3779B97F4A7C15) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+
+def unit(seed, index, stream):
+    """Uniform float in (0, 1) fixed by (seed, asteroid index, stream)."""
+    return ((mix(mix(seed) ^ (index * 16 + stream)) >> 11) + 0.5) / 2 ** 53
+
+
+def asteroid(seed, index):
+    """Fixed attributes of the index-th synthetic asteroid, in extract_fields naming."""
+    h = round(min(33.5, max(12.0, MAGNITUDE.inv_cdf(unit(seed, index, 0)))), 2)
+    designation = (f"{1990 + int(unit(seed, index, 1) * 35)} "
+                   f"{HALF_MONTHS[int(unit(seed, index, 2) * len(HALF_MONTHS))]}"
+                   f"{LETTERS[int(unit(seed, index, 3) * len(LETTERS))]}"
+                   f"{int(unit(seed, index, 4) * 200) or ''}")
+    if h < NUMBERED_MAGNITUDE:
+        asteroid_id, name = 2000001 + index, f"{index + 1} ({designation})"
+    else:
+        asteroid_id, name = 54000000 + index, f"({designation})"
+    # NeoWs diameter bounds: albedo 0.25 (min) and 0.05 (max)
+    diameter = 1329 * 10 ** (-h / 5)
+    return {
+        "id": asteroid_id,
+        "neo_reference_id": asteroid_id,
+        "name": name,
+        "absolute_magnitude_h": h,
+        "estimated_diameter_min_km": diameter / math.sqrt(0.25),
+        "estimated_diameter_max_km": diameter / math.sqrt(0.05),
+        "is_potentially_hazardous_asteroid": h <= HAZARD_MAGNITUDE and unit(seed, index, 5) < HAZARD_SHARE,
+        "velocity_log": VELOCITY_LOG_MEAN + VELOCITY_LOG_STD * NormalDist().inv_cdf(unit(seed, index, 6)),
+    }
+
+
+def generate_records(count, seed=SEED, start_date=START_DATE, days=DAYS):
+    """Yield `count` records shaped like `extract_fields` output, in close-approach date order.
+
+    The same arguments always yield the same records. Asteroid attributes are
+    a pure function of the asteroid's index, so nothing is kept per asteroid
+    and any size streams in constant memory.
+    """
+    rng = random.Random(seed)
+    created = 0
+    produced = 0
+    for day in range(days):
+        today_count = (day + 1) * count // days - produced
+        close_approach_date = start_date + timedelta(days=day)
+        seen_today = set()
+        for _ in range(today_count):
+            index = rng.randrange(created) if created and rng.random() < REPEAT_SHARE else created
+            # One approach per asteroid per day, as in the feed's natural key
+            if index == created or index in seen_today:
+                index = created
+                created += 1
+            seen_today.add(index)
+            fields = asteroid(seed, index)
+            velocity = math.exp(fields.pop("velocity_log") + VELOCITY_JITTER * rng.gauss(0, 1))
+            au = max(1e-5, MAX_AU * rng.random() ** AU_SKEW)
+            fields.update({
+                "close_approach_date": close_approach_date,
+                "relative_velocity_kmph": velocity,
+                "astronomical": au,
+                "miss_distance_km": au * KM_PER_AU,
+                "miss_distance_lunar": au * LUNAR_PER_AU,
+                "orbiting_body": "Earth",
+            })
+            yield fields
+        produced += today_count
+
+
+def neo_object(record):
+    """A NeoWs feed entry for one record; numbers inside close_approach_data are strings, as in the API."""
+    km = {"estimated_diameter_min": record["estimated_diameter_min_km"],
+          "estimated_diameter_max": record["estimated_diameter_max_km"]}
+    day = record["close_approach_date"]
+    return {
+        "links": {"self": f"http://api.nasa.gov/neo/rest/v1/neo/{record['id']}"},
+        "id": str(record["id"]),
+        "neo_reference_id": str(record["neo_reference_id"]),
+        "name": record["name"],
+        "nasa_jpl_url": f"https://ssd.jpl.nasa.gov/tools/sbdb_lookup.html#/?sstr={record['id']}",
+        "absolute_magnitude_h": record["absolute_magnitude_h"],
+        "estimated_diameter": {
+            "kilometers": km,
+            "meters": {k: v * 1000 for k, v in km.items()},
+            "miles": {k: v * MILES_PER_KM for k, v in km.items()},
+            "feet": {k: v * 3280.84 for k, v in km.items()},
+        },
+        "is_potentially_hazardous_asteroid": record["is_potentially_hazardous_asteroid"],
+        "close_approach_data": [{
+            "close_approach_date": day.isoformat(),
+            "close_approach_date_full": day.strftime('%Y-%b-%d 00:00'),
+            "epoch_date_close_approach": int(time.mktime(day.timetuple())) * 1000,
+            "relative_velocity": {
+                "kilometers_per_second": repr(record["relative_velocity_kmph"] / 3600),
+                "kilometers_per_hour": repr(record["relative_velocity_kmph"]),
+                "miles_per_hour": repr(record["relative_velocity_kmph"] * MILES_PER_KM),
+            },
+            "miss_distance": {
+                "astronomical": repr(record["astronomical"]),
+                "lunar": repr(record["miss_distance_lunar"]),
+                "kilometers": repr(record["miss_distance_km"]),
+                "miles": repr(record["miss_distance_km"] * MILES_PER_KM),
+            },
+            "orbiting_body": record["orbiting_body"],
+        }],
+        "is_sentry_object": False,
+    }
+
+
+def feed_page(window, records):
+    near_earth_objects = {}
+    for record in records:
+        near_earth_objects.setdefault(record["close_approach_date"].isoformat(), []).append(neo_object(record))
+    return {
+        "links": {"self": f"http://api.nasa.gov/neo/rest/v1/feed?start_date={window[0]}&end_date={window[1]}"},
+        "element_count": len(records),
+        "near_earth_objects": near_earth_objects,
+    }
+
+
+def generate_feed(count, seed=SEED, start_date=START_DATE, days=DAYS, window_days=7):
+    """Yield ((start, end), page) NeoWs feed pages covering `generate_records(count, ...)`."""
+    window_start = start_date
+    batch = []
+    for record in generate_records(count, seed, start_date, days):
+        while record["close_approach_date"] >= window_start + timedelta(days=window_days):
+            window = (window_start, window_start + timedelta(days=window_days - 1))
+            yield window, feed_page(window, batch)
+            window_start, batch = window[1] + timedelta(days=1), []
+        batch.append(record)
+    if batch:
+        window = (window_start, min(window_start + timedelta(days=window_days - 1), start_date + timedelta(days=days - 1)))
+        yield window, feed_page(window, batch)
+
+
+def lookup_object(records):
+    """A NeoWs lookup response (GET /neo/{id}): the asteroid with every one of its approaches."""
+    neo = neo_object(records[0])
+    neo["close_approach_data"] = [neo_object(r)["close_approach_data"][0] for r in records]
+    return neo
+
+
+def histories(records):
+    """{asteroid id: lookup response} for the asteroids in `records`."""
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record["id"], []).append(record)
+    return {neo_id: lookup_object(group) for neo_id, group in grouped.items()}
+
+
+class LookupStub:
+    """Local stand-in for the NeoWs lookup endpoint, serving `histories` as GET <url>/<id>.
+
+    Unknown ids get a 404. `delay` seconds are added to every response, like
+    the round trip to the real API.
+    """
+
+    def __init__(self, lookups, delay=0.0, port=0):
+        bodies = {str(neo_id): json.dumps(neo).encode() for neo_id, neo in lookups.items()}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(delay)
+                body = bodies.get(urlparse(self.path).path.rstrip('/').rsplit('/', 1)[-1])
+                self.send_response(200 if body is not None else 404)
+                body = body if body is not None else b'{"error": "not found"}'
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/neo/rest/v1/neo"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FeedStub:
+    """Local stand-in for the NeoWs feed endpoint, serving `records` as GET <url>?start_date=&end_date=.
+
+    Every `fail_every`-th request fails instead, alternately with a 429
+    carrying `Retry-After: <retry_after>` and with a 503, so the fetcher's
+    retries are exercised. `delay` seconds are added to every response.
+    """
+
+    def __init__(self, records, delay=0.0, fail_every=0, retry_after=0, port=0):
+        by_day = {}
+        for record in records:
+            by_day.setdefault(record["close_approach_date"], []).append(record)
+        bodies = {}
+        stub = self
+
+        def page_body(start, end):
+            if (start, end) not in bodies:
+                first, last = date.fromisoformat(start), date.fromisoformat(end)
+                days = (first + timedelta(days=i) for i in range((last - first).days + 1))
+                bodies[start, end] = json.dumps(
+                    feed_page((first, last), [r for day in days for r in by_day.get(day, ())])).encode()
+            return bodies[start, end]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    failing = fail_every and stub.requests % fail_every == 0
+                    if failing:
+                        stub.failures += 1
+                        status = 429 if stub.failures % 2 else 503
+                time.sleep(delay)
+                query = parse_qs(urlparse(self.path).query)
+                if failing:
+                    body = b'{"error": "injected failure"}'
+                elif 'start_date' in query and 'end_date' in query:
+                    status, body = 200, page_body(query['start_date'][0], query['end_date'][0])
+                else:
+                    status, body = 400, b'{"error": "start_date and end_date are required"}'
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', str(retry_after))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/neo/rest/v1/feed"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def write_feed(directory, count, seed=SEED, start_date=START_DATE, days=DAYS):
+    """Write one feed-<start>.json per window into `directory`. Returns the number of pages."""
+    os.makedirs(directory, exist_ok=True)
+    pages = 0
+    for window, page in generate_feed(count, seed, start_date, days):
+        with open(os.path.join(directory, f"feed-{window[0]}.json"), 'w') as f:
+            json.dump(page, f)
+        pages += 1
+    return pages
+
+
+def build_db(db_path, count, seed=SEED, start_date=START_DATE, days=DAYS, batch_size=50000):
+    """Create `db_path` from scratch and bulk load `count` synthetic approaches into it."""
+    from data_loader import BulkLoader, create_tables
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    loader = BulkLoader(conn, batch_size)
+    loader.write(generate_records(count, seed, start_date, days))
+    loader.finish()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic NeoWs data")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('feed', "write NeoWs feed JSON pages"), ('db', "build a populated SQLite database"),
+                            ('lookups', "serve each asteroid's full history like the NeoWs lookup endpoint"),
+                            ('feed-server', "serve the records like the NeoWs feed endpoint")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument('--count', type=int, default=100000, help="number of close approaches")
+        command.add_argument('--seed', type=int, default=SEED)
+        command.add_argument('--start', default=START_DATE.isoformat())
+        command.add_argument('--days', type=int, default=DAYS, help="days the approaches are spread over")
+    sub.choices['feed'].add_argument('--out', default='synthetic_feed')
+    sub.choices['db'].add_argument('--db', default='synthetic.db')
+    sub.choices['lookups'].add_argument('--port', type=int, default=8792)
+    sub.choices['lookups'].add_argument('--delay', type=float, default=0.0, help="seconds added to every response")
+    sub.choices['feed-server'].add_argument('--port', type=int, default=8791)
+    sub.choices['feed-server'].add_argument('--delay', type=float, default=0.0, help="seconds added to every response")
+    sub.choices['feed-server'].add_argument('--fail-every', type=int, default=0,
+                                            help="answer every Nth request with a 429 or 503 instead")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    start_date = date.fromisoformat(args.start)
+    if args.command == 'feed':
+        pages = write_feed(args.out, args.count, args.seed, start_date, args.days)
+        print(f"✅ Wrote {pages} feed pages ({args.count} approaches) to '{args.out}'")
+    elif args.command == 'feed-server':
+        records = list(generate_records(args.count, args.seed, start_date, args.days))
+        stub = FeedStub(records, args.delay, args.fail_every, port=args.port)
+        print(f"✅ Serving {len(records)} approaches at {stub.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stub.close()
+        return
+    elif args.command == 'lookups':
+        lookups = histories(list(generate_records(args.count, args.seed, start_date, args.days)))
+        stub = LookupStub(lookups, args.delay, args.port)
+        print(f"✅ Serving {len(lookups)} asteroid histories at {stub.url}/<id> (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stub.close()
+        return
+    else:
+        build_db(args.db, args.count, args.seed, start_date, args.days).close()
+        print(f"✅ Built '{args.db}' with {args.count} approaches")
+    print(f"Took {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()